@@ -1,317 +1,481 @@
 # -*- coding: utf-8 -*-
 
-import discord
+import asyncio
 import os
-import random
-import gspread # TODO: make the gspread calls in the async framework?
+import sys
+import time
 
-from datetime import datetime
-from discord.ext import commands, tasks
-from dotenv import load_dotenv
-from math import floor
-from pickledb import PickleDB
+from rotisserie.metrics import StartupProfile, metrics
 
-SEARCH_MAX_LENGTH = 5
-WANTLIST_MAX_LENGTH = 20
-DRAFT_ROUNDS = 10
+# python bot.py --profile-startup shows how long each step of starting up takes, without connecting to discord
+PROFILE_STARTUP = '--profile-startup' in sys.argv
+startup_profile = StartupProfile()
+
+with startup_profile.step('import discord'):
+    import discord
+
+    from discord.ext import commands
+
+with startup_profile.step('import rotisserie'):
+    from dotenv import load_dotenv
+    from rotisserie.actor import DraftActors
+    from rotisserie.attributes import SearchError, has_filter_terms, open_attributes, search_cards
+    from rotisserie.catalog import open_catalog
+    from rotisserie.clock import DeadlineScheduler, format_duration
+    from rotisserie.draft import SEARCH_MAX_LENGTH, DraftError, DraftRegistry, migrate_single_draft
+    from rotisserie.engine import PickEngine
+    from rotisserie.notifications import SnipeNotifier
+    from rotisserie.outbox import Outbox, split_message
+    from rotisserie.recorder import CommandRecorder
+    from rotisserie.sheets import GspreadBackend, SheetPublisher
 
 load_dotenv()
 
-card_data  = PickleDB('cards.db')
-user_data  = PickleDB('users.db')
-draft_data = PickleDB('draft.db')
+# card names live in a memory-mapped catalog built from card-list.txt,
+# everywhere else a card is just its integer id
+with startup_profile.step('open catalog'):
+    catalog = open_catalog('card-list.txt', 'cards.catalog')
 
-# initialize db on fresh start
-if not draft_data.get('number-of-rounds'):
-    draft_data.set('number-of-rounds', DRAFT_ROUNDS)
-    draft_data.set('has-started', False)
-    draft_data.set('pick-number', 0)
-    draft_data.set('pick-order', [])
-    draft_data.save()
+# optional colors, mana values and types for !search, see rotisserie/attributes.py,
+# loaded by the first search that filters on them, and looked for again until
+# they are found so importing them doesn't need a restart
+_card_attributes = None
 
-    with open('card-list.txt', 'r') as f:
-        for card_name in f.read().splitlines():
-            card_id = card_name.lower()
-            card_data.set(card_id, {'id': card_id, 'name': card_name, 'taken': False})
+def card_attributes():
+    global _card_attributes
 
-    card_data.save()
+    if _card_attributes is None:
+        _card_attributes = open_attributes('cards.attributes.npz', catalog)
 
-def save_all():
-    card_data.save()
-    user_data.save()
-    draft_data.save()
+    return _card_attributes
 
-# card_data is indexed by lowercase version of card name
-def get_card(card_id):
-    return card_data.get(card_id.lower())
+# every change to a draft, from commands or the pick engine, runs in that
+# draft's actor one at a time; read-only commands use its snapshot instead
+actors = DraftActors()
 
-# user_id is provided by discord and coerced to string by pickleDB
-def get_user(user_id):
-    return user_data.get(user_id)
+# every channel gets its own draft, stored in drafts/<channel id>
+# DRAFT_STORAGE=sqlite in .env keeps new drafts in sqlite instead of pickleDB files
+with startup_profile.step('load drafts'):
+    drafts = DraftRegistry('drafts', catalog, storage=os.getenv('DRAFT_STORAGE', 'pickle'), on_unload=actors.remove)
 
-def search_cards(fragment):
-    fragment = fragment.lower()
+    # profiling doesn't move files around, but loading a draft still cuts a
+    # torn last line off its journal, as any start does
+    if not PROFILE_STARTUP:
+        migrate_single_draft('.', drafts)
 
-    ret = []
-    for card_id in card_data.all():
-        if fragment in card_id:
-            ret.append(get_card(card_id))
+    drafts.load_active()
 
-        if len(ret) >= SEARCH_MAX_LENGTH:
-            break
+# sheet writes are batched and sent from a background task, see on_ready;
+# gspread is only imported once something is written
+sheet_publisher = SheetPublisher(GspreadBackend('google-cloud-credentials.json'))
+sheet_publisher_task = None
 
-    return ret
+intents = discord.Intents.default()
+intents.message_content = True
+intents.members = True
 
-def get_player_count():
-    return len(draft_data.get('pick-order'))
+bot = commands.Bot(command_prefix='!', intents=intents)
 
-def get_pick_number():
-    return draft_data.get('pick-number')
+# optional prometheus export of the latency histograms, see on_ready
+metrics_tasks = None
 
-def get_current_round():
-    if get_player_count() == 0:
-        return 0
+# RECORD_COMMANDS=<path> in .env logs every command, for python -m rotisserie.replay
+command_recorder = CommandRecorder(os.getenv('RECORD_COMMANDS')) if os.getenv('RECORD_COMMANDS') else None
 
-    return floor(get_pick_number() / get_player_count())
+@bot.listen('on_message')
+async def record_command(message):
+    if command_recorder and not message.author.bot and message.content.startswith(bot.command_prefix):
+        command_recorder.record(message)
 
-def get_has_finished():
-    return get_current_round() >= draft_data.get('number-of-rounds')
+@bot.before_invoke
+async def start_command_timer(ctx):
+    ctx.started_at = time.perf_counter()
 
-def get_current_index():
-    player_count = get_player_count()
-    pick_number_in_round = get_pick_number() % player_count
+# runs whether or not the command succeeded
+@bot.after_invoke
+async def stop_command_timer(ctx):
+    metrics.observe(f'command.{ctx.command.name}', time.perf_counter() - ctx.started_at)
 
-    # snaking forwards
-    if get_current_round() % 2 == 0:
-        return pick_number_in_round
+async def send_message(destination, text):
+    (kind, target_id) = destination
+    target = bot.get_user(target_id) if kind == 'user' else bot.get_channel(target_id)
+    await target.send(text)
 
-    #snaking backwards
-    return player_count - 1 - pick_number_in_round
+# all announcements and notifications go out through here, in order per
+# channel and within discord's rate limits, see on_ready
+outbox = Outbox(send_message)
+outbox_task = None
 
-def get_google_sheet(sheet_name):
-    gc = gspread.service_account(filename='google-cloud-credentials.json')
-    return gc.open_by_key(draft_data.get('google-sheet-id')).worksheet(sheet_name)
+snipe_notifier = SnipeNotifier(outbox, catalog)
 
-intents = discord.Intents.default()
-intents.message_content = True
-intents.members = True
+def find_draft(ctx, create=False):
+    # commands in a server channel belong to that channel's draft
+    if ctx.guild is not None:
+        return drafts.get(ctx.channel.id, create=create)
 
-bot = commands.Bot(command_prefix='!', intents=intents)
+    # direct messages go to the one draft the author is playing in
+    user_drafts = drafts.drafts_for_user(str(ctx.author.id))
 
-@bot.command(help='Register for the draft')
-async def register(ctx, *, team_name=commands.parameter(description='Optional: Defaults to discord username', default='')):
-    # check if the user is already registered
-    if get_user(ctx.author.id):
-        await ctx.send('ERROR: You\'re already registered!')
-        return
+    if len(user_drafts) > 1:
+        raise DraftError('You are registered in several drafts. Please use the channel of the draft you mean.')
 
-    # If the draft has been started, this command should be rejected
-    if draft_data.get('has-started') == True:
-        await ctx.send('ERROR: The draft has already been started.')
-        return
+    return user_drafts[0] if user_drafts else None
 
-    # default team_name to their discord username
-    if len(team_name) == 0:
-        team_name = ctx.author.name
+def announce(draft, event):
+    snipe_notifier.add(draft, event)
 
-    # Reject the user if the team name is already in use
-    for user_id in user_data.all():
-        user = get_user(user_id)
-        if team_name == user['team-name']:
-            await ctx.send('ERROR: That team name is already in use! Please pick another one.')
-            return
+    if event['type'] == 'pick':
+        drafter = draft.get_user(event['user-id'])
+        card_name = catalog.name(event['card-id'])
 
-    # registration looks good, so create and store a new user dict
-    new_user = {
-        'discord-id': ctx.author.id,
-        'discord-name': ctx.author.name,
-        'discord-discriminator': ctx.author.discriminator,
+        if draft.state.google_sheet_id:
+            row = 4 + draft.get_round(event['pick-number'])
+            col = 3 + draft.get_index(event['pick-number'])
+            sheet_publisher.update_cell(draft.state.google_sheet_id, 'Draft', row, col, card_name)
 
-        'team-name': team_name,
-        'drafted-cards': [],
-        'wanted-cards': []
-    }
+        info_string = f"{draft.pick_string(event['pick-number'])}\n{drafter['team-name']} has drafted {card_name}"
 
-    user_data.set(ctx.author.id, new_user)
-    user_data.save()
+        if event.get('auto'):
+            info_string += ' (out of time, picked from their backup list)'
 
-    await ctx.send(f'Your team, {team_name}, has been registered. Happy dueling!')
+        print(info_string)
 
-@bot.command(help='Start the draft.\n* Ensure all players are registered first')
-async def start_draft(ctx, *, google_sheet_id=commands.parameter(description='Optional: Publish draft data to a Lucky Paper Template', default='')):
-    # if the draft has already finished, this command should be rejected
-    if get_has_finished() == True:
-        await ctx.send('ERROR: The draft already finished. If you want to run a new draft, kill the bot and then delete db files.')
+        # consecutive picks are merged into one message
+        outbox.post(('channel', draft.state.main_channel), info_string, merge=True)
+
+    elif event['type'] == 'reminded':
+        drafter = draft.get_user(event['user-id'])
+        time_left = format_duration(draft.clock_expiry() - time.time())
+
+        outbox.post(('user', drafter['discord-id']), f"Reminder: {time_left} left to draft {draft.pick_string(draft.get_pick_number())}, after that a card from your !backup list is picked for you")
+
+    elif event['notice'] == 'turn':
+        drafter = draft.get_user(event['user-id'])
+        turn_string = f"It's your turn to draft: {draft.pick_string(draft.get_pick_number())}"
+
+        if draft.clock_expiry() is not None:
+            turn_string += f'\nYou have {format_duration(draft.clock_expiry() - time.time())}, after that a card from your !backup list is picked for you'
+
+        outbox.post(('user', drafter['discord-id']), turn_string)
+
+    elif event['notice'] == 'complete':
+        print(f'Draft {draft.draft_id} is over')
+
+        outbox.post(('channel', draft.state.main_channel), 'The draft is complete!')
+
+    deadline_scheduler.schedule(draft)
+
+# one engine makes the picks for every draft, see on_ready
+pick_engine = PickEngine(drafts, actors, announce, on_idle=snipe_notifier.flush)
+pick_engine_task = None
+
+# wakes the engine when a pick clock needs a reminder or an auto-pick, see on_ready
+deadline_scheduler = DeadlineScheduler(pick_engine.signal)
+deadline_scheduler_task = None
+
+@bot.command(help='Register for the draft in this channel')
+async def register(ctx, *, team_name=commands.parameter(description='Optional: Defaults to discord username', default='')):
+    if ctx.guild is None:
+        await ctx.send('ERROR: Please register in the channel of the draft you want to join.')
         return
 
-    # If the draft has been started, this command should be rejected
-    if draft_data.get('has-started') == True:
-        await ctx.send('ERROR: The draft has already been started.')
+    try:
+        new_user = await actors.submit(find_draft(ctx, create=True), 'register', str(ctx.author.id), ctx.author.id, ctx.author.name, ctx.author.discriminator, team_name)
+    except DraftError as e:
+        await ctx.send(f'ERROR: {e}')
         return
 
-    draft_data.set('has-started', True)
-    draft_data.set('time-began', str(datetime.now()))
-    draft_data.set('main-channel', ctx.channel.id)
-    draft_data.set('current-drafter-notified', False)
+    await ctx.send(f"Your team, {new_user['team-name']}, has been registered. Happy dueling!")
 
-    # get a random ordering of users
-    pick_order = list(user_data.all())
-    random.shuffle(pick_order)
+@bot.command(help='Start the draft in this channel.\n* Ensure all players are registered first')
+async def start_draft(ctx, *, google_sheet_id=commands.parameter(description='Optional: Publish draft data to a Lucky Paper Template', default='')):
+    if ctx.guild is None:
+        await ctx.send('ERROR: Please start the draft from its channel.')
+        return
 
-    draft_data.set('pick-order', pick_order)
+    try:
+        draft = find_draft(ctx, create=True)
+        pick_order = await actors.submit(draft, 'start', ctx.channel.id, google_sheet_id)
+    except DraftError as e:
+        await ctx.send(f'ERROR: {e}')
+        return
 
     # transform into team names for printing
-    pick_order_names = list(map(lambda user_id:get_user(user_id)['team-name'], pick_order))
+    pick_order_names = list(map(lambda user_id:draft.get_user(user_id)['team-name'], pick_order))
 
     pick_order_string = ', '.join(pick_order_names)
 
     if google_sheet_id:
-        draft_data.set('google-sheet-id', google_sheet_id)
-        range_string = f'B12:B{12+get_player_count()-1}'
+        range_string = f'B12:B{12+draft.get_player_count()-1}'
         # generate list of lists because we are updating a vertical range
         player_names = list(map(lambda name:[name], pick_order_names))
-        get_google_sheet('Overview').update(player_names, range_string)
+        sheet_publisher.update(google_sheet_id, 'Overview', range_string, player_names)
 
-    draft_data.save()
+    pick_engine.signal(draft)
 
     await ctx.send(f'The draft has been started!\nThe draft order is: {pick_order_string}')
 
-# currently allowing duplicates into the wantlist
-# b/c would like to natively handle multiple copies of cards
 @bot.command(help='Add a card to your want list.\n* A partial card name is acceptable as long as it is not ambiguous.\n* Drafting priority is given in the order the cards were added.')
 async def draft(ctx, *, card_name=commands.parameter(description='Name of card to add.')):
-    user = get_user(ctx.author.id)
-    card = get_card(card_name)
+    try:
+        draft = find_draft(ctx)
 
-    if not user:
-        await ctx.send('ERROR: Not registered. Try the !register command')
+        if not draft:
+            raise DraftError('Not registered. Try the !register command')
+
+        await actors.submit(draft, 'want', str(ctx.author.id), card_name)
+    except DraftError as e:
+        await ctx.send(f'ERROR: {e}')
         return
 
-    # ensure a clear match before proceeding
-    #   either an exact string match (in which case card is already populated)
-    #   or use the card from search if there is exactly 1 match
-    if not card:
-        card_list = search_cards(card_name)
+    pick_engine.signal(draft)
+
+    wanted_cards_string = ', '.join(map(catalog.name, draft.get_user(ctx.author.id)['wanted-cards']))
 
-        if len(card_list) == 0:
-            await ctx.send('ERROR: No matching cards found. Try !search to resolve')
-            return
+    await ctx.send(f'Draftlist Updated: {wanted_cards_string}')
+
+@bot.command(help='Set the pick clock for the draft in this channel.\n* Every pick gets pick_minutes, then the drafter\'s time bank for the whole draft runs down\n* When both run out, a card from their backup list is picked for them\n* 0 turns the clock off\n* Only for the bot owner and server administrators')
+@commands.check_any(commands.is_owner(), commands.has_permissions(administrator=True))
+async def pick_clock(ctx, pick_minutes: float = commands.parameter(description='Minutes per pick'), bank_minutes: float = commands.parameter(description='Optional: Extra minutes per player for the whole draft', default=0)):
+    if ctx.guild is None:
+        await ctx.send('ERROR: Please set the pick clock from the draft\'s channel.')
+        return
 
-        if len(card_list) > 1:
-            card_list_string = ', '.join(map(lambda card:card['name'], card_list))
-            await ctx.send(f'ERROR: Multiple matching cards found. Please be precise\nMatches: {card_list_string}')
-            return
+    try:
+        draft = find_draft(ctx)
 
-        card = card_list[0]
+        if not draft:
+            raise DraftError('There is no draft in this channel yet. Try the !register command')
 
-    # if the draft has already finished, this command should be rejected
-    if get_has_finished() == True:
-        await ctx.send('ERROR: The draft already finished. If you want to run a new draft, kill the bot and then delete db files.')
+        await actors.submit(draft, 'set_clock', pick_minutes * 60, bank_minutes * 60)
+    except DraftError as e:
+        await ctx.send(f'ERROR: {e}')
         return
 
-    # block excessive wantlist for efficiency purposes
-    if len(user['wanted-cards']) >= WANTLIST_MAX_LENGTH:
-        await ctx.send('ERROR: Your draft list is too long. Please remove some cards before trying to draft more. !clear to wipe list')
+    deadline_scheduler.schedule(draft)
+    pick_engine.signal(draft)
+
+    if pick_minutes:
+        await ctx.send(f'Pick clock set: {format_duration(pick_minutes * 60)} per pick, plus a time bank of {format_duration(bank_minutes * 60)} per player')
+    else:
+        await ctx.send('Pick clock turned off')
+
+@bot.command(help='Take back the last picks of the draft in this channel.\n* The cards go back into the pool and the drafter of the earliest one is on the clock again\n* Want lists are not restored\n* Only for the bot owner and server administrators')
+@commands.check_any(commands.is_owner(), commands.has_permissions(administrator=True))
+async def undo(ctx, count: int = commands.parameter(description='Optional: Number of picks to take back', default=1)):
+    if ctx.guild is None:
+        await ctx.send('ERROR: Please undo picks from the draft\'s channel.')
         return
 
-    # cannot want a card that has already been taken
-    if card['taken']:
-        await ctx.send('ERROR: Card already taken')
+    try:
+        draft = find_draft(ctx)
+
+        if not draft:
+            raise DraftError('There is no draft in this channel yet. Try the !register command')
+
+        undone_picks = await actors.submit(draft, 'undo', count)
+    except DraftError as e:
+        await ctx.send(f'ERROR: {e}')
         return
 
-    user['wanted-cards'].append(card['id'])
-    user_data.save()
+    lines = []
+    for pick in undone_picks:
+        if draft.state.google_sheet_id:
+            row = 4 + draft.get_round(pick['pick-number'])
+            col = 3 + draft.get_index(pick['pick-number'])
+            sheet_publisher.update_cell(draft.state.google_sheet_id, 'Draft', row, col, '')
 
-    wanted_cards_string = ', '.join(map(lambda card_id:get_card(card_id)['name'], user['wanted-cards']))
+        lines.append(f"{draft.pick_string(pick['pick-number'])}: {draft.get_user(pick['user-id'])['team-name']} no longer has {catalog.name(pick['card-id'])}")
 
-    await ctx.send(f'Draftlist Updated: {wanted_cards_string}')
+    deadline_scheduler.schedule(draft)
+    pick_engine.signal(draft)
 
-@bot.command(help='Clear your want list')
-async def clear(ctx):
-    user = get_user(ctx.author.id)
+    await ctx.send('Undone:\n' + '\n'.join(lines) + '\nUse !redo to make these picks again')
 
-    if not user:
-        await ctx.send('ERROR: Not registered. Try the !register command')
+@bot.command(help='Make undone picks of the draft in this channel again.\n* Only possible until the next pick is made\n* Only for the bot owner and server administrators')
+@commands.check_any(commands.is_owner(), commands.has_permissions(administrator=True))
+async def redo(ctx, count: int = commands.parameter(description='Optional: Number of picks to make again', default=1)):
+    if ctx.guild is None:
+        await ctx.send('ERROR: Please redo picks from the draft\'s channel.')
         return
 
-    user['wanted-cards'] = []
-    user_data.save()
-
-    await ctx.send('Draftlist Wiped')
+    try:
+        draft = find_draft(ctx)
 
-@bot.command(help=f'Search for a card by name\n* Partial matches are acceptable\n* No more than {SEARCH_MAX_LENGTH} results will be provided')
-async def search(ctx, *, card_name=commands.parameter(description='Name of card to search for.')):
-    card_list = search_cards(card_name)
+        if not draft:
+            raise DraftError('There is no draft in this channel yet. Try the !register command')
 
-    if len(card_list):
-        await ctx.send(', '.join(map(lambda card:card['name'], card_list)))
-    else:
-        await ctx.send(f'No cards found matching {card_name}')
+        events = await actors.submit(draft, 'redo', count)
+    except DraftError as e:
+        await ctx.send(f'ERROR: {e}')
+        return
 
-@tasks.loop(seconds=5)
-async def attempt_draft():
-    print('Attempting to perform draft')
+    # announced like any other pick, which also fills the sheet in again
+    for event in events:
+        announce(draft, event)
 
-    if get_has_finished():
-        print('Draft is over')
+    pick_engine.signal(draft)
 
-        if not draft_data.get('current-drafter-notified'):
-            bot.loop.create_task(bot.get_channel(draft_data.get('main-channel')).send('The draft is complete!'))
+@bot.command(help='Add a card to your backup list.\n* When your pick clock runs out, the first card on it that is still available is picked for you\n* Without one, the first card still available in the card list is picked')
+async def backup(ctx, *, card_name=commands.parameter(description='Name of card to add.')):
+    try:
+        draft = find_draft(ctx)
 
-            draft_data.set('current-drafter-notified', True)
-            draft_data.save()
+        if not draft:
+            raise DraftError('Not registered. Try the !register command')
 
+        await actors.submit(draft, 'backup', str(ctx.author.id), card_name)
+    except DraftError as e:
+        await ctx.send(f'ERROR: {e}')
         return
 
-    if not draft_data.get('has-started'):
-        print('Draft has not started')
+    backup_cards_string = ', '.join(map(catalog.name, draft.get_user(ctx.author.id)['backup-cards']))
+
+    await ctx.send(f'Backup List Updated: {backup_cards_string}')
+
+@bot.command(help='Clear your backup list')
+async def clear_backups(ctx):
+    try:
+        draft = find_draft(ctx)
+
+        if not draft:
+            raise DraftError('Not registered. Try the !register command')
+
+        await actors.submit(draft, 'clear_backups', str(ctx.author.id))
+    except DraftError as e:
+        await ctx.send(f'ERROR: {e}')
         return
 
-    current_drafter = get_user(draft_data.get('pick-order')[get_current_index()])
-    want_list = current_drafter['wanted-cards']
+    await ctx.send('Backup List Wiped')
 
-    pick_string = f"Round {get_current_round()+1}, Pick {(get_pick_number() % get_player_count())+1}"
+async def update_want_list(ctx, card_names, replace):
+    lines = card_names.splitlines()
 
-    if len(want_list) == 0:
-        print('Waiting on current drafter')
+    # a list can also come as an attached text file
+    for attachment in ctx.message.attachments:
+        lines += (await attachment.read()).decode('utf-8', errors='replace').splitlines()
 
-        if not draft_data.get('current-drafter-notified'):
-            bot.loop.create_task(bot.get_user(current_drafter['discord-id']).send(f"It's your turn to draft: {pick_string}"))
+    try:
+        draft = find_draft(ctx)
 
-            draft_data.set('current-drafter-notified', True)
-            draft_data.save()
+        if not draft:
+            raise DraftError('Not registered. Try the !register command')
 
+        if lines:
+            (want_list, errors) = await actors.submit(draft, 'want_many', str(ctx.author.id), lines, replace=replace)
+        else:
+            want_list = actors.snapshot(draft).wanted_cards.get(str(ctx.author.id))
+            errors = []
+
+            if want_list is None:
+                raise DraftError('Not registered. Try the !register command')
+    except DraftError as e:
+        await ctx.send(f'ERROR: {e}')
         return
 
-    card_to_draft = get_card(want_list[0])
-    assert card_to_draft['taken'] == False, 'Already taken card appears in want-list'
+    pick_engine.signal(draft)
+
+    reply = 'Draftlist:\n' + '\n'.join(map(lambda position:f'#{position+1} {catalog.name(want_list[position])}', range(len(want_list))))
 
-    # remove the card to draft from all want lists
-    for user_id in user_data.all():
-        user = get_user(user_id)
-        user['wanted-cards'] = list(filter(lambda card_id:card_id != card_to_draft['id'], user['wanted-cards']))
+    if errors and replace:
+        reply += '\n\nNot replaced, every line has to be a card you can draft:\n' + '\n'.join(errors)
+    elif errors:
+        reply += '\n\nSkipped:\n' + '\n'.join(errors)
 
-        # TODO snipe notifications go here if desired
+    for message in split_message(reply):
+        await ctx.send(message)
 
-    get_google_sheet('Draft').update_cell(4 + get_current_round(), 3 + get_current_index(), card_to_draft['name'])
+@bot.command(help='Add several cards to your want list at once, one card per line or in an attached text file.\n* Every line is checked first, cards that can\'t be added are listed together and the rest are added\n* #n stands for the card at position n of your current list\n* Without any cards, shows your list')
+async def draft_list(ctx, *, card_names=commands.parameter(description='Names of cards to add, one per line.', default='')):
+    await update_want_list(ctx, card_names, replace=False)
 
-    card_to_draft['taken'] = True
-    current_drafter['drafted-cards'].append(card_to_draft['id'])
+@bot.command(help='Replace your want list, one card per line or in an attached text file.\n* Reorder or remove cards by listing them, e.g. #3, #1, #2 on separate lines moves your third card to the front and drops the rest\n* #n stands for the card at position n of your current list\n* If any line can\'t be added, your list is left as it was')
+async def set_draft_list(ctx, *, card_names=commands.parameter(description='Names of cards in the new list, one per line.', default='')):
+    await update_want_list(ctx, card_names, replace=True)
 
-    info_string = f"{pick_string}\n{current_drafter['team-name']} has drafted {card_to_draft['name']}"
+@bot.command(help='Clear your want list')
+async def clear(ctx):
+    try:
+        draft = find_draft(ctx)
 
-    print(info_string)
+        if not draft:
+            raise DraftError('Not registered. Try the !register command')
 
-    bot.loop.create_task(bot.get_channel(draft_data.get('main-channel')).send(info_string))
+        await actors.submit(draft, 'clear', str(ctx.author.id))
+    except DraftError as e:
+        await ctx.send(f'ERROR: {e}')
+        return
 
-    draft_data.set('pick-number', draft_data.get('pick-number') + 1)
-    draft_data.set('current-drafter-notified', False)
+    pick_engine.signal(draft)
 
-    save_all()
+    await ctx.send('Draftlist Wiped')
+
+@bot.command(help=f'Search for a card by name\n* Partial matches are acceptable\n* Filter by color, mana value and type, e.g. c:u mv<=2 t:creature, if card attributes were imported\n* In a draft\'s channel, cards already drafted are marked (taken)\n* No more than {SEARCH_MAX_LENGTH} results will be provided')
+async def search(ctx, *, card_name=commands.parameter(description='Name of card to search for, and filters.')):
+    try:
+        card_list = search_cards(catalog, card_attributes() if has_filter_terms(card_name) else None, card_name, limit=SEARCH_MAX_LENGTH)
+    except SearchError as e:
+        await ctx.send(f'ERROR: {e}')
+        return
+
+    # a direct message from a player in several drafts can't tell which cards are taken
+    try:
+        draft = find_draft(ctx)
+    except DraftError:
+        draft = None
+
+    # never waits for changes to the draft, it may be a pick behind
+    taken_cards = actors.snapshot(draft).taken_cards if draft else ()
+
+    if len(card_list):
+        await ctx.send(', '.join(map(lambda card_id:catalog.name(card_id) + (' (taken)' if card_id in taken_cards else ''), card_list)))
+    else:
+        await ctx.send(f'No cards found matching {card_name}')
+
+@bot.command(name='metrics', help='Show how long commands, picks and sends have been taking.\n* Only for the bot owner and server administrators', hidden=True)
+@commands.check_any(commands.is_owner(), commands.has_permissions(administrator=True))
+async def metrics_report(ctx):
+    await ctx.send(f'```\n{metrics.summary()}\n```\n{outbox.pending()} messages waiting to be sent')
 
 @bot.event
 async def on_ready():
+    global pick_engine_task, deadline_scheduler_task, sheet_publisher_task, outbox_task, metrics_tasks
+
     print('Bot is ready!')
-    attempt_draft.start()
 
-bot.run(os.getenv('DISCORD_TOKEN'))
+    # on_ready fires again after reconnects, only one of each task should run
+    if pick_engine_task is None:
+        pick_engine_task = asyncio.create_task(pick_engine.run())
+
+    if deadline_scheduler_task is None:
+        deadline_scheduler_task = asyncio.create_task(deadline_scheduler.run())
+
+        for draft in drafts.loaded():
+            deadline_scheduler.schedule(draft)
+
+    if sheet_publisher_task is None:
+        sheet_publisher_task = asyncio.create_task(sheet_publisher.run())
+
+    if outbox_task is None:
+        outbox_task = asyncio.create_task(outbox.run())
+
+    # METRICS_FILE and METRICS_PORT in .env turn on the prometheus export
+    if metrics_tasks is None:
+        metrics_tasks = []
+
+        if os.getenv('METRICS_FILE'):
+            metrics_tasks.append(asyncio.create_task(metrics.export_file(os.getenv('METRICS_FILE'))))
+
+        if os.getenv('METRICS_PORT'):
+            metrics_tasks.append(asyncio.create_task(metrics.serve(int(os.getenv('METRICS_PORT')))))
+
+    pick_engine.signal_all()
+
+# python -m rotisserie.replay imports this file to drive the bot without discord
+if __name__ == '__main__':
+    if PROFILE_STARTUP:
+        print(startup_profile.report())
+        print(f'{len(drafts.loaded())} drafts loaded')
+        sys.exit(0)
+
+    bot.run(os.getenv('DISCORD_TOKEN'))
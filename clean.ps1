@@ -1,5 +1,12 @@
+param([string]$DraftId)
+
 $ErrorActionPreference = "Stop"
 
-Remove-Item -ErrorAction SilentlyContinue cards.db
-Remove-Item -ErrorAction SilentlyContinue draft.db
-Remove-Item -ErrorAction SilentlyContinue users.db
+# .\clean.ps1 <channel id> resets a single draft, no argument resets everything
+if ($DraftId) {
+    Remove-Item -ErrorAction SilentlyContinue -Recurse (Join-Path drafts $DraftId)
+    exit
+}
+
+Remove-Item -ErrorAction SilentlyContinue cards.catalog
+Remove-Item -ErrorAction SilentlyContinue -Recurse drafts
@@ -3,6 +3,7 @@
 import discord
 import os
 import random
+import sys
 
 from discord.ext import commands, tasks
 from dotenv import load_dotenv
@@ -10,6 +11,10 @@ from pickledb import PickleDB
 from swiss.match_log import MatchLog
 from swiss.pairing_strategies.min_cost import pairings
 
+# the command log is shared with the draft bot in the directory above
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from rotisserie.recorder import CommandRecorder
+
 load_dotenv()
 
 ROUNDS = 3
@@ -44,6 +49,15 @@ intents.message_content = True
 
 bot = commands.Bot(command_prefix='', intents=intents)
 
+# RECORD_COMMANDS=<path> in .env logs every message, commands have no prefix here,
+# for python -m rotisserie.replay --bot pairings/bot.py
+command_recorder = CommandRecorder(os.getenv('RECORD_COMMANDS')) if os.getenv('RECORD_COMMANDS') else None
+
+@bot.listen('on_message')
+async def record_command(message):
+    if command_recorder and not message.author.bot:
+        command_recorder.record(message)
+
 @bot.command()
 async def register(ctx, *, args):
     name = args
@@ -207,4 +221,6 @@ async def on_ready():
     print('Bot is ready!')
     attempt_draft.start()
 
-bot.run(os.getenv('DISCORD_TOKEN'))
+# python -m rotisserie.replay imports this file to drive the bot without discord
+if __name__ == '__main__':
+    bot.run(os.getenv('DISCORD_TOKEN'))
@@ -1,11 +1,15 @@
 from .match_result import MatchResult
 from .shared_functions import bye_dummy_player_name
-import networkx as nx
 import random
 
 class MatchLog:
     def __init__(self):
         self._entries = []
+        # Running totals kept up to date by _count, so lookups don't scan _entries
+        self._times_matched = {}
+        self._times_got_bye = {}
+        self._times_match_win = {}
+        self._player_score = {}
         self._explicit_players = []
         self._player_active_map = {}
         # Ensures we don't error if the user tries to look this up
@@ -21,7 +25,7 @@ class MatchLog:
     def add_result(self, player_a, player_b, wins_a, wins_b):
         self.add_player(player_a)
         self.add_player(player_b)
-        self._entries.append(MatchResult(player_a, player_b, wins_a, wins_b))
+        self._count(MatchResult(player_a, player_b, wins_a, wins_b))
 
 
     def set_player_active(self, player, new_state):
@@ -33,7 +37,22 @@ class MatchLog:
 
 
     def add_bye(self, player):
-        self._entries.append(MatchResult(player, None, 0, 0))
+        self._count(MatchResult(player, None, 0, 0))
+
+
+    def _count(self, entry):
+        self._entries.append(entry)
+
+        pair = frozenset((entry.player_a(), entry.player_b()))
+        self._times_matched[pair] = self._times_matched.get(pair, 0) + 1
+
+        winner = entry.winner()
+        self._times_match_win[winner] = self._times_match_win.get(winner, 0) + 1
+        if entry.is_bye():
+            self._times_got_bye[winner] = self._times_got_bye.get(winner, 0) + 1
+
+        for (player, wins) in [(entry.player_a(), entry.player_a_wins()), (entry.player_b(), entry.player_b_wins())]:
+            self._player_score[player] = self._player_score.get(player, 0) + wins
 
 
     def players(self):
@@ -49,38 +68,27 @@ class MatchLog:
 
 
     def times_matched(self, player_a, player_b):
-        rslt = 0
-        for entry in self._entries:
-            if entry.has_players(player_a, player_b):
-                rslt += 1
-        return rslt
+        return self._times_matched.get(frozenset((player_a, player_b)), 0)
+
+
+    def pair_counts(self):
+        """
+        Every pair of players who have faced each other, with how many times,
+        as ((player_a, player_b), times). Byes are not included.
+        """
+        return [(tuple(pair), times) for (pair, times) in self._times_matched.items() if None not in pair and len(pair) == 2]
 
 
     def times_got_bye(self, player):
-        rslt = 0
-        for entry in self._entries:
-            if entry.is_bye() and entry.winner() == player:
-                rslt += 1
-        return rslt
+        return self._times_got_bye.get(player, 0)
 
 
     def times_match_win(self, player):
-        rslt = 0
-        for entry in self._entries:
-            winner = entry.winner()
-            if winner == player:
-                rslt += 1
-        return rslt
+        return self._times_match_win.get(player, 0)
 
 
     def player_score(self, player):
-        rslt = 0
-        for entry in self._entries:
-            if entry.player_a() == player:
-                rslt += entry.player_a_wins()
-            if entry.player_b() == player:
-                rslt += entry.player_b_wins()
-        return rslt
+        return self._player_score.get(player, 0)
 
 
     def min_active_bye_count(self):
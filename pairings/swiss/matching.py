@@ -0,0 +1,395 @@
+import collections
+import numpy as np
+
+# The dense backend doubles costs into weights, and slacks add up two
+# duals of about that size, so costs have to leave room for that in an int64
+MAX_DENSE_COST = 2**60
+
+def networkx_matching(cost_matrix, active):
+    """
+    Reference backend, networkx's max_weight_matching on a graph of the
+    active players.
+
+    Like every matching backend, take a square cost matrix and a boolean
+    array telling which player numbers may be paired, and return a list of
+    (a, b) pairs of player numbers, a < b, that pairs as many of them as
+    possible with the lowest total cost.
+    """
+    # networkx is slow to import, so only load it once pairings are needed
+    import networkx as nx
+
+    numbers = [int(i) for i in np.flatnonzero(active)]
+    graph = nx.Graph()
+    graph.add_nodes_from(numbers)
+    for (i, a) in enumerate(numbers):
+        for b in numbers[:i]:
+            graph.add_edge(a, b, weight=-int(cost_matrix[a][b]))
+    return sorted(tuple(sorted(pair)) for pair in nx.max_weight_matching(graph, maxcardinality=True))
+
+
+def dense_matching(cost_matrix, active):
+    """
+    Array-based backend, Edmonds' blossom algorithm on the cost matrix.
+
+    Costs have to be below MAX_DENSE_COST, raise OverflowError otherwise.
+    """
+    numbers = np.flatnonzero(active)
+    if len(numbers) < 2:
+        return []
+
+    costs = np.asarray(cost_matrix, dtype=np.int64)[np.ix_(numbers, numbers)]
+    if costs.max() >= MAX_DENSE_COST:
+        raise OverflowError("Pairing costs too large for the dense matching backend")
+
+    # Positive weights to maximize instead, 0 means there is no edge. Even
+    # ones, so duals starting at a vertex's best weight all have the same parity
+    weights = 2*(costs.max() - costs + 1)
+    np.fill_diagonal(weights, 0)
+
+    mate = _DenseBlossom(weights).solve()
+    return [(int(numbers[a]), int(numbers[b])) for (a, b) in enumerate(mate) if a < b]
+
+
+MATCHING_BACKENDS = {
+    "dense": dense_matching,
+    "networkx": networkx_matching,
+}
+
+
+class _DenseBlossom:
+    """
+    Maximum-cardinality, maximum-weight matching on a complete weight matrix.
+
+    The O(n^3) primal-dual blossom algorithm with slack tracking, where the
+    edges between top-level blossoms are kept as matrices so that scanning a
+    vertex, updating slacks and changing duals are array operations.
+
+    Vertices are numbered 1..n and blossoms n+1..2n, 0 means none. For the
+    top-level blossoms or vertices x and y, (edge_u, edge_v, edge_w)[x, y] is
+    the edge with the least slack between a vertex of x and a vertex of y.
+    """
+
+    def __init__(self, weights):
+        n = len(weights)
+        size = 2*n + 1
+        numbers = np.arange(1, n + 1)
+
+        self.n = n
+        self.n_x = n
+        self.edge_u = np.zeros((size, size), dtype=np.int64)
+        self.edge_v = np.zeros((size, size), dtype=np.int64)
+        self.edge_w = np.zeros((size, size), dtype=np.int64)
+        self.edge_u[1:n + 1, 1:n + 1] = numbers[:, None]
+        self.edge_v[1:n + 1, 1:n + 1] = numbers[None, :]
+        self.edge_w[1:n + 1, 1:n + 1] = weights
+
+        self.lab = np.zeros(size, dtype=np.int64)
+        self.match = np.zeros(size, dtype=np.int64)
+        self.slack = np.zeros(size, dtype=np.int64)
+        # The top-level blossom of every vertex and blossom, 0 for free blossom numbers
+        self.st = np.zeros(size, dtype=np.int64)
+        self.st[:n + 1] = np.arange(n + 1)
+        self.pa = np.zeros(size, dtype=np.int64)
+        # -1 unlabeled, 0 outer (S), 1 inner (T)
+        self.S = np.full(size, -1, dtype=np.int64)
+        self.vis = np.zeros(size, dtype=np.int64)
+        self.vis_time = 0
+        self.flower = [[] for _ in range(size)]
+        # flower_from[b][v] is the sub-blossom of b containing vertex v
+        self.flower_from = np.zeros((size, n + 1), dtype=np.int64)
+        self.flower_from[numbers, numbers] = numbers
+        self.queue = collections.deque()
+
+
+    def solve(self):
+        """
+        Return mate, mate[a] == b if vertex a - 1 is matched with b - 1, else -1.
+        """
+        n = self.n
+        weights = self.edge_w[1:n + 1, 1:n + 1]
+        w_max = weights.max()
+        if n % 2 == 0:
+            self._greedy_start(weights, w_max)
+        else:
+            # Some vertex stays free, and the ones left free have to end up
+            # with the same dual for the matching to have the most weight
+            self.lab[1:n + 1] = w_max
+        while self._augment_once():
+            pass
+        return [int(self.match[u]) - 1 for u in range(1, n + 1)]
+
+
+    def _greedy_start(self, weights, w_max):
+        """
+        Start from duals that leave every vertex a tight edge, and greedily
+        match along tight edges. Only for an even number of vertices, where
+        the matching will be perfect and the duals of free vertices don't
+        need to be equal.
+        """
+        n = self.n
+        lab = weights.max(axis=1)
+        # Then lower each dual as far as the others allow, which makes more edges tight
+        for u in range(n):
+            bounds = 2*weights[u] - lab
+            bounds[u] = bounds.min()
+            lab[u] = bounds.max()
+        # Outer vertices need duals of the same parity for slacks to halve evenly
+        assert(((lab - w_max) % 2 == 0).all())
+        self.lab[1:n + 1] = lab
+
+        tight = (lab[:, None] + lab[None, :] == 2*weights) & (weights > 0)
+        for u in range(n):
+            if self.match[u + 1] == 0:
+                (candidates,) = np.nonzero(tight[u] & (self.match[1:n + 1] == 0))
+                if len(candidates) > 0:
+                    v = candidates[0]
+                    self.match[u + 1] = v + 1
+                    self.match[v + 1] = u + 1
+
+
+    def _e_delta(self, x, y):
+        return self.lab[self.edge_u[x, y]] + self.lab[self.edge_v[x, y]] - 2*self.edge_w[x, y]
+
+
+    def _set_slack(self, x):
+        n = self.n
+        candidates = (self.edge_w[1:n + 1, x] > 0) & \
+                     (self.st[1:n + 1] != x) & \
+                     (self.S[self.st[1:n + 1]] == 0)
+        if not candidates.any():
+            self.slack[x] = 0
+            return
+        deltas = self._e_delta(np.arange(1, n + 1), x)
+        (numbers,) = np.nonzero(candidates)
+        self.slack[x] = numbers[deltas[numbers].argmin()] + 1
+
+
+    def _q_push(self, x):
+        if x <= self.n:
+            self.queue.append(x)
+        else:
+            for y in self.flower[x]:
+                self._q_push(y)
+
+
+    def _set_st(self, x, b):
+        self.st[x] = b
+        if x > self.n:
+            for y in self.flower[x]:
+                self._set_st(y, b)
+
+
+    def _get_pr(self, b, xr):
+        flower = self.flower[b]
+        pr = flower.index(xr)
+        if pr % 2 == 1:
+            flower[1:] = flower[:0:-1]
+            return len(flower) - pr
+        return pr
+
+
+    def _set_match(self, u, v):
+        self.match[u] = self.edge_v[u, v]
+        if u > self.n:
+            xr = self.flower_from[u, self.edge_u[u, v]]
+            pr = self._get_pr(u, xr)
+            flower = self.flower[u]
+            for i in range(pr):
+                self._set_match(flower[i], flower[i ^ 1])
+            self._set_match(xr, v)
+            self.flower[u] = flower[pr:] + flower[:pr]
+
+
+    def _augment(self, u, v):
+        while True:
+            xnv = self.st[self.match[u]]
+            self._set_match(u, v)
+            if xnv == 0:
+                return
+            self._set_match(xnv, self.st[self.pa[xnv]])
+            (u, v) = (self.st[self.pa[xnv]], xnv)
+
+
+    def _get_lca(self, u, v):
+        self.vis_time += 1
+        while u or v:
+            if u != 0:
+                if self.vis[u] == self.vis_time:
+                    return u
+                self.vis[u] = self.vis_time
+                u = self.st[self.match[u]]
+                if u:
+                    u = self.st[self.pa[u]]
+            (u, v) = (v, u)
+        return 0
+
+
+    def _add_blossom(self, u, lca, v):
+        n = self.n
+        b = n + 1
+        while b <= self.n_x and self.st[b]:
+            b += 1
+        if b > self.n_x:
+            self.n_x += 1
+
+        self.lab[b] = 0
+        self.S[b] = 0
+        self.match[b] = self.match[lca]
+        flower = [lca]
+        x = u
+        while x != lca:
+            y = self.st[self.match[x]]
+            flower += [x, y]
+            self._q_push(y)
+            x = self.st[self.pa[y]]
+        flower[1:] = flower[:0:-1]
+        x = v
+        while x != lca:
+            y = self.st[self.match[x]]
+            flower += [x, y]
+            self._q_push(y)
+            x = self.st[self.pa[y]]
+        self.flower[b] = flower
+        self._set_st(b, b)
+
+        n_x = self.n_x
+        xs_all = np.arange(1, n_x + 1)
+        self.edge_w[b, 1:n_x + 1] = 0
+        self.edge_w[1:n_x + 1, b] = 0
+        self.flower_from[b, :] = 0
+        for xs in flower:
+            better = (self.edge_w[b, 1:n_x + 1] == 0) | \
+                     (self._e_delta(xs, xs_all) < self._e_delta(b, xs_all))
+            xs_better = xs_all[better]
+            for edge in (self.edge_u, self.edge_v, self.edge_w):
+                edge[b, xs_better] = edge[xs, xs_better]
+                edge[xs_better, b] = edge[xs_better, xs]
+            self.flower_from[b, self.flower_from[xs, :] != 0] = xs
+        self._set_slack(b)
+
+
+    def _expand_blossom(self, b):
+        flower = self.flower[b]
+        for xs in flower:
+            self._set_st(xs, xs)
+        xr = self.flower_from[b, self.edge_u[b, self.pa[b]]]
+        pr = self._get_pr(b, xr)
+        flower = self.flower[b]
+        for i in range(0, pr, 2):
+            xs = flower[i]
+            xns = flower[i + 1]
+            self.pa[xs] = self.edge_u[xns, xs]
+            self.S[xs] = 1
+            self.S[xns] = 0
+            self.slack[xs] = 0
+            self._set_slack(xns)
+            self._q_push(xns)
+        self.S[xr] = 1
+        self.pa[xr] = self.pa[b]
+        for xs in flower[pr + 1:]:
+            self.S[xs] = -1
+            self._set_slack(xs)
+        self.st[b] = 0
+
+
+    def _on_found_edge(self, eu, ev):
+        u = self.st[eu]
+        v = self.st[ev]
+        if self.S[v] == -1:
+            self.pa[v] = eu
+            self.S[v] = 1
+            nu = self.st[self.match[v]]
+            self.slack[v] = 0
+            self.slack[nu] = 0
+            self.S[nu] = 0
+            self._q_push(nu)
+        elif self.S[v] == 0:
+            lca = self._get_lca(u, v)
+            if not lca:
+                self._augment(u, v)
+                self._augment(v, u)
+                return True
+            self._add_blossom(u, lca, v)
+        return False
+
+
+    def _scan(self, u):
+        """
+        Look at every edge of outer vertex u, return True once it augmented.
+        """
+        n = self.n
+        weights = self.edge_w[u, 1:n + 1]
+        deltas = self.lab[u] + self.lab[1:n + 1] - 2*weights
+        (tight,) = np.nonzero((weights > 0) & (deltas == 0) & (self.st[1:n + 1] != self.st[u]))
+        for v in tight + 1:
+            # Blossoms formed along the way may have swallowed v
+            if self.st[u] != self.st[v]:
+                if self._on_found_edge(u, v):
+                    return True
+
+        # Every other edge may give a top-level blossom or vertex a lower slack
+        top = self.st[1:n + 1]
+        xs = top[(weights > 0) & (deltas != 0) & (top != self.st[u])]
+        if len(xs) > 0:
+            current = self.slack[xs]
+            better = (current == 0) | (self._e_delta(u, xs) < self._e_delta(current, xs))
+            self.slack[xs[better]] = u
+        return False
+
+
+    def _augment_once(self):
+        n = self.n
+        self.S[1:self.n_x + 1] = -1
+        self.slack[1:self.n_x + 1] = 0
+        self.queue.clear()
+        for x in range(1, self.n_x + 1):
+            if self.st[x] == x and self.match[x] == 0:
+                self.pa[x] = 0
+                self.S[x] = 0
+                self._q_push(x)
+        if not self.queue:
+            return False
+
+        while True:
+            while self.queue:
+                u = self.queue.popleft()
+                if self.S[self.st[u]] == 1:
+                    continue
+                if self._scan(u):
+                    return True
+
+            n_x = self.n_x
+            d = None
+            blossoms = np.arange(n + 1, n_x + 1)
+            inner = blossoms[(self.st[blossoms] == blossoms) & (self.S[blossoms] == 1)]
+            if len(inner) > 0:
+                d = int(self.lab[inner].min()) // 2
+            xs = np.arange(1, n_x + 1)
+            xs = xs[(self.st[xs] == xs) & (self.slack[xs] != 0)]
+            deltas = self._e_delta(self.slack[xs], xs)
+            for (label, divisor) in [(-1, 1), (0, 2)]:
+                candidates = deltas[self.S[xs] == label]
+                if len(candidates) > 0:
+                    delta = int(candidates.min()) // divisor
+                    d = delta if d is None else min(d, delta)
+            if d is None:
+                # Nothing left to grow or shrink, the cardinality is maximal
+                return False
+
+            vertices = self.S[self.st[1:n + 1]]
+            self.lab[1:n + 1] += np.where(vertices == 0, -d, np.where(vertices == 1, d, 0))
+            top_level = blossoms[self.st[blossoms] == blossoms]
+            self.lab[top_level] += np.where(self.S[top_level] == 0, 2*d, np.where(self.S[top_level] == 1, -2*d, 0))
+
+            self.queue.clear()
+            xs = np.arange(1, n_x + 1)
+            xs = xs[(self.st[xs] == xs) & (self.slack[xs] != 0)]
+            for x in xs[self._e_delta(self.slack[xs], xs) == 0]:
+                # Edges found before may have changed the blossoms since
+                if self.st[x] == x and self.slack[x] and self.st[self.slack[x]] != x and \
+                   self._e_delta(self.slack[x], x) == 0:
+                    if self._on_found_edge(self.edge_u[self.slack[x], x], self.edge_v[self.slack[x], x]):
+                        return True
+            for b in range(n + 1, self.n_x + 1):
+                if self.st[b] == b and self.S[b] == 1 and self.lab[b] == 0:
+                    self._expand_blossom(b)
@@ -0,0 +1,104 @@
+import math
+import numpy as np
+
+# The largest total cost of a round has to fit in an int64
+MAX_ROUND_COST = 2**63 - 1
+
+def pairing_cost_matrix(player_count, cost_functions):
+    """
+    Dense, vectorized version of pairing_cost_map.
+
+    Each cost function takes two integer arrays of player numbers, as indices
+    into the player list, and returns the costs of pairing them element-wise,
+    e.g. abs(a - b). It is only asked for pairs where a < b. Like in
+    pairing_cost_map, each function following after the first only breaks
+    ties left by the ones before it.
+
+    Instead of packing the costs into arbitrary-precision ints, every cost is
+    multiplied by the largest amount all the later costs of a round could add
+    up to, plus one, so the sums over a round still compare lexicographically.
+
+    Return an int64 matrix such that matrix[a][b] == matrix[b][a] is the cost
+    of pairing player number a with player number b. Raise OverflowError if
+    the costs of a round could exceed an int64.
+    """
+
+    if player_count == 0:
+        return np.zeros((0, 0), dtype=np.int64)
+
+    num_pairings_in_round = math.ceil(player_count/2)
+    # Every pair once, as (rows[i], cols[i]) with rows[i] < cols[i]
+    (rows, cols) = np.triu_indices(player_count, 1)
+
+    tiers = []
+    for f in cost_functions:
+        cost = np.broadcast_to(np.asarray(f(rows, cols)), rows.shape)
+        if not np.issubdtype(cost.dtype, np.integer):
+            assert((np.round(cost) == cost).all())
+        cost = cost.astype(np.int64)
+
+        # Only the differences within a tier matter
+        if len(cost) > 0:
+            assert(cost.min() >= 0)
+            cost -= cost.min()
+
+        tiers.append((cost, _round_cost_bound(player_count, rows, cols, cost, num_pairings_in_round)))
+
+    weights = []
+    weight = 1
+    for (cost, bound) in reversed(tiers):
+        weights.append(weight)
+        weight *= bound + 1
+        if weight > MAX_ROUND_COST:
+            raise OverflowError("Pairing costs of a round don't fit in 64 bits")
+
+    combined = np.zeros(rows.shape, dtype=np.int64)
+    for ((cost, bound), weight) in zip(tiers, reversed(weights)):
+        combined += cost * weight
+
+    matrix = np.zeros((player_count, player_count), dtype=np.int64)
+    matrix[rows, cols] = combined
+    matrix[cols, rows] = combined
+    return matrix
+
+
+def _round_cost_bound(player_count, rows, cols, cost, num_pairings_in_round):
+    """
+    Upper bound for the sum of cost over the pairs of a round.
+
+    Only pairs with a nonzero cost count, and every one of those contains a
+    player of a vertex cover of them, so a greedy cover bounds how many there
+    can be in a round. E.g. only one pair per round involves the bye player.
+    """
+    if len(cost) == 0 or cost.max() == 0:
+        return 0
+
+    (nonzero_rows, nonzero_cols) = (rows[cost > 0], cols[cost > 0])
+    degrees = np.bincount(nonzero_rows, minlength=player_count) + np.bincount(nonzero_cols, minlength=player_count)
+
+    nonzero = None
+    cover_size = 0
+    while cover_size < num_pairings_in_round and degrees.max() > 0:
+        # No player covers more than degrees.max() of the remaining pairs
+        if cover_size + degrees.sum()/2 / degrees.max() >= num_pairings_in_round:
+            cover_size = num_pairings_in_round
+            break
+
+        if nonzero is None:
+            nonzero = np.zeros((player_count, player_count), dtype=bool)
+            nonzero[nonzero_rows, nonzero_cols] = True
+            nonzero |= nonzero.T
+        p = degrees.argmax()
+        degrees -= nonzero[:, p]
+        degrees[p] = 0
+        nonzero[p, :] = False
+        nonzero[:, p] = False
+        cover_size += 1
+    return cover_size * int(cost.max())
+
+
+def cost_map_from_matrix(players, matrix):
+    """
+    The matrix as a dict like pairing_cost_map returns, cost_map[pa][pb] = cost.
+    """
+    return {pa: dict(zip(players, row)) for (pa, row) in zip(players, matrix.tolist())}
@@ -1,11 +1,12 @@
-import networkx as nx
-import math
-import itertools
+import numpy as np
 from .pairings import Pairing, Pairings
 from .match_log import MatchLog
 from .shared_functions import bye_dummy_player_name
 
 def optimal_pairing(match_log, cost_map):
+    # networkx is slow to import, so only load it once pairings are needed
+    import networkx as nx
+
     players = match_log.players()
     if len(players) % 2 != 0:
         players.append(bye_dummy_player_name())
@@ -34,58 +35,120 @@ def optimal_pairing(match_log, cost_map):
     def _pairs_from_graph(graph):
         mate = nx.max_weight_matching(graph, maxcardinality=True)
         # Extract pairs
-        matched_players = []
         pairs = []
         for k, v in mate:
             if (k, v) not in pairs:
                 pairs.append((k, v))
-        # Sort pairs by wins
-        for i, pair in enumerate(pairs):
-            wins_zero = match_log.times_match_win(pair[0])
-            wins_one = match_log.times_match_win(pair[1])
-            if wins_zero < wins_one:
-                pairs[i] = (pair[1], pair[0])
-        # Format as pairings
-        pairings = Pairings()
-        for e in pairs:
-            cost = cost_map[e[0]][e[1]]
-            if e[0] == bye_dummy_player_name():
-                assert(pairings.bye_player is None)
-                pairings.bye_player = e[1]
-            elif e[1] == bye_dummy_player_name():
-                assert(pairings.bye_player is None)
-                pairings.bye_player = e[0]
-            else:
-                num_0 = players.index(e[0])
-                num_1 = players.index(e[1])
-                player_a = e[0] if num_0 < num_1 else e[1]
-                player_b = e[1] if player_a == e[0] else e[0]
-                pairings.pairs.append(Pairing(player_a, player_b, cost))
-        # Set bye player
-        return pairings
+        return _pairings_from_pairs(match_log, players, pairs, lambda pa, pb: cost_map[pa][pb])
 
     graph = _gen_graph_without_edges()
     graph = _add_pairing_cost_edges_to_graph(graph)
     return _pairs_from_graph(graph)
 
 
+def optimal_pairing_from_matrix(match_log, cost_matrix, matching):
+    """
+    Like optimal_pairing, but for a cost matrix by player number, as from
+    pairing_cost_matrix, solved by a backend from matching.MATCHING_BACKENDS.
+    """
+    players = match_log.players()
+    numbers = {p: i for (i, p) in enumerate(players)}
+    active = np.array([match_log.is_player_active(p) for p in players], dtype=bool)
+    pairs = [(players[a], players[b]) for (a, b) in matching(cost_matrix, active)]
+    return _pairings_from_pairs(match_log, players, pairs, \
+                                lambda pa, pb: int(cost_matrix[numbers[pa]][numbers[pb]]))
+
+
+def _pairings_from_pairs(match_log, players, pairs, cost):
+    # Sort pairs by wins
+    for i, pair in enumerate(pairs):
+        wins_zero = match_log.times_match_win(pair[0])
+        wins_one = match_log.times_match_win(pair[1])
+        if wins_zero < wins_one:
+            pairs[i] = (pair[1], pair[0])
+    # Format as pairings
+    pairings = Pairings()
+    for e in pairs:
+        if e[0] == bye_dummy_player_name():
+            assert(pairings.bye_player is None)
+            pairings.bye_player = e[1]
+        elif e[1] == bye_dummy_player_name():
+            assert(pairings.bye_player is None)
+            pairings.bye_player = e[0]
+        else:
+            num_0 = players.index(e[0])
+            num_1 = players.index(e[1])
+            player_a = e[0] if num_0 < num_1 else e[1]
+            player_b = e[1] if player_a == e[0] else e[0]
+            pairings.pairs.append(Pairing(player_a, player_b, cost(e[0], e[1])))
+    return pairings
+
+
+# The most players whose number of pairings, (n - 1) * (n - 3) * ... * 1,
+# fits in an int64
+MAX_INT64_COUNT_PLAYERS = 34
+
+
 def number_of_optimal_pairings(match_log, cost_map):
+    """
+    Count the pairings of all players in a round that have the lowest cost.
+
+    Goes through the players in order, keeping for every set of players
+    still waiting for an opponent the lowest cost so far and how many ways
+    there are to reach it. Each player either waits, or is paired with one
+    of the waiting players. There are never more waiting players than
+    players left to pair them with, which keeps the number of sets down,
+    e.g. 24 players take well under a second.
+
+    The total cost of a round has to fit in an int64, as with
+    pairing_cost_matrix. The count is exact for any number of players.
+    """
     players = match_log.players()
     if len(players) % 2 != 0:
         players.append(bye_dummy_player_name())
-    # Brute force
-    possible_pairings_in_round = round(len(players) / 2) # Always even
-    perms = itertools.permutations(players)
-    pairs_costs = []
-    for perm in perms:
-        cost = 0
-        for i in range(possible_pairings_in_round):
-            pa = perm[i*2]
-            pb = perm[i*2 + 1]
-            cost += cost_map[pa][pb]
-        pairs_costs.append(cost)
-    min_cost = min(pairs_costs)
-    s = sum([1 if c == min_cost else 0 for c in pairs_costs])
-    rslt = s / (math.factorial(possible_pairings_in_round) * 2**possible_pairings_in_round)
-    assert(round(rslt) == rslt)
-    return round(rslt)
+    player_count = len(players)
+    costs = np.array([[cost_map[pa][pb] if pa != pb else 0 for pb in players] for pa in players], dtype=np.int64)
+
+    # Bit i of a mask is set if player number i is waiting
+    masks = np.zeros(1, dtype=np.int64)
+    totals = np.zeros(1, dtype=np.int64)
+    # 33 * 31 * ... * 1 pairings of 34 players still fit in an int64, from 36
+    # players on the counts are kept as Python ints, which is about half as fast
+    counts = np.ones(1, dtype=np.int64 if player_count <= MAX_INT64_COUNT_PLAYERS else object)
+    for k in range(player_count):
+        waiting = np.zeros(len(masks), dtype=np.int64)
+        for j in range(k):
+            waiting += (masks >> j) & 1
+        players_left = player_count - k - 1
+
+        new_masks = []
+        new_totals = []
+        new_counts = []
+        can_wait = waiting < players_left
+        new_masks.append(masks[can_wait] | (1 << k))
+        new_totals.append(totals[can_wait])
+        new_counts.append(counts[can_wait])
+        for j in range(k):
+            paired = ((masks >> j) & 1) == 1
+            new_masks.append(masks[paired] & ~(1 << j))
+            new_totals.append(totals[paired] + costs[j][k])
+            new_counts.append(counts[paired])
+        (masks, totals, counts) = _keep_lowest_totals(np.concatenate(new_masks), \
+                                                      np.concatenate(new_totals), \
+                                                      np.concatenate(new_counts))
+
+    # Only the empty set of waiting players is left
+    assert(len(masks) == 1 and masks[0] == 0)
+    return int(counts[0])
+
+
+def _keep_lowest_totals(masks, totals, counts):
+    """
+    For every distinct mask, keep its lowest total and the sum of the counts
+    reaching it.
+    """
+    order = np.lexsort((totals, masks))
+    (masks, totals, counts) = (masks[order], totals[order], counts[order])
+    starts = np.flatnonzero(np.concatenate(([True], masks[1:] != masks[:-1])))
+    lowest = np.repeat(totals[starts], np.diff(np.append(starts, len(masks))))
+    return (masks[starts], totals[starts], np.add.reduceat(np.where(totals == lowest, counts, 0), starts))
@@ -1,5 +1,8 @@
-from ..pairing_optimization import optimal_pairing, number_of_optimal_pairings
+import numpy as np
+from ..matching import MATCHING_BACKENDS
+from ..pairing_optimization import optimal_pairing, optimal_pairing_from_matrix, number_of_optimal_pairings
 from ..pairing_cost_map import pairing_cost_map
+from ..pairing_cost_matrix import pairing_cost_matrix, cost_map_from_matrix
 from ..shared_functions import bye_dummy_player_name
 
 def _pairing_cost_functions(match_log):
@@ -45,7 +48,63 @@ def _pairing_cost_functions(match_log):
             _minimize_player_number_diff, \
             _maximize_player_number_sum]
 
-def pairings(match_log):
+def _pairing_cost_array_functions(match_log, players):
+    """
+    The same costs as _pairing_cost_functions, over arrays of player numbers
+    for pairing_cost_matrix.
+    """
+
+    player_count = len(players)
+    numbers = {p: i for (i, p) in enumerate(players)}
+    bye = numbers.get(bye_dummy_player_name(), -1)
+    times_got_bye = np.array([match_log.times_got_bye(p) for p in players], dtype=np.int64)
+    times_match_win = np.array([match_log.times_match_win(p) for p in players], dtype=np.int64)
+    times_matched = np.zeros((player_count, player_count), dtype=np.int64)
+    for ((player_a, player_b), times) in match_log.pair_counts():
+        if player_a in numbers and player_b in numbers:
+            times_matched[numbers[player_a], numbers[player_b]] = times
+            times_matched[numbers[player_b], numbers[player_a]] = times
+
+    def _minimize_times_bye(a, b):
+        return np.where(a == bye, times_got_bye[b], np.where(b == bye, times_got_bye[a], 0))
+
+    def _minimize_bye_player_wins(a, b):
+        return np.where(a == bye, times_match_win[b], np.where(b == bye, times_match_win[a], 0))
+
+    def _minimize_times_matched(a, b):
+        return times_matched[a, b]
+
+    def _minimize_win_diff(a, b):
+        return abs(times_match_win[a] - times_match_win[b])
+
+    def _minimize_player_number_diff(a, b):
+        return abs(a - b)
+
+    def _maximize_player_number_sum(a, b):
+        return 2*player_count - (a + b)
+
+    return [_minimize_times_bye, \
+            _minimize_bye_player_wins, \
+            _minimize_times_matched, \
+            _minimize_win_diff, \
+            _minimize_player_number_diff, \
+            _maximize_player_number_sum]
+
+
+def _cost_matrix(match_log):
+    players = match_log.players()
+    return pairing_cost_matrix(len(players), _pairing_cost_array_functions(match_log, players))
+
+
+def _cost_map(match_log):
+    try:
+        return cost_map_from_matrix(match_log.players(), _cost_matrix(match_log))
+    except OverflowError:
+        # Too many players or rounds for 64 bits, fall back to big ints
+        return pairing_cost_map(match_log.players(), _pairing_cost_functions(match_log))
+
+
+def pairings(match_log, matching="dense"):
     """
     Generate pairings where pairings are optimized according to the following qualities, in order of importance:
     1. Minimize times opponents have previously faced each other
@@ -55,15 +114,16 @@ def pairings(match_log):
     1. Minimize times gotten bye before of bye player
     2. Minimize number of wins of bye player
     3. Minimize cost of other pairings
+
+    matching names the backend in matching.MATCHING_BACKENDS that finds the
+    optimal pairings, "networkx" is the slower reference implementation.
     """
-    players = match_log.players()
-    cost_functions = _pairing_cost_functions(match_log)
-    return optimal_pairing(match_log, \
-                           pairing_cost_map(players, cost_functions))
+    try:
+        return optimal_pairing_from_matrix(match_log, _cost_matrix(match_log), MATCHING_BACKENDS[matching])
+    except OverflowError:
+        # Too many players or rounds for 64 bits, fall back to big ints
+        return optimal_pairing(match_log, _cost_map(match_log))
 
 
 def number_of_possible_pairings(match_log):
-    players = match_log.players()
-    cost_functions = _pairing_cost_functions(match_log)
-    return number_of_optimal_pairings(match_log, \
-                                      pairing_cost_map(players, cost_functions))
+    return number_of_optimal_pairings(match_log, _cost_map(match_log))
@@ -0,0 +1,93 @@
+import itertools
+import numpy as np
+from . import min_cost
+from ..matching import MATCHING_BACKENDS
+from ..pairing_cost_matrix import pairing_cost_matrix
+from ..pairing_optimization import _pairings_from_pairs
+from ..shared_functions import bye_dummy_player_name
+
+def _brackets(match_log):
+    """
+    Split the active players into score brackets, most match wins first,
+    each in player order.
+
+    A bracket with an odd number of players floats its last player down to
+    the next one, so every bracket but the last can be paired on its own.
+    The bye player has no wins and so always ends up in the last bracket.
+    """
+    groups = dict()
+    for p in match_log.active_players():
+        groups.setdefault(match_log.times_match_win(p), []).append(p)
+
+    brackets = []
+    floaters = []
+    wins = sorted(groups, reverse=True)
+    for (i, w) in enumerate(wins):
+        bracket = floaters + groups[w]
+        floaters = []
+        if len(bracket) % 2 != 0 and i < len(wins) - 1:
+            floater = [p for p in bracket if p != bye_dummy_player_name()][-1]
+            bracket.remove(floater)
+            floaters = [floater]
+        if len(bracket) > 0:
+            brackets.append(bracket)
+    return brackets
+
+
+def _bracket_cost_matrix(numbers, cost_functions, bracket):
+    """
+    The min_cost costs between the players of one bracket, by their position
+    in the bracket.
+    """
+    bracket_numbers = np.array([numbers[p] for p in bracket])
+
+    def _in_bracket(f):
+        return lambda a, b: f(bracket_numbers[a], bracket_numbers[b])
+
+    return pairing_cost_matrix(len(bracket), [_in_bracket(f) for f in cost_functions])
+
+
+def _solve_bracket(cost_matrix, matching):
+    # Module level, so a process pool can run it
+    return MATCHING_BACKENDS[matching](cost_matrix, np.ones(len(cost_matrix), dtype=bool))
+
+
+def pairings(match_log, executor=None, matching="dense"):
+    """
+    Generate pairings like min_cost, but bracket by bracket instead of in one
+    global solve, which is much faster for large events.
+
+    Players are grouped by match wins, and each group, plus a player floated
+    down from the group above it when that one is odd, is paired on its own.
+    If some bracket can't be paired without a rematch, all players are
+    paired with min_cost.pairings instead.
+
+    executor is an optional concurrent.futures executor, e.g. a
+    ProcessPoolExecutor, to solve the brackets in parallel. matching names
+    the backend in matching.MATCHING_BACKENDS, like for min_cost.pairings.
+    """
+    players = match_log.players()
+    numbers = {p: i for (i, p) in enumerate(players)}
+    cost_functions = min_cost._pairing_cost_array_functions(match_log, players)
+    brackets = _brackets(match_log)
+
+    try:
+        cost_matrices = [_bracket_cost_matrix(numbers, cost_functions, b) for b in brackets]
+        if executor is None:
+            solutions = list(map(_solve_bracket, cost_matrices, itertools.repeat(matching)))
+        else:
+            solutions = list(executor.map(_solve_bracket, cost_matrices, itertools.repeat(matching)))
+    except OverflowError:
+        return min_cost.pairings(match_log, matching)
+
+    pairs = []
+    costs = dict()
+    for (bracket, cost_matrix, solution) in zip(brackets, cost_matrices, solutions):
+        for (a, b) in solution:
+            (pa, pb) = (bracket[a], bracket[b])
+            if match_log.times_matched(pa, pb) > 0:
+                return min_cost.pairings(match_log, matching)
+            pairs.append((pa, pb))
+            costs[(pa, pb)] = costs[(pb, pa)] = int(cost_matrix[a][b])
+
+    return _pairings_from_pairs(match_log, players, pairs, lambda pa, pb: costs[(pa, pb)])
@@ -1,7 +1,19 @@
 from .match_log import MatchLog
 from .shared_functions import bye_dummy_player_name
+import itertools
+import math
+import random
 import unittest
-import pairing_strategies.min_cost
+from concurrent.futures import ProcessPoolExecutor
+from . import pairing_strategies
+from .pairing_strategies import min_cost, score_brackets
+from .pairing_cost_map import pairing_cost_map
+from .pairing_cost_matrix import pairing_cost_matrix, cost_map_from_matrix
+from .pairing_optimization import optimal_pairing, number_of_optimal_pairings, _keep_lowest_totals, \
+                                  MAX_INT64_COUNT_PLAYERS
+from . import pairing_optimization
+from .matching import dense_matching, networkx_matching, MAX_DENSE_COST
+import numpy as np
 
 
 class TestPairingPossibilities(unittest.TestCase):
@@ -221,5 +233,327 @@ class TestPairingPossibilities(unittest.TestCase):
         vs_s = self.players[0] + ' VS. ' + self.players[1]
         self.assertEqual(s, vs_s)
 
+class TestMatchLogCounters(unittest.TestCase):
+
+    def setUp(self):
+        self.match_log = MatchLog()
+        self.players = ["player_" + str(i) for i in range(9)]
+        self.random = random.Random(0)
+        for p in self.players:
+            self.match_log.add_player(p)
+        for _ in range(200):
+            if self.random.random() < 0.1:
+                self.match_log.add_bye(self.random.choice(self.players))
+            else:
+                (pa, pb) = self.random.sample(self.players, 2)
+                # Draws included, they have no winner
+                self.match_log.add_result(pa, pb, self.random.randint(0, 2), self.random.randint(0, 2))
+
+
+    def _entries(self):
+        return self.match_log._entries
+
+
+    def test_times_matched_matches_full_scan(self):
+        everyone = self.players + [bye_dummy_player_name(), None]
+        for pa in everyone:
+            for pb in everyone:
+                expected = sum(1 for e in self._entries() if e.has_players(pa, pb))
+                self.assertEqual(self.match_log.times_matched(pa, pb), expected)
+
+
+    def test_player_counters_match_full_scan(self):
+        for p in self.players + [bye_dummy_player_name()]:
+            self.assertEqual(self.match_log.times_got_bye(p),
+                             sum(1 for e in self._entries() if e.is_bye() and e.winner() == p))
+            self.assertEqual(self.match_log.times_match_win(p),
+                             sum(1 for e in self._entries() if e.winner() == p))
+            self.assertEqual(self.match_log.player_score(p),
+                             sum(e.player_a_wins() for e in self._entries() if e.player_a() == p) + \
+                             sum(e.player_b_wins() for e in self._entries() if e.player_b() == p))
+
+
+    def test_unknown_players_have_nothing(self):
+        self.assertEqual(self.match_log.times_matched("nobody", self.players[0]), 0)
+        self.assertEqual(self.match_log.times_got_bye("nobody"), 0)
+        self.assertEqual(self.match_log.times_match_win("nobody"), 0)
+        self.assertEqual(self.match_log.player_score("nobody"), 0)
+
+
+class TestPairingCostMatrix(unittest.TestCase):
+
+    def setUp(self):
+        self.match_log = MatchLog()
+        self.random = random.Random(1)
+        for i in range(9):
+            self.match_log.add_player("player_" + str(i))
+        for _ in range(3):
+            pairings = min_cost.pairings(self.match_log)
+            for pair in pairings.pairs:
+                self.match_log.add_result(pair.player_a, pair.player_b, self.random.randint(0, 2), self.random.randint(0, 2))
+            if pairings.bye_player is not None:
+                self.match_log.add_bye(pairings.bye_player)
+        self.players = self.match_log.players()
+        self.cost_map = pairing_cost_map(self.players, min_cost._pairing_cost_functions(self.match_log))
+        self.matrix = pairing_cost_matrix(len(self.players), min_cost._pairing_cost_array_functions(self.match_log, self.players))
+
+
+    def _round_cost(self, cost_map, order):
+        return sum(cost_map[order[i]][order[i + 1]] for i in range(0, len(order), 2))
+
+
+    def test_matrix_is_symmetric(self):
+        self.assertTrue((self.matrix == self.matrix.T).all())
+
+
+    def test_round_costs_compare_like_cost_map(self):
+        matrix_map = cost_map_from_matrix(self.players, self.matrix)
+        for _ in range(500):
+            order_a = self.random.sample(self.players, len(self.players))
+            order_b = self.random.sample(self.players, len(self.players))
+            difference = self._round_cost(self.cost_map, order_a) - self._round_cost(self.cost_map, order_b)
+            matrix_difference = self._round_cost(matrix_map, order_a) - self._round_cost(matrix_map, order_b)
+            self.assertEqual(difference > 0, matrix_difference > 0)
+            self.assertEqual(difference == 0, matrix_difference == 0)
+
+
+    def test_pairings_match_cost_map(self):
+        expected = optimal_pairing(self.match_log, self.cost_map)
+        actual = optimal_pairing(self.match_log, cost_map_from_matrix(self.players, self.matrix))
+        self.assertEqual(actual.bye_player, expected.bye_player)
+        self.assertEqual([(p.player_a, p.player_b) for p in actual.pairs],
+                         [(p.player_a, p.player_b) for p in expected.pairs])
+
+
+    def test_512_players_fit(self):
+        match_log = MatchLog()
+        players = ["player_" + str(i) for i in range(512)]
+        for p in players:
+            match_log.add_player(p)
+        for _ in range(9):
+            self.random.shuffle(players)
+            for i in range(0, len(players), 2):
+                match_log.add_result(players[i], players[i + 1], 2, self.random.randint(0, 1))
+        all_players = match_log.players()
+        matrix = pairing_cost_matrix(len(all_players), min_cost._pairing_cost_array_functions(match_log, all_players))
+        self.assertEqual(matrix.shape, (512, 512))
+
+
+    def test_overflowing_costs_raise(self):
+        cost_functions = [lambda a, b: (a + b) * 2**40, lambda a, b: (a + b) * 2**40]
+        with self.assertRaises(OverflowError):
+            pairing_cost_matrix(8, cost_functions)
+
+
+class TestMatchingBackends(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(2)
+
+
+    def _random_costs(self, player_count, highest_cost):
+        costs = np.array([[self.random.randint(0, highest_cost) for _ in range(player_count)] \
+                          for _ in range(player_count)], dtype=np.int64)
+        costs = np.triu(costs, 1)
+        return costs + costs.T
+
+
+    def _total_cost(self, costs, pairs):
+        return sum(int(costs[a][b]) for (a, b) in pairs)
+
+
+    def test_dense_matches_networkx_on_random_costs(self):
+        for _ in range(300):
+            player_count = self.random.randint(0, 12)
+            # Small ranges give lots of ties, which is where blossoms form
+            costs = self._random_costs(player_count, self.random.choice([1, 5, 1000, 2**50]))
+            active = np.array([self.random.random() < 0.8 for _ in range(player_count)], dtype=bool)
+            expected = networkx_matching(costs, active)
+            actual = dense_matching(costs, active)
+            self.assertEqual(len(actual), len(expected))
+            self.assertEqual(self._total_cost(costs, actual), self._total_cost(costs, expected))
+            paired = [p for pair in actual for p in pair]
+            self.assertEqual(len(paired), len(set(paired)))
+            self.assertTrue(all(active[p] for p in paired))
+
+
+    def test_dense_rejects_costs_that_could_overflow(self):
+        costs = np.array([[0, MAX_DENSE_COST], [MAX_DENSE_COST, 0]], dtype=np.int64)
+        with self.assertRaises(OverflowError):
+            dense_matching(costs, np.ones(2, dtype=bool))
+
+
+    def _round_cost(self, match_log, pairings):
+        players = match_log.players()
+        cost_matrix = min_cost._cost_matrix(match_log)
+        pairs = [(p.player_a, p.player_b) for p in pairings.pairs]
+        if pairings.bye_player is not None:
+            pairs.append((pairings.bye_player, bye_dummy_player_name()))
+        return sum(int(cost_matrix[players.index(pa)][players.index(pb)]) for (pa, pb) in pairs)
+
+
+    def test_min_cost_backends_agree(self):
+        match_log = MatchLog()
+        players = ["player_" + str(i) for i in range(21)]
+        for p in players:
+            match_log.add_player(p)
+        for _ in range(4):
+            match_log.set_player_active(self.random.choice(players), False)
+            expected = min_cost.pairings(match_log, matching="networkx")
+            actual = min_cost.pairings(match_log, matching="dense")
+            # Different pairings can tie on cost, so only compare what they cost
+            self.assertEqual(self._round_cost(match_log, actual), self._round_cost(match_log, expected))
+            self.assertEqual(len(actual.pairs), len(expected.pairs))
+            for pair in actual.pairs:
+                match_log.add_result(pair.player_a, pair.player_b, 2, self.random.randint(0, 1))
+            if actual.bye_player is not None:
+                match_log.add_bye(actual.bye_player)
+            for p in players:
+                match_log.set_player_active(p, True)
+
+class TestScoreBrackets(unittest.TestCase):
+
+    def setUp(self):
+        self.match_log = MatchLog()
+        self.players = ["player_" + str(i) for i in range(33)]
+        self.random = random.Random(3)
+        for p in self.players:
+            self.match_log.add_player(p)
+
+
+    def _play_round(self, pairings):
+        for pair in pairings.pairs:
+            if self.random.random() < 0.5:
+                self.match_log.add_result(pair.player_a, pair.player_b, 2, self.random.randint(0, 1))
+            else:
+                self.match_log.add_result(pair.player_a, pair.player_b, self.random.randint(0, 1), 2)
+        if pairings.bye_player is not None:
+            self.match_log.add_bye(pairings.bye_player)
+
+
+    def test_players_are_paired_within_their_bracket(self):
+        for _ in range(3):
+            self._play_round(score_brackets.pairings(self.match_log))
+        pairings = score_brackets.pairings(self.match_log)
+        brackets = score_brackets._brackets(self.match_log)
+        for pair in pairings.pairs:
+            self.assertEqual(len([b for b in brackets if pair.player_a in b and pair.player_b in b]), 1)
+            self.assertEqual(self.match_log.times_matched(pair.player_a, pair.player_b), 0)
+
+
+    def test_odd_brackets_float_down(self):
+        self._play_round(score_brackets.pairings(self.match_log))
+        brackets = score_brackets._brackets(self.match_log)
+        for b in brackets[:-1]:
+            self.assertEqual(len(b) % 2, 0)
+        self.assertEqual(sorted(p for b in brackets for p in b), sorted(self.match_log.active_players()))
+
+
+    def test_everyone_is_paired(self):
+        for _ in range(4):
+            pairings = score_brackets.pairings(self.match_log)
+            paired = [p for pair in pairings.pairs for p in (pair.player_a, pair.player_b)] + [pairings.bye_player]
+            self.assertEqual(sorted(paired), sorted(self.players))
+            self._play_round(pairings)
+
+
+    def test_rematch_falls_back_to_global_solve(self):
+        match_log = MatchLog()
+        match_log.add_result("A", "B", 1, 0)
+        match_log.add_result("C", "D", 1, 0)
+        match_log.add_result("A", "C", 1, 0)
+        match_log.add_result("B", "D", 1, 0)
+        # Brackets [A, B] and [C, D] would both be rematches
+        self.assertEqual(score_brackets._brackets(match_log), [["A", "B"], ["C", "D"]])
+        pairings = score_brackets.pairings(match_log)
+        self.assertTrue(pairings.players_are_matched("A", "D"))
+        self.assertTrue(pairings.players_are_matched("B", "C"))
+
+
+    def test_process_pool_gives_same_pairings(self):
+        for _ in range(2):
+            self._play_round(score_brackets.pairings(self.match_log))
+        expected = score_brackets.pairings(self.match_log)
+        with ProcessPoolExecutor(max_workers=2) as executor:
+            actual = score_brackets.pairings(self.match_log, executor=executor)
+        self.assertEqual(actual.string(), expected.string())
+
+
+class TestNumberOfOptimalPairings(unittest.TestCase):
+
+    def setUp(self):
+        self.random = random.Random(4)
+
+
+    def _match_log(self, player_count):
+        match_log = MatchLog()
+        for i in range(player_count):
+            match_log.add_player("player_" + str(i))
+        return match_log
+
+
+    def _brute_force(self, players, cost_map):
+        pairs_in_round = len(players) // 2
+        costs = [sum(cost_map[perm[i*2]][perm[i*2 + 1]] for i in range(pairs_in_round)) \
+                 for perm in itertools.permutations(players)]
+        lowest = min(costs)
+        optimal = sum(1 for c in costs if c == lowest)
+        return optimal // (math.factorial(pairs_in_round) * 2**pairs_in_round)
+
+
+    def test_matches_brute_force(self):
+        for _ in range(100):
+            match_log = self._match_log(self.random.choice([0, 2, 4, 6, 8]))
+            players = match_log.players()
+            # Small ranges give many optimal pairings
+            highest_cost = self.random.choice([0, 1, 2, 100])
+            cost_map = {p: dict() for p in players}
+            for (pa, pb) in itertools.combinations(players, 2):
+                cost_map[pa][pb] = cost_map[pb][pa] = self.random.randint(0, highest_cost)
+            self.assertEqual(number_of_optimal_pairings(match_log, cost_map), self._brute_force(players, cost_map))
+
+
+    def test_equal_costs_count_every_pairing(self):
+        match_log = self._match_log(24)
+        players = match_log.players()
+        cost_map = {pa: {pb: 0 for pb in players} for pa in players}
+        # 23 * 21 * 19 * ... * 1
+        self.assertEqual(number_of_optimal_pairings(match_log, cost_map), 316234143225)
+
+
+    def test_int64_counts_only_while_they_fit(self):
+        pairings_of = lambda n: math.prod(range(n - 1, 0, -2))
+        self.assertLess(pairings_of(MAX_INT64_COUNT_PLAYERS), 2**63)
+        self.assertGreater(pairings_of(MAX_INT64_COUNT_PLAYERS + 2), 2**63)
+
+
+    def test_python_int_counts(self):
+        # 36 players take too long to count here, so every size goes through
+        # the Python int counts instead
+        original = pairing_optimization.MAX_INT64_COUNT_PLAYERS
+        pairing_optimization.MAX_INT64_COUNT_PLAYERS = 0
+        try:
+            self.test_matches_brute_force()
+            self.test_equal_costs_count_every_pairing()
+        finally:
+            pairing_optimization.MAX_INT64_COUNT_PLAYERS = original
+
+
+    def test_counts_add_up_past_int64(self):
+        masks = np.array([3, 3, 5], dtype=np.int64)
+        totals = np.array([1, 1, 2], dtype=np.int64)
+        counts = np.array([2**62, 2**62 + 1, 7], dtype=object)
+        (masks, totals, counts) = _keep_lowest_totals(masks, totals, counts)
+        self.assertEqual(list(counts), [2**63 + 1, 7])
+
+
+    def test_24_players_have_1_possible_pairings(self):
+        match_log = self._match_log(24)
+        self.assertEqual(min_cost.number_of_possible_pairings(match_log), 1)
+        for pair in min_cost.pairings(match_log).pairs:
+            match_log.add_result(pair.player_a, pair.player_b, 2, 0)
+        self.assertEqual(min_cost.number_of_possible_pairings(match_log), 1)
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from .draft import DraftError
+
+class DraftSnapshot:
+    """
+    Read-only copy of what read-only commands need from a draft, so they are
+    answered right away instead of queueing behind changes.
+    """
+
+    __slots__ = ['pick_number', 'has_started', 'taken_cards', 'wanted_cards']
+
+    def __init__(self, draft):
+        self.pick_number = draft.state.pick_number
+        self.has_started = draft.state.has_started
+        self.taken_cards = draft.taken_cards.frozen()
+        # user id -> tuple of card ids
+        self.wanted_cards = {user_id: tuple(user['wanted-cards']) for (user_id, user) in draft.users.items()}
+
+class DraftActor:
+    """
+    Owns every change to one draft.
+
+    submit() queues a call of a Draft method and returns its result, or
+    raises its exception, once the actor's task has run it. Calls run one at
+    a time in the order they were submitted, so no change ever sees another
+    one half done, however many awaits commands, the pick engine and sheet
+    writes have between them. The task stops whenever the queue runs dry
+    and is started again by the next submit.
+
+    snapshot() is the draft as of the last change, taken on first use after
+    a change and shared until the next one.
+
+    Submitting close runs it after everything queued before it, like any
+    other call. Calls queued after it, or submitted once the actor has
+    stopped, fail with a DraftError instead of reaching the closed draft.
+    """
+
+    def __init__(self, draft):
+        self.draft = draft
+        self.stopped = False
+
+        self._queue = asyncio.Queue()
+        self._task = None
+        self._snapshot = None
+
+    async def submit(self, method_name, *args, **kwargs):
+        if self.stopped:
+            raise DraftError('This draft was just closed, please try again.')
+
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((method_name, args, kwargs, future))
+
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+        return await future
+
+    async def _run(self):
+        while not self._queue.empty():
+            (method_name, args, kwargs, future) = self._queue.get_nowait()
+
+            try:
+                result = getattr(self.draft, method_name)(*args, **kwargs)
+            except Exception as e:
+                if not future.cancelled():
+                    future.set_exception(e)
+            else:
+                # the call still counts if whoever submitted it stopped waiting
+                if not future.cancelled():
+                    future.set_result(result)
+
+            # an error may still have changed something, e.g. want_many
+            self._snapshot = None
+
+            if method_name == 'close':
+                self._task = None
+                self.stop()
+                return
+
+            # let others, e.g. read-only commands, in between changes
+            await asyncio.sleep(0)
+
+        self._task = None
+
+    def snapshot(self):
+        if self._snapshot is None:
+            self._snapshot = DraftSnapshot(self.draft)
+
+        return self._snapshot
+
+    def stop(self):
+        """
+        Fail every call still queued and refuse new ones, once the draft is closed.
+        """
+        self.stopped = True
+
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+        while not self._queue.empty():
+            (_, _, _, future) = self._queue.get_nowait()
+            if not future.done():
+                future.set_exception(DraftError('This draft was just closed, please try again.'))
+
+class DraftActors:
+    """
+    The DraftActor of every draft, created on first use.
+    """
+
+    def __init__(self):
+        self._actors = {}
+
+    def get(self, draft):
+        actor = self._actors.get(draft.draft_id)
+
+        # a draft that was unloaded and loaded again is a new object
+        if actor is None or actor.draft is not draft:
+            actor = DraftActor(draft)
+            self._actors[draft.draft_id] = actor
+
+        return actor
+
+    async def submit(self, draft, method_name, *args, **kwargs):
+        return await self.get(draft).submit(method_name, *args, **kwargs)
+
+    def remove(self, draft):
+        """
+        Stop and forget the actor of an unloaded draft, see DraftRegistry.
+        """
+        actor = self._actors.get(draft.draft_id)
+
+        if actor is not None and actor.draft is draft:
+            actor.stop()
+            del self._actors[draft.draft_id]
+
+    def snapshot(self, draft):
+        return self.get(draft).snapshot()
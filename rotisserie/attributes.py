@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+
+"""
+Card attributes (colors, mana value, type line) for searching, imported
+from Scryfall's bulk data.
+
+Download a bulk data file (Oracle Cards is the smallest that covers every
+card) from https://scryfall.com/docs/api/bulk-data, then run
+
+    python -m rotisserie.attributes oracle-cards.json card-list.txt cards.attributes.npz
+
+The attributes are stored column by column, one row per catalog card id, so
+a search filter is a handful of numpy operations over the whole pool. numpy
+is only imported once attributes are imported or loaded, it is slow to
+import and searching by name doesn't need it.
+"""
+
+import json
+import operator
+import os
+import re
+import sys
+
+from .catalog import open_catalog
+from .draft import DraftError
+
+COLORS = 'wubrg'
+
+# colorless is the empty set, c:c asks for exactly that
+COLORLESS = 0
+
+class SearchError(DraftError):
+    """
+    A search query could not be understood; the message is meant to be shown
+    to the player, and commands that only catch DraftError show it too.
+    """
+
+def color_mask(letters):
+    mask = 0
+    for letter in letters.lower():
+        if letter == 'c':
+            continue
+        if letter not in COLORS:
+            raise SearchError(f'Unknown color {letter}, use the letters {COLORS.upper()} and C for colorless')
+        mask |= 1 << COLORS.index(letter)
+    return mask
+
+def stream_json_array(f, chunk_size=1 << 20):
+    """
+    Yield the elements of the JSON array in text file f one at a time, only
+    ever holding about chunk_size characters plus one element in memory.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    position = 0
+    started = False
+    eof = False
+
+    while True:
+        # skip to the next element
+        while position < len(buffer) and buffer[position] in ' \t\r\n,[]':
+            if buffer[position] == '[':
+                started = True
+            position += 1
+
+        if position < len(buffer):
+            if not started:
+                raise ValueError('Expected a JSON array')
+
+            try:
+                (element, end) = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # only part of the element has been read yet
+                if eof:
+                    raise
+            else:
+                yield element
+                position = end
+                continue
+
+        if eof:
+            return
+
+        chunk = f.read(chunk_size)
+        eof = len(chunk) == 0
+        buffer = buffer[position:] + chunk
+        position = 0
+
+def card_attributes(card):
+    """
+    Return (colors mask, mana value, lowercase type line) of a Scryfall card object.
+    """
+    colors = card.get('colors')
+
+    # double faced cards only have colors per face, the front face counts
+    if colors is None and card.get('card_faces'):
+        colors = card['card_faces'][0].get('colors', [])
+
+    type_line = card.get('type_line')
+    if type_line is None and card.get('card_faces'):
+        type_line = ' // '.join(face.get('type_line', '') for face in card['card_faces'])
+
+    return (color_mask(''.join(colors or [])), float(card.get('cmc', 0)), (type_line or '').lower())
+
+def import_scryfall(bulk_path, catalog, attributes_path):
+    """
+    Stream a Scryfall bulk data file and store the attributes of every card
+    in catalog at attributes_path. Return the names of the cards that were
+    not found.
+    """
+    import numpy as np
+
+    colors = np.zeros(len(catalog), dtype=np.uint8)
+    mana_values = np.zeros(len(catalog), dtype=np.float32)
+    type_lines = [''] * len(catalog)
+    found = np.zeros(len(catalog), dtype=bool)
+
+    with open(bulk_path, 'r', encoding='utf-8') as f:
+        for card in stream_json_array(f):
+            name = card.get('name', '')
+
+            # card lists name double faced and split cards by their front face
+            for candidate in [name, name.split(' // ')[0]]:
+                card_id = catalog.lookup(candidate)
+                if card_id is not None and not found[card_id]:
+                    (colors[card_id], mana_values[card_id], type_lines[card_id]) = card_attributes(card)
+                    found[card_id] = True
+                    break
+
+    # written aside and swapped in, the bot may be reading the old file
+    tmp_path = attributes_path + '.tmp.npz'
+    np.savez(tmp_path, digest=np.array(catalog.digest()), colors=colors, mana_values=mana_values, type_lines=np.array(list(map(lambda type_line:type_line.encode('utf-8'), type_lines)), dtype=np.bytes_), found=found)
+    os.replace(tmp_path, attributes_path)
+
+    return [catalog.name(card_id) for card_id in np.flatnonzero(~found)]
+
+# e.g. c:u, mv<=2, -t:creature
+TERM = re.compile(r'^(-?)(c|color|mv|cmc|t|type)(:|=|!=|<=|>=|<|>)(.+)$')
+
+COMPARISONS = {
+    ':': operator.eq,
+    '=': operator.eq,
+    '!=': operator.ne,
+    '<=': operator.le,
+    '>=': operator.ge,
+    '<': operator.lt,
+    '>': operator.gt
+}
+
+class CardAttributes:
+    """
+    The columns written by import_scryfall, indexed by catalog card id.
+    """
+
+    def __init__(self, path, catalog):
+        import numpy as np
+
+        with np.load(path) as columns:
+            digest = str(columns['digest'])
+            self.colors = columns['colors']
+            self.mana_values = columns['mana_values']
+            self.type_lines = columns['type_lines']
+            self.found = columns['found']
+
+        if digest != catalog.digest():
+            raise ValueError(f'{path} was imported for a different card list, import it again')
+
+        self.sorted_ids = np.asarray(catalog.sorted_ids, dtype=np.uint32)
+
+    def _term_mask(self, field, comparison, value):
+        import numpy as np
+
+        if field in ['c', 'color']:
+            wanted = color_mask(value)
+            # c:u means at least blue, except c:c which means colorless
+            if comparison == ':':
+                return self.colors == COLORLESS if wanted == COLORLESS else (self.colors & wanted) == wanted
+            if comparison in ['=', '!=']:
+                return (self.colors == wanted) if comparison == '=' else (self.colors != wanted)
+            if comparison == '<=':
+                return (self.colors & ~np.uint8(wanted)) == 0
+            if comparison == '>=':
+                return (self.colors & wanted) == wanted
+            if comparison == '<':
+                return ((self.colors & ~np.uint8(wanted)) == 0) & (self.colors != wanted)
+            return ((self.colors & wanted) == wanted) & (self.colors != wanted)
+
+        if field in ['mv', 'cmc']:
+            try:
+                number = float(value)
+            except ValueError:
+                raise SearchError(f'Mana value must be a number, not {value}')
+
+            return COMPARISONS[comparison](self.mana_values, number)
+
+        if comparison not in [':', '=']:
+            raise SearchError('Types can only be searched with t:')
+
+        return np.char.find(self.type_lines, value.lower().encode('utf-8')) >= 0
+
+    def parse(self, query):
+        """
+        Split a query into the words of a card name and a mask of the cards
+        that pass every filter term, or None if there are no filter terms.
+        """
+        name_words = []
+        mask = None
+
+        for word in query.split():
+            term = TERM.match(word.lower())
+            if not term:
+                name_words.append(word)
+                continue
+
+            (negate, field, comparison, value) = term.groups()
+            term_mask = self._term_mask(field, comparison, value)
+
+            if negate:
+                term_mask = ~term_mask
+
+            mask = term_mask if mask is None else mask & term_mask
+
+        if mask is not None:
+            mask &= self.found
+
+        return (' '.join(name_words), mask)
+
+    def matching_ids(self, mask):
+        """
+        Ids of the cards in mask, alphabetically.
+        """
+        return self.sorted_ids[mask[self.sorted_ids]].tolist()
+
+def has_filter_terms(query):
+    return any(map(lambda word:TERM.match(word.lower()), query.split()))
+
+def open_attributes(path, catalog):
+    """
+    Load the attributes at path, or return None if they were never imported
+    or were imported for another card list.
+    """
+    if not os.path.exists(path):
+        return None
+
+    try:
+        return CardAttributes(path, catalog)
+    except ValueError as e:
+        print(f'Ignoring card attributes: {e}')
+        return None
+
+def search_cards(catalog, attributes, query, limit=None):
+    """
+    Return ids of the cards matching a query of name words and filter terms,
+    best name matches first, or alphabetically if there are no name words.
+    attributes is a CardAttributes, or None if they were never imported.
+    """
+    if attributes is None:
+        if has_filter_terms(query):
+            raise SearchError('Card attributes have not been imported, only card names can be searched')
+
+        return catalog.index.search(query, limit=limit)
+
+    (name, mask) = attributes.parse(query)
+
+    if mask is None:
+        return catalog.index.search(name, limit=limit)
+
+    if not name:
+        return attributes.matching_ids(mask)[:limit]
+
+    return [card_id for card_id in catalog.index.search(name) if mask[card_id]][:limit]
+
+if __name__ == '__main__':
+    if len(sys.argv) != 4:
+        print('Usage: python -m rotisserie.attributes scryfall-bulk-data.json card-list.txt cards.attributes.npz')
+        sys.exit(1)
+
+    catalog = open_catalog(sys.argv[2], 'cards.catalog')
+    missing = import_scryfall(sys.argv[1], catalog, sys.argv[3])
+
+    print(f'Wrote attributes of {len(catalog) - len(missing)} cards to {sys.argv[3]}')
+    if missing:
+        print(f'Not found in the bulk data: {", ".join(missing)}')
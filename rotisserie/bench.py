@@ -0,0 +1,316 @@
+# -*- coding: utf-8 -*-
+
+"""
+Headless benchmark of the draft core.
+
+Simulates full drafts with randomized want lists against real journal and
+snapshot files in a temporary directory, and reports per-pick latency
+percentiles, bytes written to disk per pick and peak memory.
+
+    python -m rotisserie.bench
+    python -m rotisserie.bench --players 8 32 --rounds 45 --cards 540 30000
+    python -m rotisserie.bench --storage pickle sqlite
+
+With --commands, it also fires that many concurrent !draft commands at
+several running drafts through their actors, the way the bot does, with
+!search reads from the snapshots in between, and reports command
+throughput and latency.
+
+    python -m rotisserie.bench --commands 20000 --drafts 4
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+import tracemalloc
+
+from .actor import DraftActors
+from .catalog import CardCatalog, build_catalog
+from .draft import WANTLIST_MAX_LENGTH, Draft, DraftError, DraftRegistry
+from .engine import PickEngine
+from .storage import STORAGE_KINDS
+
+def synthetic_card_names(base_names, count, rng):
+    """
+    Make count distinct card names by recombining words from base_names.
+    """
+    words = sorted({word for name in base_names for word in name.split()})
+    names = set(base_names[:count])
+    while len(names) < count:
+        names.add(' '.join(rng.choice(words) for _ in range(rng.randint(2, 4))))
+    return sorted(names)
+
+def bytes_written():
+    # bytes this process has passed to write(), only available on linux
+    try:
+        with open('/proc/self/io', 'r') as f:
+            for line in f:
+                if line.startswith('wchar:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+def random_untaken_card(draft, rng):
+    while True:
+        card_id = rng.randrange(len(draft.catalog))
+        if card_id not in draft.taken_cards:
+            return card_id
+
+def queue_cards(draft, user_id, count, rng, want_latencies):
+    user = draft.get_user(user_id)
+    for _ in range(count):
+        if len(user['wanted-cards']) >= WANTLIST_MAX_LENGTH:
+            return
+
+        # go through name resolution like a player typing !draft would
+        card_name = draft.catalog.name(random_untaken_card(draft, rng))
+
+        start = time.perf_counter()
+        draft.want(user_id, card_name)
+        want_latencies.append(time.perf_counter() - start)
+
+def simulate(catalog, directory, players, rounds, storage, rng):
+    draft = Draft('bench', directory, catalog, number_of_rounds=rounds, storage=storage)
+
+    user_ids = [str(i) for i in range(players)]
+    for user_id in user_ids:
+        draft.register(user_id, int(user_id), f'player{user_id}', '0', '')
+
+    # every player starts with a few cards queued
+    want_latencies = []
+    for user_id in user_ids:
+        queue_cards(draft, user_id, rng.randint(0, 5), rng, want_latencies)
+
+    draft.start(0)
+
+    pick_latencies = []
+    while not draft.get_has_finished():
+        current_drafter_id = draft.state.current_drafter_id()
+
+        # the player on the clock queues some picks when asked to
+        if len(draft.get_user(current_drafter_id)['wanted-cards']) == 0:
+            queue_cards(draft, current_drafter_id, rng.randint(1, 5), rng, want_latencies)
+
+        start = time.perf_counter()
+        event = draft.attempt_pick()
+        elapsed = time.perf_counter() - start
+
+        if event is not None and event['type'] == 'pick':
+            pick_latencies.append(elapsed)
+
+        # someone else plans ahead, creating snipes and want list churn
+        if not draft.get_has_finished():
+            queue_cards(draft, rng.choice(user_ids), 1, rng, want_latencies)
+
+    draft.attempt_pick()
+    draft.close()
+
+    return (pick_latencies, want_latencies)
+
+def run_scenario(catalog_path, card_count, players, rounds, storage, seed):
+    catalog = CardCatalog(catalog_path)
+
+    # a card can only be drafted once
+    rounds = min(rounds, card_count // players)
+
+    with tempfile.TemporaryDirectory() as directory:
+        written_before = bytes_written()
+        start = time.perf_counter()
+        (pick_latencies, want_latencies) = simulate(catalog, os.path.join(directory, 'timed'), players, rounds, storage, random.Random(seed))
+        total_seconds = time.perf_counter() - start
+        written_after = bytes_written()
+
+        # a second, identical run under tracemalloc, which would skew the timings
+        tracemalloc.start()
+        simulate(catalog, os.path.join(directory, 'traced'), players, rounds, storage, random.Random(seed))
+        (_, peak_memory) = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    pick_latencies.sort()
+    want_latencies.sort()
+    picks = len(pick_latencies)
+
+    return {
+        'storage': storage,
+        'cards': card_count,
+        'players': players,
+        'rounds': rounds,
+        'picks': picks,
+        'pick-p50-ms': 1000 * percentile(pick_latencies, 0.50),
+        'pick-p90-ms': 1000 * percentile(pick_latencies, 0.90),
+        'pick-p99-ms': 1000 * percentile(pick_latencies, 0.99),
+        'pick-max-ms': 1000 * (pick_latencies[-1] if pick_latencies else 0),
+        'want-p50-ms': 1000 * percentile(want_latencies, 0.50),
+        'want-p99-ms': 1000 * percentile(want_latencies, 0.99),
+        'bytes-per-pick': None if written_before is None else (written_after - written_before) / max(picks, 1),
+        'peak-memory-mib': peak_memory / 2**20,
+        'total-seconds': total_seconds
+    }
+
+async def command_load(catalog, directory, drafts_count, players, commands, concurrency, storage, rng):
+    actors = DraftActors()
+    registry = DraftRegistry(directory, catalog, storage=storage, on_unload=actors.remove)
+    picks = []
+    engine = PickEngine(registry, actors, lambda draft, event:picks.append(event) if event['type'] == 'pick' else None)
+
+    drafts = []
+    for draft_number in range(drafts_count):
+        draft = registry.get(draft_number, create=True)
+        for user_id in map(str, range(players)):
+            draft.register(user_id, int(user_id), f'player{user_id}', '0', '')
+        draft.start(draft_number)
+        drafts.append(draft)
+
+    engine_task = asyncio.create_task(engine.run())
+    engine.signal_all()
+
+    command_latencies = []
+    read_latencies = []
+
+    async def player():
+        for _ in range(commands // concurrency):
+            # finished drafts are unloaded by the engine, like in the bot
+            running = [draft for draft in drafts if not draft.get_has_finished()]
+            if not running:
+                return
+
+            draft = rng.choice(running)
+
+            # a !search served from the snapshot, it never waits for the actor
+            start = time.perf_counter()
+            taken_cards = actors.snapshot(draft).taken_cards
+            [card_id in taken_cards for card_id in catalog.index.search(catalog.name(rng.randrange(len(catalog))), limit=5)]
+            read_latencies.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            try:
+                await actors.submit(draft, 'want', rng.choice(draft.state.pick_order), catalog.name(rng.randrange(len(catalog))))
+            except DraftError:
+                # taken, already wanted or a full want list, all answered by the actor just the same
+                pass
+            command_latencies.append(time.perf_counter() - start)
+
+            engine.signal(draft)
+
+    start = time.perf_counter()
+    await asyncio.gather(*[player() for _ in range(concurrency)])
+    total_seconds = time.perf_counter() - start
+
+    engine_task.cancel()
+    for draft in registry.loaded():
+        draft.close()
+
+    return (command_latencies, read_latencies, len(picks), total_seconds)
+
+def run_command_load(catalog_path, drafts_count, players, commands, concurrency, storage, seed):
+    catalog = CardCatalog(catalog_path)
+
+    with tempfile.TemporaryDirectory() as directory:
+        (command_latencies, read_latencies, picks, total_seconds) = asyncio.run(command_load(catalog, directory, drafts_count, players, commands, concurrency, storage, random.Random(seed)))
+
+    command_latencies.sort()
+    read_latencies.sort()
+
+    return {
+        'storage': storage,
+        'drafts': drafts_count,
+        'players': players,
+        'in-flight': concurrency,
+        'commands': len(command_latencies),
+        'picks': picks,
+        'commands-per-s': len(command_latencies) / total_seconds,
+        'command-p50-ms': 1000 * percentile(command_latencies, 0.50),
+        'command-p99-ms': 1000 * percentile(command_latencies, 0.99),
+        'read-p50-ms': 1000 * percentile(read_latencies, 0.50),
+        'read-p99-ms': 1000 * percentile(read_latencies, 0.99)
+    }
+
+COMMAND_LOAD_COLUMNS = [
+    ('storage', '{:>7}'),
+    ('drafts', '{:>6}'),
+    ('players', '{:>7}'),
+    ('in-flight', '{:>9}'),
+    ('commands', '{:>8}'),
+    ('picks', '{:>6}'),
+    ('commands-per-s', '{:>14.0f}'),
+    ('command-p50-ms', '{:>14.3f}'),
+    ('command-p99-ms', '{:>14.3f}'),
+    ('read-p50-ms', '{:>11.3f}'),
+    ('read-p99-ms', '{:>11.3f}')
+]
+
+COLUMNS = [
+    ('storage', '{:>7}'),
+    ('cards', '{:>6}'),
+    ('players', '{:>7}'),
+    ('rounds', '{:>6}'),
+    ('picks', '{:>6}'),
+    ('pick-p50-ms', '{:>11.3f}'),
+    ('pick-p90-ms', '{:>11.3f}'),
+    ('pick-p99-ms', '{:>11.3f}'),
+    ('pick-max-ms', '{:>11.3f}'),
+    ('want-p50-ms', '{:>11.3f}'),
+    ('want-p99-ms', '{:>11.3f}'),
+    ('bytes-per-pick', '{:>14.0f}'),
+    ('peak-memory-mib', '{:>15.2f}'),
+    ('total-seconds', '{:>13.2f}')
+]
+
+def format_row(result, columns=COLUMNS):
+    cells = []
+    for (column, cell_format) in columns:
+        value = result[column]
+        cells.append(f'{"n/a":>{len(column)}}' if value is None else cell_format.format(value))
+    return '  '.join(cells)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the draft core without discord.')
+    parser.add_argument('--card-list', default='card-list.txt', help='Real card names, also the source of words for synthetic lists')
+    parser.add_argument('--cards', type=int, nargs='+', default=[540, 30000], help='Card pool sizes; sizes beyond the card list are filled with synthetic names')
+    parser.add_argument('--players', type=int, nargs='+', default=[8, 32, 128])
+    parser.add_argument('--rounds', type=int, default=45, help='Capped so every pick has a card available')
+    parser.add_argument('--storage', nargs='+', default=['pickle'], choices=STORAGE_KINDS.keys())
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--commands', type=int, default=0, help='Also measure command throughput with this many commands')
+    parser.add_argument('--drafts', type=int, default=4, help='Drafts running at once while measuring command throughput')
+    parser.add_argument('--in-flight', type=int, default=64, help='Commands waiting for an answer at once while measuring command throughput')
+    args = parser.parse_args()
+
+    with open(args.card_list, 'r') as f:
+        base_names = f.read().splitlines()
+
+    print('  '.join(f'{column:>{len(column)}}' for (column, _) in COLUMNS))
+
+    with tempfile.TemporaryDirectory() as directory:
+        for card_count in args.cards:
+            if card_count <= len(base_names):
+                card_names = base_names[:card_count]
+            else:
+                card_names = synthetic_card_names(base_names, card_count, random.Random(args.seed))
+
+            catalog_path = os.path.join(directory, f'{card_count}.catalog')
+            build_catalog(card_names, catalog_path)
+
+            for storage in args.storage:
+                for players in args.players:
+                    print(format_row(run_scenario(catalog_path, len(card_names), players, args.rounds, storage, args.seed)), flush=True)
+
+        if args.commands:
+            print()
+            print('  '.join(f'{column:>{len(column)}}' for (column, _) in COMMAND_LOAD_COLUMNS))
+
+            for storage in args.storage:
+                for players in args.players:
+                    print(format_row(run_command_load(catalog_path, args.drafts, players, args.commands, args.in_flight, storage, args.seed), COMMAND_LOAD_COLUMNS), flush=True)
+
+if __name__ == '__main__':
+    main()
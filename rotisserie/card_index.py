@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+from array import array
+from bisect import bisect_left
+
+# grams are taken over the utf-8 bytes of the lowercase names, which keeps
+# every gram a fixed size while still matching exactly the same substrings
+GRAM_SIZE = 3
+
+def _gram_keys(data):
+    return {(data[i] << 16) | (data[i+1] << 8) | data[i+2] for i in range(len(data) - GRAM_SIZE + 1)}
+
+def build_index(lower_names):
+    """
+    Build the arrays searched by CardIndex from the lowercase, utf-8 encoded
+    card names, where a card's id is its position in lower_names.
+
+    Return a dict of arrays of unsigned 32-bit ints:
+    sorted-ids:   card ids in alphabetical order
+    ranks:        position of each card id in sorted-ids
+    word-cards,
+    word-offsets: every word start after the first, as (card id, byte offset)
+                  pairs sorted by the text from the offset onwards
+    gram-keys,
+    gram-offsets,
+    postings:     card ids containing gram-keys[i] are
+                  postings[gram-offsets[i]:gram-offsets[i+1]], ascending
+    """
+    sorted_ids = sorted(range(len(lower_names)), key=lambda card_id:lower_names[card_id])
+
+    ranks = [0] * len(lower_names)
+    for rank, card_id in enumerate(sorted_ids):
+        ranks[card_id] = rank
+
+    word_starts = []
+    grams = {}
+    for card_id, name in enumerate(lower_names):
+        # every position following a space or hyphen starts a new word
+        for i in range(1, len(name)):
+            if name[i-1] in b' -' and name[i] != ord(' '):
+                word_starts.append((card_id, i))
+
+        for key in _gram_keys(name):
+            grams.setdefault(key, []).append(card_id)
+
+    word_starts.sort(key=lambda word_start:lower_names[word_start[0]][word_start[1]:])
+
+    gram_keys = sorted(grams)
+    gram_offsets = [0]
+    postings = []
+    for key in gram_keys:
+        postings.extend(grams[key])
+        gram_offsets.append(len(postings))
+
+    return {
+        'sorted-ids': array('I', sorted_ids),
+        'ranks': array('I', ranks),
+        'word-cards': array('I', map(lambda word_start:word_start[0], word_starts)),
+        'word-offsets': array('I', map(lambda word_start:word_start[1], word_starts)),
+        'gram-keys': array('I', gram_keys),
+        'gram-offsets': array('I', gram_offsets),
+        'postings': array('I', postings)
+    }
+
+class CardIndex:
+    """
+    Substring search over a CardCatalog, using the arrays from build_index.
+
+    Results are ranked exact > prefix > word-start > substring, and sorted
+    alphabetically within each rank so the same query always gives the same
+    answer. Each rank is only computed if the better ranks did not fill the
+    requested number of results.
+    """
+
+    def __init__(self, catalog):
+        self._catalog = catalog
+        self._lower = catalog.lower_name_bytes
+
+    def search(self, fragment, limit=None, exclude=None):
+        """
+        Return ids of the cards whose name contains fragment, best matches first.
+
+        exclude is an optional predicate; card ids for which it returns True
+        are left out of the results (e.g. cards that have already been taken).
+        """
+        fragment = fragment.lower().encode('utf-8')
+        ranks = self._catalog.ranks
+        ret = []
+        seen = set()
+
+        def _extend(matches):
+            for card_id in sorted(matches, key=lambda card_id:ranks[card_id]):
+                if card_id in seen or (exclude and exclude(card_id)):
+                    continue
+                seen.add(card_id)
+                ret.append(card_id)
+                if limit is not None and len(ret) >= limit:
+                    return True
+            return False
+
+        if len(fragment) == 0:
+            return ret
+
+        for tier in [self._exact, self._prefix, self._word_start, self._substring]:
+            if _extend(tier(fragment)):
+                break
+
+        return ret
+
+    def _exact(self, fragment):
+        card_id = self._catalog.lookup_bytes(fragment)
+        return [] if card_id is None else [card_id]
+
+    def _prefix(self, fragment):
+        sorted_ids = self._catalog.sorted_ids
+        ret = []
+        i = bisect_left(sorted_ids, fragment, key=self._lower)
+        while i < len(sorted_ids) and self._lower(sorted_ids[i]).startswith(fragment):
+            ret.append(sorted_ids[i])
+            i += 1
+        return ret
+
+    def _word_start(self, fragment):
+        word_cards = self._catalog.word_cards
+        word_offsets = self._catalog.word_offsets
+
+        def _suffix(i):
+            return self._lower(word_cards[i])[word_offsets[i]:]
+
+        ret = set()
+        i = bisect_left(range(len(word_cards)), fragment, key=_suffix)
+        while i < len(word_cards) and _suffix(i).startswith(fragment):
+            ret.add(word_cards[i])
+            i += 1
+        return ret
+
+    def _substring(self, fragment):
+        # fragments shorter than a gram have no postings, so scan instead
+        if len(fragment) < GRAM_SIZE:
+            return [card_id for card_id in range(len(self._catalog)) if fragment in self._lower(card_id)]
+
+        gram_keys = self._catalog.gram_keys
+        gram_offsets = self._catalog.gram_offsets
+
+        postings = []
+        for key in _gram_keys(fragment):
+            i = bisect_left(gram_keys, key)
+            if i == len(gram_keys) or gram_keys[i] != key:
+                return []
+            postings.append(self._catalog.postings[gram_offsets[i]:gram_offsets[i+1]])
+        postings.sort(key=len)
+
+        candidates = set(postings[0])
+        for posting in postings[1:]:
+            if not candidates:
+                break
+            candidates.intersection_update(posting)
+
+        # grams can match out of order, so confirm the real substring
+        return [card_id for card_id in candidates if fragment in self._lower(card_id)]
@@ -0,0 +1,219 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import mmap
+import os
+import struct
+import sys
+
+from array import array
+from bisect import bisect_left
+from .card_index import CardIndex, build_index
+
+MAGIC = b'RCAT'
+VERSION = 1
+
+# u32 arrays stored after the header, in this order
+SECTIONS = [
+    'name-offsets',
+    'names',
+    'lower-offsets',
+    'lower-names',
+    'sorted-ids',
+    'ranks',
+    'word-cards',
+    'word-offsets',
+    'gram-keys',
+    'gram-offsets',
+    'postings'
+]
+
+# magic, version, byte order, card count, then (offset, length) per section
+HEADER = struct.Struct(f'<4sIII{2*len(SECTIONS)}I')
+
+def _blob(strings):
+    offsets = array('I', [0])
+    blob = bytearray()
+    for string in strings:
+        blob += string
+        offsets.append(len(blob))
+    return (offsets, bytes(blob))
+
+def build_catalog(card_names, path):
+    """
+    Write a catalog for card_names to path. A card's id is its position in
+    card_names; later names that only differ in case from an earlier one are
+    skipped.
+    """
+    names = []
+    lower_names = []
+    seen = set()
+    for card_name in card_names:
+        lower_name = card_name.lower().encode('utf-8')
+        if len(card_name) == 0 or lower_name in seen:
+            continue
+        seen.add(lower_name)
+        names.append(card_name.encode('utf-8'))
+        lower_names.append(lower_name)
+
+    (name_offsets, names_blob) = _blob(names)
+    (lower_offsets, lower_blob) = _blob(lower_names)
+
+    sections = {
+        'name-offsets': name_offsets,
+        'names': names_blob,
+        'lower-offsets': lower_offsets,
+        'lower-names': lower_blob
+    }
+    sections.update(build_index(lower_names))
+
+    body = bytearray()
+    table = []
+    for section in SECTIONS:
+        data = sections[section]
+        data = data.tobytes() if isinstance(data, array) else data
+        # keep every section 4-byte aligned so it can be cast to u32 in place
+        body += b'\0' * (-len(body) % 4)
+        table.extend([HEADER.size + len(body), len(data)])
+        body += data
+
+    byte_order = 0 if sys.byteorder == 'little' else 1
+    header = HEADER.pack(MAGIC, VERSION, byte_order, len(names), *table)
+
+    # write then rename, a half written catalog must never be opened
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'wb') as f:
+        f.write(header)
+        f.write(body)
+    os.replace(temp_path, path)
+
+class CardCatalog:
+    """
+    Read-only, memory-mapped list of card names written by build_catalog.
+
+    Cards are addressed by integer id. Nothing is parsed on open, names are
+    decoded from the mapped file only when they are asked for.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        view = memoryview(self._mmap)
+        (magic, version, byte_order, self._count, *table) = HEADER.unpack_from(view)
+
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f'{path} is not a version {VERSION} card catalog')
+        if byte_order != (0 if sys.byteorder == 'little' else 1):
+            raise ValueError(f'{path} was built on a machine with a different byte order')
+
+        sections = {}
+        for i, section in enumerate(SECTIONS):
+            (offset, length) = table[2*i:2*i+2]
+            sections[section] = view[offset:offset+length]
+
+        self._names = sections['names']
+        self._lower_names = sections['lower-names']
+        self._name_offsets = sections['name-offsets'].cast('I')
+        self._lower_offsets = sections['lower-offsets'].cast('I')
+
+        self.sorted_ids = sections['sorted-ids'].cast('I')
+        self.ranks = sections['ranks'].cast('I')
+        self.word_cards = sections['word-cards'].cast('I')
+        self.word_offsets = sections['word-offsets'].cast('I')
+        self.gram_keys = sections['gram-keys'].cast('I')
+        self.gram_offsets = sections['gram-offsets'].cast('I')
+        self.postings = sections['postings'].cast('I')
+
+        self.index = CardIndex(self)
+        self._digest = None
+
+    def __len__(self):
+        return self._count
+
+    def digest(self, card_count=None):
+        """
+        Fingerprint of the names of the first card_count cards, by default
+        all of them, in id order, so anything that stores card ids notices
+        when they were given out by another card list.
+        """
+        if card_count is None or card_count == self._count:
+            if self._digest is None:
+                self._digest = self._hash(self._count)
+            return self._digest
+
+        return self._hash(card_count)
+
+    def _hash(self, card_count):
+        digest = hashlib.sha1()
+        for card_id in range(card_count):
+            digest.update(self.lower_name_bytes(card_id) + b'\n')
+        return digest.hexdigest()
+
+    def name(self, card_id):
+        return str(self._names[self._name_offsets[card_id]:self._name_offsets[card_id+1]], 'utf-8')
+
+    def lower_name_bytes(self, card_id):
+        return bytes(self._lower_names[self._lower_offsets[card_id]:self._lower_offsets[card_id+1]])
+
+    def lookup_bytes(self, lower_name):
+        i = bisect_left(self.sorted_ids, lower_name, key=self.lower_name_bytes)
+        if i < len(self.sorted_ids) and self.lower_name_bytes(self.sorted_ids[i]) == lower_name:
+            return self.sorted_ids[i]
+        return None
+
+    def lookup(self, card_name):
+        """
+        Return the id of the card with exactly this name, ignoring case, or None.
+        """
+        return self.lookup_bytes(card_name.lower().encode('utf-8'))
+
+class CardBitset:
+    """
+    Packed set of card ids, one bit per card in the catalog.
+    """
+
+    def __init__(self, card_count, card_ids=()):
+        self._bits = bytearray((card_count + 7) // 8)
+        for card_id in card_ids:
+            self.add(card_id)
+
+    def __contains__(self, card_id):
+        return bool(self._bits[card_id >> 3] & (1 << (card_id & 7)))
+
+    def add(self, card_id):
+        self._bits[card_id >> 3] |= 1 << (card_id & 7)
+
+    def discard(self, card_id):
+        self._bits[card_id >> 3] &= ~(1 << (card_id & 7)) & 0xff
+
+    def frozen(self):
+        """
+        Copy that can't be changed, e.g. for a snapshot.
+        """
+        copy = CardBitset(0)
+        copy._bits = bytes(self._bits)
+        return copy
+
+def open_catalog(card_list_path, catalog_path):
+    """
+    Open the catalog for a card list, rebuilding it first if it is missing
+    or older than the card list. Ids are positions in the card list, so
+    while drafts are running cards may only be added at its end.
+    """
+    if not os.path.exists(catalog_path) or os.path.getmtime(catalog_path) < os.path.getmtime(card_list_path):
+        with open(card_list_path, 'r') as f:
+            build_catalog(f.read().splitlines(), catalog_path)
+
+    return CardCatalog(catalog_path)
+
+if __name__ == '__main__':
+    if len(sys.argv) != 3:
+        print('Usage: python -m rotisserie.catalog card-list.txt cards.catalog')
+        sys.exit(1)
+
+    with open(sys.argv[1], 'r') as f:
+        build_catalog(f.read().splitlines(), sys.argv[2])
+
+    catalog = CardCatalog(sys.argv[2])
+    print(f'Wrote {len(catalog)} cards to {sys.argv[2]}')
@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import heapq
+import time
+
+def format_duration(seconds):
+    """
+    Round seconds to a short human readable duration, e.g. 1d 4h, 2h 5m or 45s.
+    """
+    seconds = max(0, int(seconds))
+
+    if seconds < 60:
+        return f'{seconds}s'
+
+    (minutes, seconds) = divmod(seconds, 60)
+    (hours, minutes) = divmod(minutes, 60)
+    (days, hours) = divmod(hours, 24)
+
+    if days:
+        return f'{days}d {hours}h' if hours else f'{days}d'
+
+    if hours:
+        return f'{hours}h {minutes}m' if minutes else f'{hours}h'
+
+    return f'{minutes}m'
+
+class DeadlineScheduler:
+    """
+    Wakes drafts when their pick clock needs attention.
+
+    schedule(draft) looks up Draft.clock_deadline() and keeps it in a heap.
+    run() sleeps until exactly the earliest deadline, or until an earlier
+    one is scheduled, and then calls on_deadline(draft), e.g. to signal the
+    pick engine, which sends the reminder or makes the auto-pick. Nothing is
+    polled, a draft without a clock costs nothing.
+
+    Deadlines are unix times, so they stay right across restarts. Call
+    schedule() again whenever a draft's deadline may have changed; heap
+    entries that no longer match are skipped rather than removed.
+    """
+
+    def __init__(self, on_deadline):
+        self.on_deadline = on_deadline
+
+        # (deadline, draft id), possibly stale
+        self._heap = []
+        # draft id -> current deadline and draft
+        self._deadlines = {}
+        self._drafts = {}
+        self._changed = asyncio.Event()
+
+    def schedule(self, draft):
+        deadline = draft.clock_deadline()
+
+        if deadline == self._deadlines.get(draft.draft_id):
+            return
+
+        if deadline is None:
+            del self._deadlines[draft.draft_id]
+            del self._drafts[draft.draft_id]
+            return
+
+        self._deadlines[draft.draft_id] = deadline
+        self._drafts[draft.draft_id] = draft
+        heapq.heappush(self._heap, (deadline, draft.draft_id))
+
+        # run() may be sleeping towards a later deadline
+        if self._heap[0] == (deadline, draft.draft_id):
+            self._changed.set()
+
+    def next_deadline(self):
+        # drop entries that were rescheduled or cancelled since
+        while self._heap and self._deadlines.get(self._heap[0][1]) != self._heap[0][0]:
+            heapq.heappop(self._heap)
+
+        return self._heap[0][0] if self._heap else None
+
+    def fire(self, now):
+        """
+        Hand every draft whose deadline has passed to on_deadline.
+        """
+        while self.next_deadline() is not None and self.next_deadline() <= now:
+            (_, draft_id) = heapq.heappop(self._heap)
+            del self._deadlines[draft_id]
+            self.on_deadline(self._drafts.pop(draft_id))
+
+    async def run(self):
+        while True:
+            deadline = self.next_deadline()
+            timeout = None if deadline is None else max(0, deadline - time.time())
+
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            self._changed.clear()
+            self.fire(time.time())
@@ -0,0 +1,856 @@
+# -*- coding: utf-8 -*-
+
+import os
+import random
+import sys
+import time
+
+from datetime import datetime
+from pickledb import PickleDB
+from .catalog import CardBitset, open_catalog
+from .metrics import metrics
+from .storage import PICKLE_FILE_NAMES, SQLITE_FILE_NAME, SqliteStorage, is_complete, open_storage
+
+SEARCH_MAX_LENGTH = 5
+WANTLIST_MAX_LENGTH = 20
+BACKUPLIST_MAX_LENGTH = 50
+DRAFT_ROUNDS = 10
+# with a pick clock, players are reminded when this many seconds are left
+REMINDER_SECONDS = [3600, 600]
+
+class DraftError(Exception):
+    """
+    A command was rejected; the message is meant to be shown to the player.
+    """
+
+class Draft:
+    """
+    One rotisserie draft, stored in its own directory.
+
+    All changes go through record(), which hands an event to the draft's
+    storage (see rotisserie.storage), applies it to the in-memory users and
+    state and then lets the storage commit it. storage only picks the format
+    of a new draft, existing drafts keep theirs.
+
+    Nothing here depends on discord, so drafts can be run headless, e.g. by
+    rotisserie.bench. number_of_rounds only applies to a new draft.
+    """
+
+    def __init__(self, draft_id, directory, catalog, number_of_rounds=DRAFT_ROUNDS, storage='pickle'):
+        self.draft_id = draft_id
+        self.directory = directory
+        self.catalog = catalog
+
+        os.makedirs(directory, exist_ok=True)
+
+        self.storage = open_storage(directory, storage)
+        self.closed = False
+
+        # user id -> user record
+        (self.state, self.users, replayed_events) = self.storage.load(number_of_rounds)
+
+        try:
+            self.check_catalog()
+        except DraftError:
+            # nothing has been applied yet, so there is nothing to save
+            self.storage.abandon()
+            raise
+
+        # cards that have been drafted by anyone
+        self.taken_cards = CardBitset(len(catalog))
+
+        # reverse index from card id to the ids of users with that card in their want list
+        self.wanted_by = {}
+
+        # team names in use, so registering doesn't have to look at every user
+        self.team_names = set()
+
+        # ids of users whose records changed since the storage last wrote them
+        self.dirty_users = set()
+
+        for (user_id, user) in self.users.items():
+            # users from before the pick clock
+            user.setdefault('backup-cards', [])
+            user.setdefault('time-bank', None)
+
+            # drafts from before the catalog stored lowercase card names instead of ids
+            for key in ['wanted-cards', 'drafted-cards', 'backup-cards']:
+                if any(map(lambda card_id:isinstance(card_id, str), user[key])):
+                    user[key] = list(map(lambda card_id:catalog.lookup(card_id) if isinstance(card_id, str) else card_id, user[key]))
+                    self.dirty_users.add(user_id)
+
+            self.team_names.add(user['team-name'])
+
+            for card_id in user['drafted-cards']:
+                self.taken_cards.add(card_id)
+
+            for card_id in user['wanted-cards']:
+                self.wanted_by.setdefault(card_id, set()).add(user_id)
+
+        # catch up on everything that happened after the last snapshot
+        for event in replayed_events:
+            self.apply_event(event)
+
+        # also initializes the storage on fresh start
+        if replayed_events or self.dirty_users or self.state.dirty:
+            self.snapshot()
+
+    def check_catalog(self):
+        """
+        Make sure the stored card ids still mean the same cards. Cards added
+        at the end of the card list are fine, anything else would silently
+        turn drafted and wanted cards into different ones, so the draft
+        refuses to load with a DraftError. Drafts from before the digest was
+        stored are taken to use the current card list.
+        """
+        state = self.state
+
+        if state.catalog_digest is not None:
+            if state.catalog_size > len(self.catalog) or self.catalog.digest(state.catalog_size) != state.catalog_digest:
+                raise DraftError('This draft was run with a different card list and can\'t be loaded. The bot owner has to put the old card-list.txt back; while drafts are running, cards can only be added at its end.')
+
+        if state.catalog_size != len(self.catalog):
+            state.catalog_size = len(self.catalog)
+            state.catalog_digest = self.catalog.digest()
+            state.dirty = True
+
+    def snapshot(self):
+        self.storage.snapshot(self)
+
+    # closing twice is harmless, e.g. through the draft's actor and then by unloading it
+    def close(self):
+        if not self.closed:
+            self.storage.close(self)
+            self.closed = True
+
+    # user_id is provided by discord and stored as a string, as pickleDB did
+    def get_user(self, user_id):
+        return self.users.get(str(user_id))
+
+    # returns card ids, ranked exact > prefix > word-start > substring
+    def search_cards(self, fragment, exclude_taken=False):
+        exclude = self.taken_cards.__contains__ if exclude_taken else None
+
+        return self.catalog.index.search(fragment, limit=SEARCH_MAX_LENGTH, exclude=exclude)
+
+    def get_has_started(self):
+        return self.state.has_started
+
+    def get_player_count(self):
+        return len(self.state.pick_order)
+
+    def get_pick_number(self):
+        return self.state.pick_number
+
+    def get_round(self, pick_number):
+        return self.state.round_of(pick_number)
+
+    def get_index(self, pick_number):
+        return self.state.snake_order[pick_number]
+
+    def get_current_round(self):
+        return self.state.round_of(self.state.pick_number)
+
+    def get_current_index(self):
+        return self.state.snake_order[self.state.pick_number]
+
+    def get_has_finished(self):
+        return self.state.has_finished()
+
+    # finished, and everyone has been told so
+    def get_is_complete(self):
+        return self.state.has_finished() and self.state.current_drafter_notified
+
+    def pick_string(self, pick_number):
+        return f'Round {self.get_round(pick_number)+1}, Pick {(pick_number % self.get_player_count())+1}'
+
+    def pick_history(self):
+        """
+        Every pick made so far as (pick_number, user_id, card_id), worked out
+        from the pick order and the cards each user drafted.
+        """
+        drafted_cards = {user_id: iter(user['drafted-cards']) for (user_id, user) in self.users.items()}
+
+        ret = []
+        for pick_number in range(self.state.pick_number):
+            user_id = self.state.pick_order[self.state.snake_order[pick_number]]
+            ret.append((pick_number, user_id, next(drafted_cards[user_id])))
+
+        return ret
+
+    def last_picks(self, count):
+        """
+        The last count picks as pick events, newest first, without looking at
+        any earlier ones.
+        """
+        # how many of each user's drafted cards have been passed already
+        offsets = {}
+
+        ret = []
+        for pick_number in range(self.state.pick_number - 1, self.state.pick_number - 1 - count, -1):
+            user_id = self.state.pick_order[self.state.snake_order[pick_number]]
+            offsets[user_id] = offsets.get(user_id, 0) + 1
+            ret.append({'pick-number': pick_number, 'user-id': user_id, 'card-id': self.get_user(user_id)['drafted-cards'][-offsets[user_id]]})
+
+        return ret
+
+    def set_want_list(self, user_id, card_ids):
+        user = self.get_user(user_id)
+
+        for card_id in user['wanted-cards']:
+            self.wanted_by[card_id].discard(user_id)
+
+        user['wanted-cards'] = list(card_ids)
+        self.dirty_users.add(user_id)
+
+        for card_id in user['wanted-cards']:
+            self.wanted_by.setdefault(card_id, set()).add(user_id)
+
+    # every event sets absolute values, so replaying an event whose effects were
+    # already snapshotted is harmless
+    def apply_event(self, event):
+        event_type = event['type']
+
+        if event_type == 'register':
+            self.users[event['user-id']] = event['user']
+            self.team_names.add(event['user']['team-name'])
+            self.dirty_users.add(event['user-id'])
+
+        elif event_type == 'start':
+            self.state.has_started = True
+            self.state.time_began = event['time-began']
+            self.state.main_channel = event['main-channel']
+            self.state.set_pick_order(event['pick-order'])
+            self.state.current_drafter_notified = False
+            self.state.turn_started = event.get('time')
+
+            if event['google-sheet-id']:
+                self.state.google_sheet_id = event['google-sheet-id']
+
+            self.state.dirty = True
+
+        elif event_type == 'wants':
+            self.set_want_list(event['user-id'], event['wanted-cards'])
+
+        elif event_type == 'backups':
+            self.get_user(event['user-id'])['backup-cards'] = list(event['backup-cards'])
+            self.dirty_users.add(event['user-id'])
+
+        elif event_type == 'clock':
+            self.state.pick_seconds = event['pick-seconds']
+            self.state.bank_seconds = event['bank-seconds']
+
+            # the current drafter's clock starts over with the new settings
+            self.state.turn_started = event['time']
+            self.state.reminders_sent = 0
+            self.state.dirty = True
+
+        elif event_type == 'reminded':
+            self.state.reminders_sent = event['reminders-sent']
+            self.state.dirty = True
+
+        elif event_type == 'notified':
+            self.state.current_drafter_notified = True
+            self.state.dirty = True
+
+        elif event_type == 'pick':
+            picked_card_id = event['card-id']
+            self.taken_cards.add(picked_card_id)
+
+            drafter = self.get_user(event['user-id'])
+            if picked_card_id not in drafter['drafted-cards']:
+                drafter['drafted-cards'].append(picked_card_id)
+            drafter['time-bank'] = event.get('time-bank', drafter['time-bank'])
+            self.dirty_users.add(event['user-id'])
+
+            # remove the card from the want lists of the users who queued it
+            for user_id in self.wanted_by.pop(picked_card_id, set()):
+                user = self.get_user(user_id)
+                user['wanted-cards'] = list(filter(lambda card_id:card_id != picked_card_id, user['wanted-cards']))
+                self.dirty_users.add(user_id)
+
+            self.state.pick_number = event['pick-number'] + 1
+            self.state.current_drafter_notified = False
+            self.state.turn_started = event.get('time')
+            self.state.reminders_sent = 0
+
+            # a new pick makes the undone ones impossible to redo
+            if not event.get('redo'):
+                self.state.undone = []
+            elif self.state.undone and self.state.undone[-1]['pick-number'] == event['pick-number']:
+                self.state.undone.pop()
+
+            self.state.dirty = True
+
+        elif event_type == 'undo':
+            for pick in event['picks']:
+                # only the latest pick can be taken back, which also makes replaying this harmless
+                if self.state.pick_number != pick['pick-number'] + 1:
+                    continue
+
+                drafter = self.get_user(pick['user-id'])
+                if drafter['drafted-cards'] and drafter['drafted-cards'][-1] == pick['card-id']:
+                    drafter['drafted-cards'].pop()
+                self.dirty_users.add(pick['user-id'])
+
+                self.taken_cards.discard(pick['card-id'])
+                self.state.pick_number = pick['pick-number']
+                self.state.undone.append(pick)
+
+            # the drafter whose pick was taken back is on the clock again
+            self.state.current_drafter_notified = False
+            self.state.turn_started = event['time']
+            self.state.reminders_sent = 0
+            self.state.dirty = True
+
+        else:
+            raise ValueError(f'Unknown journal event: {event_type}')
+
+    # the event is durable once this returns
+    def record(self, event):
+        with metrics.time('draft.journal'):
+            self.storage.record(event)
+
+        with metrics.time('draft.apply'):
+            self.apply_event(event)
+
+        self.storage.commit(self, event)
+
+        return event
+
+    def register(self, user_id, discord_id, discord_name, discord_discriminator, team_name):
+        # check if the user is already registered
+        if self.get_user(user_id):
+            raise DraftError('You\'re already registered!')
+
+        # If the draft has been started, this command should be rejected
+        if self.get_has_started():
+            raise DraftError('The draft has already been started.')
+
+        # default team_name to their discord username
+        if len(team_name) == 0:
+            team_name = discord_name
+
+        # Reject the user if the team name is already in use
+        if team_name in self.team_names:
+            raise DraftError('That team name is already in use! Please pick another one.')
+
+        # registration looks good, so create and store a new user dict
+        new_user = {
+            'discord-id': discord_id,
+            'discord-name': discord_name,
+            'discord-discriminator': discord_discriminator,
+
+            'team-name': team_name,
+            'drafted-cards': [],
+            'wanted-cards': [],
+            'backup-cards': [],
+            'time-bank': None
+        }
+
+        self.record({'type': 'register', 'user-id': user_id, 'user': new_user})
+
+        return new_user
+
+    def start(self, main_channel, google_sheet_id=''):
+        """
+        Start the draft in a random pick order, which is returned as a list of user ids.
+        """
+        # if the draft has already finished, this command should be rejected
+        if self.get_has_finished():
+            raise DraftError('The draft already finished. If you want to run a new draft here, kill the bot and then delete this draft\'s directory.')
+
+        # If the draft has been started, this command should be rejected
+        if self.get_has_started():
+            raise DraftError('The draft has already been started.')
+
+        if len(self.users) == 0:
+            raise DraftError('Nobody has registered for the draft yet.')
+
+        # get a random ordering of users
+        pick_order = list(self.users)
+        random.shuffle(pick_order)
+
+        self.record({
+            'type': 'start',
+            'time-began': str(datetime.now()),
+            'main-channel': main_channel,
+            'pick-order': pick_order,
+            'google-sheet-id': google_sheet_id,
+            'time': time.time()
+        })
+
+        return pick_order
+
+    # currently allowing duplicates into the wantlist
+    # b/c would like to natively handle multiple copies of cards
+    def want(self, user_id, card_name):
+        """
+        Add a card to the end of a user's want list and return its id.
+        """
+        user = self.get_user(user_id)
+
+        if not user:
+            raise DraftError('Not registered. Try the !register command')
+
+        card_id = self.resolve_card(card_name)
+
+        # if the draft has already finished, this command should be rejected
+        if self.get_has_finished():
+            raise DraftError('The draft already finished. If you want to run a new draft here, kill the bot and then delete this draft\'s directory.')
+
+        # block excessive wantlist for efficiency purposes
+        if len(user['wanted-cards']) >= WANTLIST_MAX_LENGTH:
+            raise DraftError('Your draft list is too long. Please remove some cards before trying to draft more. !clear to wipe list')
+
+        # cannot want a card that has already been taken
+        if card_id in self.taken_cards:
+            raise DraftError('Card already taken')
+
+        self.record({'type': 'wants', 'user-id': user_id, 'wanted-cards': user['wanted-cards'] + [card_id]})
+
+        return card_id
+
+    def resolve_card(self, card_name):
+        """
+        Return the id of the card a player means by card_name.
+        """
+        card_id = self.catalog.lookup(card_name)
+
+        # ensure a clear match before proceeding
+        #   either an exact string match (in which case card_id is already populated)
+        #   or use the card from search if there is exactly 1 match
+        # taken cards are skipped so they can't make a partial name ambiguous
+        if card_id is None:
+            card_list = self.search_cards(card_name, exclude_taken=True)
+
+            if len(card_list) == 0:
+                raise DraftError('No matching cards found. Try !search to resolve')
+
+            if len(card_list) > 1:
+                card_list_string = ', '.join(map(self.catalog.name, card_list))
+                raise DraftError(f'Multiple matching cards found. Please be precise\nMatches: {card_list_string}')
+
+            card_id = card_list[0]
+
+        return card_id
+
+    def clear(self, user_id):
+        if not self.get_user(user_id):
+            raise DraftError('Not registered. Try the !register command')
+
+        self.record({'type': 'wants', 'user-id': user_id, 'wanted-cards': []})
+
+    def want_many(self, user_id, lines, replace=False):
+        """
+        Resolve every line to a card in one pass and record the result as a
+        single want list change. A line is a card name, or #n for the card
+        currently at position n of the want list. The cards are added to the
+        end of the want list, or replace it if replace is set, which is how
+        players reorder and remove cards. A replacement is all or nothing, if
+        any line is skipped the want list is left as it was.
+
+        Return the new want list and a message for every line that was skipped.
+        """
+        user = self.get_user(user_id)
+
+        if not user:
+            raise DraftError('Not registered. Try the !register command')
+
+        if self.get_has_finished():
+            raise DraftError('The draft already finished. If you want to run a new draft here, kill the bot and then delete this draft\'s directory.')
+
+        current_want_list = user['wanted-cards']
+        want_list = [] if replace else list(current_want_list)
+        errors = []
+
+        for line in map(str.strip, lines):
+            if not line:
+                continue
+
+            try:
+                if line.startswith('#') and line[1:].isdigit():
+                    position = int(line[1:])
+                    if not 1 <= position <= len(current_want_list):
+                        raise DraftError(f'There is no card #{position} on your draft list')
+                    card_id = current_want_list[position - 1]
+                else:
+                    card_id = self.resolve_card(line)
+
+                if card_id in self.taken_cards:
+                    raise DraftError('Card already taken')
+
+                if len(want_list) >= WANTLIST_MAX_LENGTH:
+                    raise DraftError(f'Your draft list can\'t be longer than {WANTLIST_MAX_LENGTH} cards')
+            except DraftError as e:
+                errors.append(f'{line}: {e}')
+                continue
+
+            want_list.append(card_id)
+
+        # a typo must not drop the cards on the rest of the list
+        if replace and errors:
+            return (list(current_want_list), errors)
+
+        if want_list != current_want_list:
+            self.record({'type': 'wants', 'user-id': user_id, 'wanted-cards': want_list})
+
+        return (want_list, errors)
+
+    def backup(self, user_id, card_name):
+        """
+        Add a card to the end of a user's backup list, which the pick clock
+        picks from when they run out of time, and return its id.
+        """
+        user = self.get_user(user_id)
+
+        if not user:
+            raise DraftError('Not registered. Try the !register command')
+
+        card_id = self.resolve_card(card_name)
+
+        if self.get_has_finished():
+            raise DraftError('The draft already finished. If you want to run a new draft here, kill the bot and then delete this draft\'s directory.')
+
+        # taken cards are skipped when picking, so they can be dropped here
+        backup_list = list(filter(lambda backup_card_id:backup_card_id not in self.taken_cards, user['backup-cards']))
+
+        if len(backup_list) >= BACKUPLIST_MAX_LENGTH:
+            raise DraftError('Your backup list is too long. !clear_backups to wipe it')
+
+        if card_id in self.taken_cards:
+            raise DraftError('Card already taken')
+
+        self.record({'type': 'backups', 'user-id': user_id, 'backup-cards': backup_list + [card_id]})
+
+        return card_id
+
+    def clear_backups(self, user_id):
+        if not self.get_user(user_id):
+            raise DraftError('Not registered. Try the !register command')
+
+        self.record({'type': 'backups', 'user-id': user_id, 'backup-cards': []})
+
+    def set_clock(self, pick_seconds, bank_seconds=0):
+        """
+        Give every pick pick_seconds, after which the drafter's time bank of
+        bank_seconds for the whole draft runs down. 0 turns the clock off.
+        """
+        if self.get_has_finished():
+            raise DraftError('The draft already finished. If you want to run a new draft here, kill the bot and then delete this draft\'s directory.')
+
+        if pick_seconds < 0 or bank_seconds < 0:
+            raise DraftError('Pick clock times can\'t be negative.')
+
+        self.record({'type': 'clock', 'pick-seconds': pick_seconds, 'bank-seconds': bank_seconds, 'time': time.time()})
+
+    def get_time_bank(self, user_id):
+        time_bank = self.get_user(user_id)['time-bank']
+
+        # banks never grow past the current setting
+        return self.state.bank_seconds if time_bank is None else min(time_bank, self.state.bank_seconds)
+
+    def clock_expiry(self):
+        """
+        Time at which the current drafter runs out of time, or None if no pick clock is running.
+        """
+        state = self.state
+        if not state.pick_seconds or not state.has_started or state.turn_started is None or state.has_finished():
+            return None
+
+        return state.turn_started + state.pick_seconds + self.get_time_bank(state.current_drafter_id())
+
+    def due_reminders(self, expiry):
+        """
+        Indexes into REMINDER_SECONDS of the reminders still to come this
+        turn, with the time each is due. Thresholds longer than the whole
+        turn are left out.
+        """
+        ret = []
+        for i in range(self.state.reminders_sent, len(REMINDER_SECONDS)):
+            if expiry - REMINDER_SECONDS[i] > self.state.turn_started:
+                ret.append((i, expiry - REMINDER_SECONDS[i]))
+
+        return ret
+
+    def clock_deadline(self):
+        """
+        Next time the pick clock needs attempt_pick() to run, or None.
+        """
+        expiry = self.clock_expiry()
+        if expiry is None:
+            return None
+
+        reminders = self.due_reminders(expiry)
+        return reminders[0][1] if reminders else expiry
+
+    def backup_pick(self, user_id):
+        for card_id in self.get_user(user_id)['backup-cards']:
+            if card_id not in self.taken_cards:
+                return card_id
+
+        # nothing left on the backup list, take the first card still available in the card list
+        for card_id in range(len(self.catalog)):
+            if card_id not in self.taken_cards:
+                return card_id
+
+        return None
+
+    def attempt_pick(self, now=None):
+        """
+        Make the current pick if the current drafter has a want list, or
+        record that they were told it is their turn. With a pick clock, the
+        drafter is reminded as time runs low and a card from their backup
+        list is picked once it has run out.
+
+        Return the recorded event, so the caller can announce it, or None if
+        there was nothing to do. Notifications are 'notified' events whose
+        'notice' is either 'turn' or 'complete', and 'reminded' events. Pick
+        events also list the other users whose want list held the card in
+        'sniped-user-ids', and have 'auto' set when the clock made them.
+        """
+        with metrics.time('draft.attempt-pick'):
+            return self._attempt_pick(time.time() if now is None else now)
+
+    def _attempt_pick(self, now):
+        if self.state.has_finished():
+            if self.state.current_drafter_notified:
+                return None
+
+            event = self.record({'type': 'notified', 'notice': 'complete'})
+            self.snapshot()
+            return event
+
+        if not self.state.has_started:
+            return None
+
+        with metrics.time('draft.read'):
+            current_drafter_id = self.state.current_drafter_id()
+            want_list = self.users[current_drafter_id]['wanted-cards']
+
+        if len(want_list) == 0:
+            if not self.state.current_drafter_notified:
+                return self.record({'type': 'notified', 'notice': 'turn', 'user-id': current_drafter_id})
+
+            return self.run_clock(current_drafter_id, now)
+
+        card_to_draft = want_list[0]
+        assert card_to_draft not in self.taken_cards, 'Already taken card appears in want-list'
+
+        return self.pick(current_drafter_id, card_to_draft, now)
+
+    def run_clock(self, current_drafter_id, now):
+        expiry = self.clock_expiry()
+        if expiry is None:
+            return None
+
+        if now >= expiry:
+            card_to_draft = self.backup_pick(current_drafter_id)
+            if card_to_draft is None:
+                return None
+
+            return self.pick(current_drafter_id, card_to_draft, now, auto=True)
+
+        # only the latest reminder matters if several came due at once, e.g. after a restart
+        reminders = [i for (i, due) in self.due_reminders(expiry) if due <= now]
+        if reminders:
+            return self.record({'type': 'reminded', 'user-id': current_drafter_id, 'reminders-sent': reminders[-1] + 1})
+
+        return None
+
+    def undo(self, count=1):
+        """
+        Take back the last count picks and return them, newest first. The
+        cards go back into the pool; want lists are left alone, so a stale
+        want list doesn't make the same pick again.
+        """
+        if count < 1:
+            raise DraftError('Undo at least one pick.')
+
+        if count > self.get_pick_number():
+            raise DraftError(f'Only {self.get_pick_number()} picks have been made.')
+
+        return self.record({'type': 'undo', 'picks': self.last_picks(count), 'time': time.time()})['picks']
+
+    def redo(self, count=1):
+        """
+        Make the last count undone picks again and return their pick events.
+        Only possible until the next pick is made.
+        """
+        if count < 1:
+            raise DraftError('Redo at least one pick.')
+
+        if count > len(self.state.undone):
+            raise DraftError(f'Only {len(self.state.undone)} picks can be redone.')
+
+        events = []
+        for _ in range(count):
+            pick = self.state.undone[-1]
+            assert pick['pick-number'] == self.state.pick_number and pick['card-id'] not in self.taken_cards, 'Undone pick can no longer be redone'
+
+            events.append(self.pick(pick['user-id'], pick['card-id'], time.time(), redo=True))
+
+        return events
+
+    def pick(self, current_drafter_id, card_to_draft, now, auto=False, redo=False):
+        # time spent beyond the pick clock comes out of the drafter's bank
+        time_bank = self.get_user(current_drafter_id)['time-bank']
+        expiry = self.clock_expiry()
+        if expiry is not None:
+            time_bank = max(0, min(self.get_time_bank(current_drafter_id), expiry - now))
+
+        # everyone else who queued the card, found before the pick clears wanted_by
+        sniped_user_ids = sorted(self.wanted_by.get(card_to_draft, set()) - {current_drafter_id})
+
+        event = self.record({
+            'type': 'pick',
+            'pick-number': self.state.pick_number,
+            'user-id': current_drafter_id,
+            'card-id': card_to_draft,
+            'time': now,
+            'time-bank': time_bank,
+            'auto': auto,
+            'redo': redo
+        })
+
+        # added after recording, replaying the journal never notifies anyone
+        event['sniped-user-ids'] = sniped_user_ids
+
+        return event
+
+class DraftRegistry:
+    """
+    Every draft hosted by the bot, one sub-directory of directory per draft.
+
+    Drafts are only loaded once something needs them, and complete drafts are
+    unloaded again, so memory follows the number of active drafts. New drafts
+    are kept in storage, 'pickle' or 'sqlite'. on_unload(draft), if given, is
+    called with every draft that is unloaded, e.g. DraftActors.remove.
+    """
+
+    def __init__(self, directory, catalog, storage='pickle', on_unload=None):
+        self.directory = directory
+        self.catalog = catalog
+        self.storage = storage
+        self.on_unload = on_unload
+        self._drafts = {}
+
+        os.makedirs(directory, exist_ok=True)
+
+    def path(self, draft_id):
+        return os.path.join(self.directory, str(draft_id))
+
+    def get(self, draft_id, create=False):
+        draft_id = str(draft_id)
+
+        if draft_id not in self._drafts:
+            if not create and not os.path.isdir(self.path(draft_id)):
+                return None
+
+            self._drafts[draft_id] = Draft(draft_id, self.path(draft_id), self.catalog, storage=self.storage)
+
+        return self._drafts[draft_id]
+
+    def loaded(self):
+        return list(self._drafts.values())
+
+    def unload(self, draft_id):
+        draft = self._drafts.pop(str(draft_id), None)
+        if draft:
+            draft.close()
+
+            if self.on_unload:
+                self.on_unload(draft)
+
+    def load_active(self):
+        """
+        Load every draft that is not complete yet, e.g. after a restart.
+        """
+        for draft_id in os.listdir(self.directory):
+            if not os.path.isdir(self.path(draft_id)):
+                continue
+
+            # finished drafts pile up over a season, don't load them just to find that out
+            if is_complete(self.path(draft_id)):
+                continue
+
+            # one draft with a stale card list must not keep the others from running
+            try:
+                draft = self.get(draft_id)
+            except DraftError as e:
+                print(f'Not loading draft {draft_id}: {e}')
+                continue
+
+            if draft.get_is_complete():
+                self.unload(draft_id)
+
+    def drafts_for_user(self, user_id):
+        return [draft for draft in self._drafts.values() if draft.get_user(user_id)]
+
+def migrate_single_draft(directory, drafts):
+    """
+    Move a draft kept directly in directory, from before the bot hosted one
+    draft per channel, into the registry under its main channel.
+    """
+    draft_path = os.path.join(directory, 'draft.db')
+    if not os.path.exists(draft_path):
+        return
+
+    # drafts that never started have no channel yet
+    main_channel = PickleDB(draft_path).get('main-channel')
+    if main_channel is None:
+        print(f'Ignoring unstarted draft in {directory}, players need to !register again in the draft channel')
+        return
+
+    target = drafts.path(main_channel)
+    if os.path.exists(target):
+        print(f'Not moving draft in {directory}, {target} already exists')
+        return
+
+    os.makedirs(target)
+    for file_name in PICKLE_FILE_NAMES:
+        if os.path.exists(os.path.join(directory, file_name)):
+            os.replace(os.path.join(directory, file_name), os.path.join(target, file_name))
+
+    print(f'Moved draft in {directory} to {target}')
+
+def migrate_to_sqlite(directory, catalog):
+    """
+    Convert the draft in directory from PickleDB files to SQLite. The old
+    files are kept with a .migrated suffix. The bot must not be running.
+    """
+    if not os.path.exists(os.path.join(directory, 'draft.db')):
+        print(f'No PickleDB draft in {directory}')
+        return
+
+    # left behind by a migration that was interrupted before it finished
+    for file_name in [SQLITE_FILE_NAME, SQLITE_FILE_NAME + '-wal', SQLITE_FILE_NAME + '-shm']:
+        if os.path.exists(os.path.join(directory, file_name)):
+            os.remove(os.path.join(directory, file_name))
+
+    # loading replays the journal into the db files
+    draft = Draft(os.path.basename(os.path.normpath(directory)), directory, catalog)
+    draft.close()
+
+    storage = SqliteStorage(directory)
+    draft.dirty_users = set(draft.users)
+    draft.state.dirty = True
+    storage.import_draft(draft, draft.pick_history())
+    storage.close(draft)
+
+    # draft.db goes first, the draft counts as sqlite as soon as it is gone
+    for file_name in ['draft.db', 'users.db', 'draft.journal']:
+        if os.path.exists(os.path.join(directory, file_name)):
+            os.replace(os.path.join(directory, file_name), os.path.join(directory, file_name + '.migrated'))
+
+    print(f'Migrated draft in {directory} to SQLite ({draft.get_player_count()} players, {draft.get_pick_number()} picks)')
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2:
+        print('Usage: python -m rotisserie.draft drafts/<channel id> [drafts/<channel id> ...]')
+        print('Converts drafts from PickleDB files to SQLite, stop the bot first')
+        sys.exit(1)
+
+    catalog = open_catalog('card-list.txt', 'cards.catalog')
+    for directory in sys.argv[1:]:
+        migrate_to_sqlite(directory, catalog)
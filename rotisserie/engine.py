@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import traceback
+
+# fallback wake-up for the pick engine in case a signal is ever missed
+KEEPALIVE_SECONDS = 300
+
+class PickEngine:
+    """
+    Makes picks for every draft in a DraftRegistry.
+
+    The engine sleeps until a draft is signalled, then cascades through every
+    pick that draft can make from want lists. Signalled drafts take turns one
+    pick at a time, so one long cascade can't hold up the others. Picks go
+    through each draft's DraftActor like every other change, and so does
+    closing a complete draft before it is unloaded.
+
+    on_event(draft, event) is called with each event returned by
+    Draft.attempt_pick so the caller can announce it, and on_idle(), if
+    given, once a cascade has run its course.
+    """
+
+    def __init__(self, drafts, actors, on_event, on_idle=None, keepalive_seconds=KEEPALIVE_SECONDS):
+        self.drafts = drafts
+        self.actors = actors
+        self.on_event = on_event
+        self.on_idle = on_idle
+        self.keepalive_seconds = keepalive_seconds
+
+        self._ready = {}
+        # bumped on every signal, so a signal that arrives while a pick is
+        # being attempted isn't lost when the draft is taken off _ready
+        self._signals = {}
+        self._wakeup = asyncio.Event()
+
+    def signal(self, draft):
+        self._ready[draft.draft_id] = draft
+        self._signals[draft.draft_id] = self._signals.get(draft.draft_id, 0) + 1
+        self._wakeup.set()
+
+    def signal_all(self):
+        for draft in self.drafts.loaded():
+            self.signal(draft)
+
+    async def step(self):
+        """
+        Give every signalled draft one attempt at a pick. Return True while
+        some draft might still be able to make another one. A draft whose
+        attempt raises is logged and left alone until its next signal.
+        """
+        for draft in list(self._ready.values()):
+            signals = self._signals.get(draft.draft_id)
+
+            try:
+                event = await self.actors.submit(draft, 'attempt_pick')
+
+                if event is not None:
+                    self.on_event(draft, event)
+            except Exception as e:
+                # one broken draft must not stop the picks of all the others
+                print(f'Pick attempt in draft {draft.draft_id} failed: {e!r}')
+                traceback.print_exc()
+                del self._ready[draft.draft_id]
+                continue
+
+            # only a pick can make the next pick possible, unless the draft was signalled again meanwhile
+            if (event is None or event['type'] != 'pick') and self._signals.get(draft.draft_id) == signals:
+                del self._ready[draft.draft_id]
+
+                if draft.get_is_complete():
+                    # closed by its actor like any other change, after the commands already queued for it
+                    await self.actors.submit(draft, 'close')
+                    self.drafts.unload(draft.draft_id)
+                    del self._signals[draft.draft_id]
+
+                    # signalled while it was closing, but the draft is gone
+                    if self._ready.get(draft.draft_id) is draft:
+                        del self._ready[draft.draft_id]
+
+        return len(self._ready) > 0
+
+    async def run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.keepalive_seconds)
+            except asyncio.TimeoutError:
+                self.signal_all()
+
+            self._wakeup.clear()
+
+            # every pick awaits its actor, which lets commands and outgoing messages in between
+            while await self.step():
+                pass
+
+            if self.on_idle:
+                self.on_idle()
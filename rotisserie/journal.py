@@ -0,0 +1,95 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+
+def fsync_path(path):
+    """
+    Flush a file that was written by someone else (e.g. a PickleDB save)
+    all the way to disk.
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+class Journal:
+    """
+    Append-only log of draft events, one JSON object per line.
+
+    Every append is fsync'd before it returns, so an event that has been
+    appended survives the process dying. Each event is stamped with a
+    sequence number that keeps increasing across truncations, which lets a
+    snapshot record exactly which events it already contains.
+    """
+
+    def __init__(self, path, seq=0):
+        self.path = path
+        self.seq = seq
+        self._loaded = self._load()
+        self._length = len(self._loaded)
+        self._file = open(self.path, 'ab')
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return []
+
+        events = []
+        valid_length = 0
+        with open(self.path, 'rb') as f:
+            for line in f:
+                # a torn final line means we died mid-append, the event never happened
+                try:
+                    event = json.loads(line)
+                except ValueError:
+                    break
+                if not line.endswith(b'\n'):
+                    break
+
+                events.append(event)
+                valid_length += len(line)
+
+        if valid_length != os.path.getsize(self.path):
+            with open(self.path, 'r+b') as f:
+                f.truncate(valid_length)
+
+        if events:
+            self.seq = max(self.seq, events[-1]['seq'])
+
+        return events
+
+    def replay(self, after_seq):
+        """
+        Return the events loaded from disk that are newer than after_seq.
+        """
+        events = [event for event in self._loaded if event['seq'] > after_seq]
+        self._loaded = []
+        return events
+
+    # number of events written since the last truncate
+    def __len__(self):
+        return self._length
+
+    def append(self, event):
+        self.seq += 1
+        event['seq'] = self.seq
+
+        self._file.write(json.dumps(event).encode('utf-8') + b'\n')
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+        self._length += 1
+        return self.seq
+
+    def truncate(self):
+        """
+        Drop every event, once a snapshot containing them is safely on disk.
+        """
+        self._file.truncate(0)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._length = 0
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,181 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import os
+import time
+
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# upper bounds in seconds, from a fast in-memory pick up to a stalled api call
+BUCKET_BOUNDS = [0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+
+class LatencyHistogram:
+    """
+    Counts durations into BUCKET_BOUNDS, plus one bucket for anything slower.
+    """
+
+    def __init__(self):
+        self.counts = [0] * (len(BUCKET_BOUNDS) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, seconds):
+        self.counts[bisect_left(BUCKET_BOUNDS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, fraction):
+        """
+        Upper bound of the bucket holding the given quantile, or the slowest
+        duration seen if that is lower.
+        """
+        if self.count == 0:
+            return 0.0
+
+        rank = fraction * self.count
+        seen = 0
+        for (bound, count) in zip(BUCKET_BOUNDS, self.counts):
+            seen += count
+            if seen >= rank:
+                return min(bound, self.max)
+
+        return self.max
+
+class Metrics:
+    """
+    Latency histograms by name, e.g. 'command.draft' or 'draft.journal'.
+
+    Everything runs on the bot's event loop or is timed around a single call,
+    so there is no locking.
+    """
+
+    def __init__(self):
+        self.histograms = {}
+        self.started = time.time()
+
+    def observe(self, name, seconds):
+        if name not in self.histograms:
+            self.histograms[name] = LatencyHistogram()
+
+        self.histograms[name].observe(seconds)
+
+    @contextmanager
+    def time(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def summary(self):
+        """
+        Human readable table of every histogram, for the !metrics command.
+        """
+        if not self.histograms:
+            return 'Nothing measured yet'
+
+        lines = [f'{"name":<24} {"count":>7} {"mean ms":>9} {"p50 ms":>9} {"p99 ms":>9} {"max ms":>9}']
+        for name in sorted(self.histograms):
+            histogram = self.histograms[name]
+            lines.append(f'{name:<24} {histogram.count:>7} {1000*histogram.total/histogram.count:>9.2f} {1000*histogram.quantile(0.5):>9.2f} {1000*histogram.quantile(0.99):>9.2f} {1000*histogram.max:>9.2f}')
+
+        return '\n'.join(lines)
+
+    def prometheus_text(self):
+        """
+        Every histogram in the prometheus text exposition format, as a single
+        metric labelled by name.
+        """
+        lines = [
+            '# HELP rotisserie_latency_seconds Time taken by draft bot commands, pick stages and sends.',
+            '# TYPE rotisserie_latency_seconds histogram'
+        ]
+
+        for name in sorted(self.histograms):
+            histogram = self.histograms[name]
+            cumulative = 0
+            for (bound, count) in zip(BUCKET_BOUNDS + ['+Inf'], histogram.counts):
+                cumulative += count
+                lines.append(f'rotisserie_latency_seconds_bucket{{name="{name}",le="{bound}"}} {cumulative}')
+            lines.append(f'rotisserie_latency_seconds_sum{{name="{name}"}} {histogram.total}')
+            lines.append(f'rotisserie_latency_seconds_count{{name="{name}"}} {histogram.count}')
+
+        lines.append('# HELP rotisserie_start_time_seconds Unix time the bot started.')
+        lines.append('# TYPE rotisserie_start_time_seconds gauge')
+        lines.append(f'rotisserie_start_time_seconds {self.started}')
+
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        # written aside and swapped in, so a scraper never reads half a file
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(self.prometheus_text())
+        os.replace(tmp_path, path)
+
+    async def export_file(self, path, interval_seconds=15):
+        """
+        Rewrite path every interval_seconds, e.g. for node_exporter's textfile collector.
+        """
+        while True:
+            try:
+                self.write_prometheus(path)
+            except OSError as e:
+                print(f'Failed to write metrics to {path}: {e}')
+
+            await asyncio.sleep(interval_seconds)
+
+    async def serve(self, port, host='127.0.0.1'):
+        """
+        Answer every http request on port with prometheus_text().
+        """
+        async def handle(reader, writer):
+            try:
+                # the request itself does not matter, there is only one page
+                await reader.readuntil(b'\r\n\r\n')
+
+                body = self.prometheus_text().encode('utf-8')
+                writer.write(b'HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\nContent-Length: ' + str(len(body)).encode('ascii') + b'\r\n\r\n' + body)
+                await writer.drain()
+            except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+                pass
+            finally:
+                writer.close()
+
+        server = await asyncio.start_server(handle, host, port)
+        async with server:
+            await server.serve_forever()
+
+class StartupProfile:
+    """
+    Wall clock time of each step of starting the bot, in order, for
+    python bot.py --profile-startup.
+    """
+
+    def __init__(self):
+        self.steps = []
+        self.started = time.perf_counter()
+
+    @contextmanager
+    def step(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - start))
+
+    def report(self):
+        total = time.perf_counter() - self.started
+
+        lines = [f'{"step":<28} {"ms":>9} {"share":>6}']
+        for (name, seconds) in self.steps:
+            lines.append(f'{name:<28} {1000*seconds:>9.1f} {seconds/total:>6.0%}')
+        lines.append(f'{"total":<28} {1000*total:>9.1f}')
+
+        return '\n'.join(lines)
+
+# shared by everything in the process that is worth timing
+metrics = Metrics()
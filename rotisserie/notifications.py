@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+
+class SnipeNotifier:
+    """
+    Tells players when a card on their want list is drafted by someone else.
+
+    Snipes are collected with add() while the pick engine cascades, and
+    flush() then posts a single direct message per affected player to the
+    outbox, however many of their cards went in the cascade.
+    """
+
+    def __init__(self, outbox, catalog):
+        self.outbox = outbox
+        self.catalog = catalog
+
+        # discord id -> lines of their next message
+        self._pending = {}
+
+    def add(self, draft, event):
+        if event['type'] != 'pick':
+            return
+
+        drafter = draft.get_user(event['user-id'])
+        line = f"{drafter['team-name']} drafted {self.catalog.name(event['card-id'])}"
+
+        for user_id in event['sniped-user-ids']:
+            discord_id = draft.get_user(user_id)['discord-id']
+            self._pending.setdefault(discord_id, []).append(line)
+
+    def flush(self):
+        for discord_id, lines in self._pending.items():
+            self.outbox.post(('user', discord_id), 'Sniped! Cards on your draft list were taken:\n' + '\n'.join(lines))
+
+        self._pending = {}
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+
+from collections import deque
+from .metrics import metrics
+
+# discord rejects messages longer than this
+MESSAGE_MAX_LENGTH = 2000
+
+# errors that will fail the same way however often they are retried, e.g. a
+# player who does not accept direct messages
+PERMANENT_ERROR_STATUSES = [400, 401, 403, 404]
+
+def split_message(text, max_length=MESSAGE_MAX_LENGTH):
+    """
+    Split text into messages no longer than max_length, between lines where possible.
+    """
+    ret = []
+    current = ''
+    for line in text.split('\n'):
+        while len(line) > max_length:
+            if current:
+                ret.append(current)
+                current = ''
+            ret.append(line[:max_length])
+            line = line[max_length:]
+
+        if not current:
+            current = line
+        elif len(current) + 1 + len(line) <= max_length:
+            current += '\n' + line
+        else:
+            ret.append(current)
+            current = line
+
+    if current or not ret:
+        ret.append(current)
+
+    return ret
+
+class TokenBucket:
+    """
+    Allows rate operations every per seconds, starting full so an idle
+    sender can burst.
+    """
+
+    def __init__(self, rate, per):
+        self.rate = rate
+        self.per = per
+        self._tokens = rate
+        self._last_refill = time.monotonic()
+
+    async def take(self):
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._last_refill) * self.rate / self.per)
+            self._last_refill = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self._tokens) * self.per / self.rate)
+
+    def pause(self, seconds):
+        """
+        Allow nothing for the next seconds, then one operation right away and
+        the rest at the usual rate.
+        """
+        # tokens owed, take() refills them before anything goes through
+        self._tokens = min(self._tokens, 1 - seconds * self.rate / self.per)
+
+def rate_limit(e):
+    """
+    Return (seconds to wait, whether the limit is global) if e is a rate
+    limit error, or (None, False). discord.py's RateLimited carries
+    retry_after, an HTTPException with status 429 has discord's headers.
+    """
+    retry_after = getattr(e, 'retry_after', None)
+    headers = getattr(getattr(e, 'response', None), 'headers', None) or {}
+
+    if retry_after is None and getattr(e, 'status', None) == 429:
+        retry_after = headers.get('Retry-After') or headers.get('X-RateLimit-Reset-After')
+
+    if retry_after is None:
+        return (None, False)
+
+    return (float(retry_after), str(headers.get('X-RateLimit-Global', '')).lower() == 'true')
+
+class Outbox:
+    """
+    Sends messages from background tasks, one ordered queue per destination.
+
+    Every destination has its own rate limit bucket, mirroring discord's
+    per-channel limits, and all sends share a global bucket. The buckets are
+    a static guess at discord's limits, which discord can change per route
+    and doesn't announce until a send is rejected; when one is, with a 429
+    or discord.py's RateLimited, the destination's bucket is paused for the
+    retry-after discord asks for, or the global bucket if the limit is
+    global, so every queued message waits instead of running into it too.
+    Messages posted with merge=True (pick announcements) wait merge_seconds
+    for others like them, and consecutive ones are sent as a single message
+    when they fit. Other failed sends are retried with exponential backoff,
+    unless the error is permanent.
+
+    send(destination, text) is the coroutine that actually delivers a message;
+    destinations are opaque to the outbox.
+    """
+
+    def __init__(self, send, rate=5, per=5.0, global_rate=50, global_per=1.0, merge_seconds=0.5, max_attempts=5, backoff_seconds=1.0, max_backoff_seconds=60.0):
+        self.send = send
+        self.rate = rate
+        self.per = per
+        self.merge_seconds = merge_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+        self._global_bucket = TokenBucket(global_rate, global_per)
+        self._buckets = {}
+
+        # destination -> deque of (text, merge) waiting to be sent
+        self._queues = {}
+        # destination -> task delivering its queue
+        self._workers = {}
+        # destinations that received a message while they had no worker
+        self._ready = asyncio.Queue()
+
+    def post(self, destination, text, merge=False):
+        if destination not in self._queues:
+            self._queues[destination] = deque()
+            self._ready.put_nowait(destination)
+
+        self._queues[destination].append((text, merge))
+
+    def pending(self):
+        return sum(map(len, self._queues.values()))
+
+    async def _send(self, destination, text):
+        bucket = self._buckets.setdefault(destination, TokenBucket(self.rate, self.per))
+        backoff = self.backoff_seconds
+
+        for attempt in range(1, self.max_attempts + 1):
+            await self._global_bucket.take()
+            await bucket.take()
+
+            try:
+                with metrics.time('outbox.send'):
+                    await self.send(destination, text)
+                return
+            except Exception as e:
+                if getattr(e, 'status', None) in PERMANENT_ERROR_STATUSES:
+                    print(f'Dropping message to {destination}: {e}')
+                    return
+
+                print(f'Failed to send message to {destination} (attempt {attempt}/{self.max_attempts}): {e}')
+                (retry_after, is_global) = rate_limit(e)
+
+            if attempt < self.max_attempts:
+                if retry_after is not None:
+                    # the next take() waits it out, along with everyone else sharing the bucket
+                    (self._global_bucket if is_global else bucket).pause(retry_after)
+                else:
+                    await asyncio.sleep(backoff)
+                    backoff = min(backoff * 2, self.max_backoff_seconds)
+
+        print(f'Giving up on message to {destination}')
+
+    async def _deliver(self, destination):
+        queue = self._queues[destination]
+
+        while queue:
+            (text, merge) = queue.popleft()
+
+            if merge:
+                # give the rest of a pick cascade a chance to join this message
+                await asyncio.sleep(self.merge_seconds)
+
+                while queue and queue[0][1] and len(text) + 2 + len(queue[0][0]) <= MESSAGE_MAX_LENGTH:
+                    text += '\n\n' + queue.popleft()[0]
+
+            for message in split_message(text):
+                await self._send(destination, message)
+
+        del self._queues[destination]
+        del self._workers[destination]
+
+    async def run(self):
+        while True:
+            destination = await self._ready.get()
+
+            if destination in self._queues and destination not in self._workers:
+                self._workers[destination] = asyncio.create_task(self._deliver(destination))
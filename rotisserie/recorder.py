@@ -0,0 +1,42 @@
+# -*- coding: utf-8 -*-
+
+import json
+import time
+
+class CommandRecorder:
+    """
+    Logs incoming commands for python -m rotisserie.replay, one JSON object
+    per line with short keys to keep the log small:
+
+        t  unix time the message arrived
+        a  author id, n author name, d author discriminator
+        c  channel id, g guild id or null for direct messages
+        p  the author's permissions in the channel, as discord's integer
+        m  message content
+
+    Attachments are not recorded, a replayed !draft_list only sees the
+    message text. pairings/bot.py records with it too.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, 'a', encoding='utf-8')
+
+    def record(self, message):
+        entry = {
+            't': round(time.time(), 3),
+            'a': message.author.id,
+            'n': message.author.name,
+            'd': message.author.discriminator,
+            'c': message.channel.id,
+            'g': message.guild.id if message.guild else None,
+            'p': message.channel.permissions_for(message.author).value,
+            'm': message.content
+        }
+
+        # flushed right away, the log is most useful when the bot dies
+        self._file.write(json.dumps(entry, ensure_ascii=False, separators=(',', ':')) + '\n')
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
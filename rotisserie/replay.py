@@ -0,0 +1,335 @@
+# -*- coding: utf-8 -*-
+
+"""
+Replays commands logged with RECORD_COMMANDS against a bot, without discord.
+
+The bot script is imported in a scratch directory, optionally seeded with a
+copy of the state it had when recording started, its on_ready handler runs
+as if it had connected, and every recorded message is invoked at its
+recorded time relative to the first, sped up by --speed, or as fast as
+possible with --speed max. Discord is replaced by fakes that only collect
+what the bot sends, and Google Sheets by FakeSheetBackend.
+
+    python -m rotisserie.replay commands.log
+    python -m rotisserie.replay commands.log --state backup/ --speed 10 --expect drafts-after/
+    python -m rotisserie.replay commands.log --bot pairings/bot.py --state pairings-backup/
+
+Reports the latency of every command from the moment it was due until its
+last reply, and the final state: every draft and pickleDB file in the
+scratch directory. --save-state writes that as JSON, --expect compares it to
+such a file or to a directory in the same layout, e.g. a copy of the live
+bot's directory taken when the recording stopped. Background timers such as
+pick clocks run in real time whatever the speed, and random choices like
+the pick order come from --seed rather than what happened live.
+"""
+
+import argparse
+import asyncio
+import discord
+import importlib.util
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+from discord.ext import commands
+from discord.ext.commands.view import StringView
+from pickledb import PickleDB
+from .bench import percentile
+from .catalog import open_catalog
+from .draft import Draft
+from .sheets import FakeSheetBackend
+from .storage import SQLITE_FILE_NAME
+
+# the replayed bot must not record, export metrics or serve them while it runs
+DISABLED_SETTINGS = ['RECORD_COMMANDS', 'METRICS_FILE', 'METRICS_PORT']
+
+class FakeTarget:
+    """
+    A user or channel, collecting what is sent to it.
+    """
+
+    def __init__(self, target_id, sent, name='', discriminator='0', permissions=0, channel_type=discord.ChannelType.text):
+        self.id = target_id
+        self.type = channel_type
+        self.name = name
+        self.discriminator = discriminator
+        self.bot = False
+        self.mention = f'<@{target_id}>'
+        self._sent = sent
+        self._permissions = permissions
+
+    async def send(self, content=None, **kwargs):
+        self._sent.append((self.id, content))
+
+    def permissions_for(self, member):
+        return discord.Permissions(self._permissions)
+
+class FakeGuild:
+    def __init__(self, guild_id):
+        self.id = guild_id
+
+class FakeMessage:
+    def __init__(self, entry, sent):
+        self.id = 0
+        self.content = entry['m']
+        self.author = FakeTarget(entry['a'], sent, entry['n'], entry['d'])
+        self.channel = FakeTarget(entry['c'], sent, permissions=entry['p'], channel_type=discord.ChannelType.text if entry['g'] is not None else discord.ChannelType.private)
+        self.guild = FakeGuild(entry['g']) if entry['g'] is not None else None
+        self.attachments = []
+        self._state = None
+
+class ReplayContext(commands.Context):
+    """
+    Context whose replies are collected instead of sent.
+    """
+
+    async def send(self, content=None, **kwargs):
+        self.replies.append(content)
+
+def load_session(path):
+    with open(path, 'r', encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def load_bot(bot_path, directory):
+    """
+    Import the bot script with directory as its working directory, where it
+    finds and keeps its state.
+    """
+    for setting in DISABLED_SETTINGS:
+        os.environ[setting] = ''
+
+    os.chdir(directory)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(bot_path)))
+
+    spec = importlib.util.spec_from_file_location('replayed_bot', bot_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+
+    return module
+
+async def invoke(bot, entry, due, sent, results):
+    message = FakeMessage(entry, sent)
+
+    view = StringView(message.content)
+    if not view.skip_string(bot.command_prefix):
+        return
+
+    invoked_with = view.get_word()
+    command = bot.all_commands.get(invoked_with)
+    if command is None:
+        results.append((None, None, []))
+        return
+
+    ctx = ReplayContext(prefix=bot.command_prefix, view=view, bot=bot, message=message)
+    ctx.invoked_with = invoked_with
+    ctx.command = command
+    ctx.replies = []
+
+    await bot.invoke(ctx)
+
+    results.append((command.name, time.perf_counter() - due, ctx.replies))
+
+async def replay(module, entries, speed, settle_seconds):
+    """
+    Run entries against the imported bot module, return the results of the
+    commands as (command name or None if unknown, seconds, replies), the
+    errors raised by commands and everything the bot sent.
+    """
+    bot = module.bot
+    sent = []
+    results = []
+    errors = []
+
+    # what logging in would have set up, events are dispatched on this loop
+    bot.loop = asyncio.get_running_loop()
+
+    # is_owner() would ask discord who the owner is, nobody is
+    bot.owner_ids = {0}
+    bot.get_user = lambda user_id:FakeTarget(user_id, sent)
+    bot.get_channel = lambda channel_id:FakeTarget(channel_id, sent)
+
+    @bot.listen('on_command_error')
+    async def collect_error(ctx, error):
+        errors.append(f'{ctx.command}: {type(error).__name__}: {error}')
+
+    if hasattr(module, 'sheet_publisher'):
+        module.sheet_publisher.backend = FakeSheetBackend()
+
+    if hasattr(bot, 'on_ready'):
+        await bot.on_ready()
+
+    start = time.perf_counter()
+    tasks = []
+    for entry in entries:
+        due = start
+        if speed is not None:
+            due += (entry['t'] - entries[0]['t']) / speed
+            await asyncio.sleep(max(0, due - time.perf_counter()))
+
+        # commands overlap just like they did live
+        tasks.append(asyncio.create_task(invoke(bot, entry, due, sent, results)))
+
+    await asyncio.gather(*tasks)
+    seconds = time.perf_counter() - start
+
+    # picks, announcements and sheet writes caused by the last commands
+    await asyncio.sleep(settle_seconds)
+
+    return (results, errors, sent, seconds)
+
+def draft_summary(draft, catalog):
+    card_names = lambda card_ids:list(map(catalog.name, card_ids))
+
+    return {
+        'has-started': draft.state.has_started,
+        'pick-number': draft.state.pick_number,
+        'pick-order': draft.state.pick_order,
+        'users': {user_id: {
+            'team-name': user['team-name'],
+            'drafted-cards': card_names(user['drafted-cards']),
+            'wanted-cards': card_names(user['wanted-cards']),
+            'backup-cards': card_names(user.get('backup-cards', []))
+        } for (user_id, user) in draft.users.items()}
+    }
+
+def dump_state(directory, catalog):
+    """
+    Every draft and pickleDB file below directory by relative path, with card
+    names rather than ids. Reads a copy, loading a draft may write to it.
+    """
+    state = {}
+
+    with tempfile.TemporaryDirectory() as copy:
+        shutil.copytree(directory, copy, dirs_exist_ok=True)
+
+        for (root, dirs, files) in os.walk(copy):
+            path = os.path.relpath(root, copy)
+
+            if 'draft.db' in files or SQLITE_FILE_NAME in files:
+                draft = Draft(path, root, catalog)
+                state[path] = draft_summary(draft, catalog)
+                draft.close()
+                continue
+
+            for file_name in sorted(files):
+                if file_name.endswith('.db'):
+                    db = PickleDB(os.path.join(root, file_name))
+                    state[os.path.normpath(os.path.join(path, file_name))] = {key: db.get(key) for key in db.all()}
+
+    return state
+
+def diff_states(expected, actual, path=''):
+    """
+    Lines describing every difference, e.g. drafts/1/pick-number: expected 4, got 5
+    """
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        lines = []
+        for key in sorted(set(expected) | set(actual), key=str):
+            key_path = f'{path}/{key}' if path else str(key)
+            if key not in actual:
+                lines.append(f'{key_path}: missing')
+            elif key not in expected:
+                lines.append(f'{key_path}: unexpected {actual[key]!r}')
+            else:
+                lines.extend(diff_states(expected[key], actual[key], key_path))
+        return lines
+
+    if expected != actual:
+        return [f'{path}: expected {expected!r}, got {actual!r}']
+
+    return []
+
+def report(results, errors, sent, seconds, pending):
+    latencies = sorted(seconds for (name, seconds, _) in results if name is not None)
+    replies = [reply for (_, _, command_replies) in results for reply in command_replies]
+
+    print(f'Replayed {len(latencies)} commands in {seconds:.2f}s, {len(latencies) / max(seconds, 1e-9):.0f} per second')
+    print(f'{len(results) - len(latencies)} unknown commands, {len(errors)} command errors, {sum(1 for reply in replies if str(reply).startswith("ERROR"))} ERROR replies')
+    print(f'{len(sent)} messages sent by the bot' + (f', {pending} still queued' if pending else ''))
+
+    for error in errors:
+        print(f'  {error}')
+
+    print()
+    print(f'{"command":<16} {"count":>6} {"p50 ms":>9} {"p90 ms":>9} {"p99 ms":>9} {"max ms":>9}')
+    for name in sorted({name for (name, _, _) in results if name is not None}):
+        command_latencies = sorted(seconds for (result_name, seconds, _) in results if result_name == name)
+        print(f'{name:<16} {len(command_latencies):>6} {1000*percentile(command_latencies, 0.5):>9.2f} {1000*percentile(command_latencies, 0.9):>9.2f} {1000*percentile(command_latencies, 0.99):>9.2f} {1000*command_latencies[-1]:>9.2f}')
+    print(f'{"all":<16} {len(latencies):>6} {1000*percentile(latencies, 0.5):>9.2f} {1000*percentile(latencies, 0.9):>9.2f} {1000*percentile(latencies, 0.99):>9.2f} {1000*(latencies[-1] if latencies else 0):>9.2f}')
+
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded commands against a bot without discord.')
+    parser.add_argument('log', help='Commands recorded with RECORD_COMMANDS')
+    parser.add_argument('--bot', default='bot.py', help='Bot script to replay against')
+    parser.add_argument('--state', help='Directory to start from, e.g. a backup of the bot\'s directory from when recording started')
+    parser.add_argument('--speed', default='1', help='1 for the recorded pace, N for N times faster, max for no waiting')
+    parser.add_argument('--settle', type=float, default=2, help='Seconds to let background work finish after the last command')
+    parser.add_argument('--storage', help='DRAFT_STORAGE for new drafts, instead of the one in .env')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the bot\'s random choices, e.g. the pick order, so replays can be compared')
+    parser.add_argument('--save-state', help='Write the final state to this JSON file')
+    parser.add_argument('--expect', help='JSON file from --save-state or a directory to compare the final state with')
+    args = parser.parse_args()
+
+    speed = None if args.speed == 'max' else float(args.speed)
+    bot_path = os.path.abspath(args.bot)
+    entries = load_session(args.log)
+
+    if args.storage:
+        os.environ['DRAFT_STORAGE'] = args.storage
+
+    # card names for the state dump, from the bot's card list
+    card_list_path = os.path.join(os.path.dirname(bot_path), 'card-list.txt')
+
+    with tempfile.TemporaryDirectory() as directory:
+        if args.state:
+            shutil.copytree(args.state, directory, dirs_exist_ok=True)
+
+        if os.path.exists(card_list_path) and not os.path.exists(os.path.join(directory, 'card-list.txt')):
+            shutil.copy(card_list_path, directory)
+
+        expect_path = os.path.abspath(args.expect) if args.expect else None
+        save_path = os.path.abspath(args.save_state) if args.save_state else None
+
+        random.seed(args.seed)
+        module = load_bot(bot_path, directory)
+        (results, errors, sent, seconds) = asyncio.run(replay(module, entries, speed, args.settle))
+
+        pending = module.outbox.pending() if hasattr(module, 'outbox') else 0
+        report(results, errors, sent, seconds, pending)
+
+        if hasattr(module, 'drafts'):
+            for draft in module.drafts.loaded():
+                draft.close()
+
+        catalog = open_catalog('card-list.txt', 'cards.catalog') if os.path.exists('card-list.txt') else None
+        state = dump_state(directory, catalog)
+
+        if save_path:
+            with open(save_path, 'w') as f:
+                json.dump(state, f, indent=1, sort_keys=True)
+            print(f'\nFinal state written to {save_path}')
+
+        if expect_path:
+            if os.path.isdir(expect_path):
+                expected = dump_state(expect_path, catalog)
+            else:
+                with open(expect_path, 'r') as f:
+                    expected = json.load(f)
+
+            # through json, so both sides have string keys and lists
+            differences = diff_states(expected, json.loads(json.dumps(state)))
+
+            print()
+            print(f'{len(differences)} differences from {args.expect}' if differences else f'Final state matches {args.expect}')
+            for line in differences:
+                print(f'  {line}')
+
+        # leave the directory before it is removed
+        os.chdir(os.path.dirname(bot_path))
+
+if __name__ == '__main__':
+    main()
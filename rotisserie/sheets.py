@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+
+from .metrics import metrics
+
+def cell_name(row, col):
+    """
+    Convert 1-based row and column numbers to A1 notation, e.g. (4, 3) -> C4.
+    """
+    letters = ''
+    while col > 0:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return f'{letters}{row}'
+
+class GspreadBackend:
+    """
+    Writes to Google Sheets through one service account client, which is
+    only authorized once no matter how many writes go through it.
+    """
+
+    def __init__(self, credentials_file):
+        self._credentials_file = credentials_file
+        self._client = None
+        self._spreadsheets = {}
+
+    def _spreadsheet(self, sheet_id):
+        if self._client is None:
+            # gspread and the google auth stack are slow to import, and not needed without a sheet
+            import gspread
+
+            self._client = gspread.service_account(filename=self._credentials_file)
+
+        if sheet_id not in self._spreadsheets:
+            self._spreadsheets[sheet_id] = self._client.open_by_key(sheet_id)
+
+        return self._spreadsheets[sheet_id]
+
+    def batch_update(self, sheet_id, data):
+        self._spreadsheet(sheet_id).values_batch_update({'valueInputOption': 'RAW', 'data': data})
+
+class FakeSheetBackend:
+    """
+    Keeps written values in memory so the publisher can be exercised offline.
+
+    Set fail_count to make that many upcoming batch_update calls raise.
+    """
+
+    def __init__(self):
+        self.cells = {}
+        self.calls = []
+        self.fail_count = 0
+
+    def batch_update(self, sheet_id, data):
+        if self.fail_count > 0:
+            self.fail_count -= 1
+            raise ConnectionError('Simulated Google Sheets API failure')
+
+        self.calls.append((sheet_id, data))
+        for update in data:
+            self.cells.setdefault(sheet_id, {})[update['range']] = update['values']
+
+class SheetPublisher:
+    """
+    Publishes cell writes from a background task so callers never wait on
+    the Google Sheets API.
+
+    Writes queued during a flush window are coalesced into a single
+    batch_update per spreadsheet, with a later write to a range replacing an
+    earlier one. Failed batches are retried with exponential backoff and are
+    only dropped after max_attempts failures in a row.
+    """
+
+    def __init__(self, backend, flush_seconds=1.0, max_attempts=8, backoff_seconds=1.0, max_backoff_seconds=60.0):
+        self.backend = backend
+        self.flush_seconds = flush_seconds
+        self.max_attempts = max_attempts
+        self.backoff_seconds = backoff_seconds
+        self.max_backoff_seconds = max_backoff_seconds
+
+        self._queue = asyncio.Queue()
+        # sheet_id -> range -> values, in the order ranges were first written
+        self._pending = {}
+
+    def update(self, sheet_id, worksheet, range_string, values):
+        self._queue.put_nowait((sheet_id, f"'{worksheet}'!{range_string}", values))
+
+    def update_cell(self, sheet_id, worksheet, row, col, value):
+        self.update(sheet_id, worksheet, cell_name(row, col), [[value]])
+
+    def _drain_queue(self):
+        while not self._queue.empty():
+            (sheet_id, range_string, values) = self._queue.get_nowait()
+            self._pending.setdefault(sheet_id, {})[range_string] = values
+            self._queue.task_done()
+
+    async def _publish(self, sheet_id, updates):
+        data = [{'range': range_string, 'values': values} for (range_string, values) in updates.items()]
+        backoff = self.backoff_seconds
+
+        for attempt in range(1, self.max_attempts + 1):
+            try:
+                with metrics.time('sheet.update'):
+                    await asyncio.to_thread(self.backend.batch_update, sheet_id, data)
+                return
+            except Exception as e:
+                print(f'Google Sheets update failed (attempt {attempt}/{self.max_attempts}): {e}')
+
+            if attempt < self.max_attempts:
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, self.max_backoff_seconds)
+
+        print(f'Giving up on {len(data)} Google Sheets updates for {sheet_id}')
+
+    async def flush(self):
+        self._drain_queue()
+
+        while self._pending:
+            (sheet_id, updates) = self._pending.popitem()
+            await self._publish(sheet_id, updates)
+
+            # anything written while we were publishing or backing off
+            self._drain_queue()
+
+    async def run(self):
+        while True:
+            (sheet_id, range_string, values) = await self._queue.get()
+            self._pending.setdefault(sheet_id, {})[range_string] = values
+            self._queue.task_done()
+
+            # give closely spaced writes (e.g. a pick cascade) a chance to join the batch
+            await asyncio.sleep(self.flush_seconds)
+            await self.flush()
@@ -0,0 +1,132 @@
+# -*- coding: utf-8 -*-
+
+class DraftState:
+    """
+    Everything about a draft apart from its users, held in memory while the
+    draft is loaded.
+
+    This is the source of truth at runtime; draft.db is only written from it
+    by save(), and only when something changed. The snake pick order is
+    precomputed when the pick order is set, so snake_order[pick_number] is
+    the index into pick_order of whoever makes that pick.
+    """
+
+    __slots__ = [
+        'number_of_rounds',
+        'has_started',
+        'time_began',
+        'main_channel',
+        'google_sheet_id',
+        'pick_order',
+        'snake_order',
+        'pick_number',
+        'current_drafter_notified',
+        'pick_seconds',
+        'bank_seconds',
+        'turn_started',
+        'reminders_sent',
+        'undone',
+        'catalog_size',
+        'catalog_digest',
+        'journal_seq',
+        'dirty'
+    ]
+
+    # draft.db key -> attribute, pick-order is handled by set_pick_order
+    DB_KEYS = {
+        'number-of-rounds': 'number_of_rounds',
+        'has-started': 'has_started',
+        'time-began': 'time_began',
+        'main-channel': 'main_channel',
+        'google-sheet-id': 'google_sheet_id',
+        'pick-number': 'pick_number',
+        'current-drafter-notified': 'current_drafter_notified',
+        'pick-seconds': 'pick_seconds',
+        'bank-seconds': 'bank_seconds',
+        'turn-started': 'turn_started',
+        'reminders-sent': 'reminders_sent',
+        'undone': 'undone',
+        'catalog-size': 'catalog_size',
+        'catalog-digest': 'catalog_digest',
+        'journal-seq': 'journal_seq'
+    }
+
+    def __init__(self, number_of_rounds):
+        self.number_of_rounds = number_of_rounds
+        self.has_started = False
+        self.time_began = None
+        self.main_channel = None
+        self.google_sheet_id = None
+        self.pick_number = 0
+        self.current_drafter_notified = False
+        # pick clock, off while pick_seconds is 0
+        self.pick_seconds = 0
+        self.bank_seconds = 0
+        self.turn_started = None
+        self.reminders_sent = 0
+        # picks taken back by undo that can still be redone, newest last
+        self.undone = []
+        # the card list the draft's card ids refer to, see CardCatalog.digest
+        self.catalog_size = None
+        self.catalog_digest = None
+        self.journal_seq = 0
+        self.set_pick_order([])
+
+    @classmethod
+    def load(cls, db, number_of_rounds):
+        """
+        Read the state from draft.db, number_of_rounds only applies to a new draft.
+        """
+        state = cls(db.get('number-of-rounds') or number_of_rounds)
+
+        for key, attribute in cls.DB_KEYS.items():
+            if db.get(key) is not None:
+                setattr(state, attribute, db.get(key))
+
+        state.set_pick_order(db.get('pick-order') or [])
+
+        # a new draft has nothing in draft.db yet
+        state.dirty = not db.get('number-of-rounds')
+
+        return state
+
+    def save(self, db):
+        """
+        Copy the state into draft.db if it changed, the caller saves the file.
+        """
+        if not self.dirty:
+            return
+
+        for key, attribute in self.DB_KEYS.items():
+            if getattr(self, attribute) is not None:
+                db.set(key, getattr(self, attribute))
+
+        db.set('pick-order', self.pick_order)
+
+        self.dirty = False
+
+    def set_pick_order(self, pick_order):
+        self.pick_order = pick_order
+
+        # snaking forwards on even rounds and backwards on odd ones
+        forwards = list(range(len(pick_order)))
+        backwards = forwards[::-1]
+
+        self.snake_order = []
+        for round_number in range(self.number_of_rounds):
+            self.snake_order.extend(backwards if round_number % 2 else forwards)
+
+        self.dirty = True
+
+    def round_of(self, pick_number):
+        if not self.pick_order:
+            return 0
+
+        return pick_number // len(self.pick_order)
+
+    def has_finished(self):
+        # a draft nobody joined yet can't be finished
+        return len(self.snake_order) > 0 and self.pick_number >= len(self.snake_order)
+
+    def current_drafter_id(self):
+        return self.pick_order[self.snake_order[self.pick_number]]
@@ -0,0 +1,349 @@
+# -*- coding: utf-8 -*-
+
+import json
+import os
+import sqlite3
+
+from pickledb import PickleDB
+from .journal import Journal, fsync_path
+from .metrics import metrics
+from .state import DraftState
+
+# number of journaled events between snapshots of the db files
+JOURNAL_SNAPSHOT_INTERVAL = 100
+
+PICKLE_FILE_NAMES = ['users.db', 'draft.db', 'draft.journal']
+SQLITE_FILE_NAME = 'draft.sqlite'
+
+class PickleStorage:
+    """
+    The default storage, fine for small leagues: users.db and draft.db are a
+    snapshot, and every event since is in draft.journal.
+
+    Events are journaled before they are applied, and the db files are
+    rewritten from the in-memory draft every JOURNAL_SNAPSHOT_INTERVAL events.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+
+        self.user_data  = PickleDB(os.path.join(directory, 'users.db'))
+        self.draft_data = PickleDB(os.path.join(directory, 'draft.db'))
+        self.journal = None
+
+    def load(self, number_of_rounds):
+        """
+        Return the state and users from the last snapshot, and the events
+        journaled after it, which the caller has to apply.
+        """
+        state = DraftState.load(self.draft_data, number_of_rounds)
+        users = {user_id: self.user_data.get(user_id) for user_id in self.user_data.all()}
+
+        self.journal = Journal(os.path.join(self.directory, 'draft.journal'), state.journal_seq)
+
+        return (state, users, self.journal.replay(state.journal_seq))
+
+    # write-ahead: the event is on disk before it changes any state
+    def record(self, event):
+        self.journal.append(event)
+
+    def commit(self, draft, event):
+        if len(self.journal) >= JOURNAL_SNAPSHOT_INTERVAL:
+            self.snapshot(draft)
+
+    # compacts the journal into the db files
+    def snapshot(self, draft):
+        with metrics.time('draft.snapshot'):
+            self._snapshot(draft)
+
+    def _snapshot(self, draft):
+        draft.state.journal_seq = self.journal.seq
+        draft.state.dirty = True
+
+        # draft.db goes last, its journal-seq must never claim events users.db lacks
+        if draft.dirty_users:
+            for user_id in draft.dirty_users:
+                self.user_data.set(user_id, draft.users[user_id])
+
+            if not self.user_data.save():
+                print(f'Snapshot of draft {draft.draft_id} failed, keeping journal')
+                return
+
+            draft.dirty_users.clear()
+
+        draft.state.save(self.draft_data)
+
+        if not self.draft_data.save():
+            print(f'Snapshot of draft {draft.draft_id} failed, keeping journal')
+            return
+
+        # users.db doesn't exist until somebody registers
+        for db in [self.user_data, self.draft_data]:
+            if os.path.exists(db.location):
+                fsync_path(db.location)
+
+        self.journal.truncate()
+
+    def close(self, draft):
+        self.snapshot(draft)
+        self.journal.close()
+
+    # closes the files without writing anything, for a draft that failed to load
+    def abandon(self):
+        if self.journal:
+            self.journal.close()
+
+class SqliteStorage:
+    """
+    Keeps a draft in draft.sqlite, for large leagues.
+
+    Every event is committed in its own transaction once it has been applied,
+    writing only the rows it changed: the draft row, the dirty users and
+    their want lists, and a row in picks for every pick. Team names have a
+    unique index. The database runs in WAL mode with full syncs, so a
+    committed event survives the process dying just like a journaled one.
+    """
+
+    SCHEMA = '''
+        CREATE TABLE IF NOT EXISTS draft (
+            id INTEGER PRIMARY KEY CHECK (id = 0),
+            number_of_rounds INTEGER NOT NULL,
+            has_started INTEGER NOT NULL,
+            time_began TEXT,
+            main_channel INTEGER,
+            google_sheet_id TEXT,
+            pick_number INTEGER NOT NULL,
+            current_drafter_notified INTEGER NOT NULL,
+            pick_seconds REAL NOT NULL DEFAULT 0,
+            bank_seconds REAL NOT NULL DEFAULT 0,
+            turn_started REAL,
+            reminders_sent INTEGER NOT NULL DEFAULT 0,
+            undone TEXT NOT NULL DEFAULT '[]',
+            catalog_size INTEGER,
+            catalog_digest TEXT
+        );
+
+        CREATE TABLE IF NOT EXISTS users (
+            user_id TEXT PRIMARY KEY,
+            discord_id INTEGER,
+            discord_name TEXT,
+            discord_discriminator TEXT,
+            team_name TEXT NOT NULL,
+            pick_position INTEGER,
+            time_bank REAL
+        );
+        CREATE UNIQUE INDEX IF NOT EXISTS users_team_name ON users (team_name);
+
+        CREATE TABLE IF NOT EXISTS wants (
+            user_id TEXT NOT NULL REFERENCES users (user_id),
+            position INTEGER NOT NULL,
+            card_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, position)
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS wants_card_id ON wants (card_id);
+
+        CREATE TABLE IF NOT EXISTS backups (
+            user_id TEXT NOT NULL REFERENCES users (user_id),
+            position INTEGER NOT NULL,
+            card_id INTEGER NOT NULL,
+            PRIMARY KEY (user_id, position)
+        ) WITHOUT ROWID;
+
+        CREATE TABLE IF NOT EXISTS picks (
+            pick_number INTEGER PRIMARY KEY,
+            user_id TEXT NOT NULL REFERENCES users (user_id),
+            card_id INTEGER NOT NULL
+        );
+    '''
+
+    # columns added after the table was first created, with their definitions
+    ADDED_COLUMNS = [
+        ('draft', 'pick_seconds', 'REAL NOT NULL DEFAULT 0'),
+        ('draft', 'bank_seconds', 'REAL NOT NULL DEFAULT 0'),
+        ('draft', 'turn_started', 'REAL'),
+        ('draft', 'reminders_sent', 'INTEGER NOT NULL DEFAULT 0'),
+        ('draft', 'undone', "TEXT NOT NULL DEFAULT '[]'"),
+        ('draft', 'catalog_size', 'INTEGER'),
+        ('draft', 'catalog_digest', 'TEXT'),
+        ('users', 'time_bank', 'REAL')
+    ]
+
+    def __init__(self, directory):
+        self.directory = directory
+
+        self.connection = sqlite3.connect(os.path.join(directory, SQLITE_FILE_NAME))
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=FULL')
+        self.connection.executescript(self.SCHEMA)
+
+        for (table, column, definition) in self.ADDED_COLUMNS:
+            if column not in [row[1] for row in self.connection.execute(f'PRAGMA table_info({table})')]:
+                self.connection.execute(f'ALTER TABLE {table} ADD COLUMN {column} {definition}')
+
+    def load(self, number_of_rounds):
+        """
+        Return the state and users; there are never events left to apply.
+        """
+        row = self.connection.execute('SELECT number_of_rounds, has_started, time_began, main_channel, google_sheet_id, pick_number, current_drafter_notified, pick_seconds, bank_seconds, turn_started, reminders_sent, undone, catalog_size, catalog_digest FROM draft').fetchone()
+
+        if row is None:
+            state = DraftState(number_of_rounds)
+        else:
+            state = DraftState(row[0])
+            state.has_started = row[1] == 1
+            state.time_began = row[2]
+            state.main_channel = row[3]
+            state.google_sheet_id = row[4]
+            state.pick_number = row[5]
+            state.current_drafter_notified = row[6] == 1
+            state.pick_seconds = row[7]
+            state.bank_seconds = row[8]
+            state.turn_started = row[9]
+            state.reminders_sent = row[10]
+            state.undone = json.loads(row[11])
+            state.catalog_size = row[12]
+            state.catalog_digest = row[13]
+
+        users = {}
+        for (user_id, discord_id, discord_name, discord_discriminator, team_name, time_bank) in self.connection.execute('SELECT user_id, discord_id, discord_name, discord_discriminator, team_name, time_bank FROM users'):
+            users[user_id] = {
+                'discord-id': discord_id,
+                'discord-name': discord_name,
+                'discord-discriminator': discord_discriminator,
+
+                'team-name': team_name,
+                'drafted-cards': [],
+                'wanted-cards': [],
+                'backup-cards': [],
+                'time-bank': time_bank
+            }
+
+        for (user_id, card_id) in self.connection.execute('SELECT user_id, card_id FROM wants ORDER BY user_id, position'):
+            users[user_id]['wanted-cards'].append(card_id)
+
+        for (user_id, card_id) in self.connection.execute('SELECT user_id, card_id FROM backups ORDER BY user_id, position'):
+            users[user_id]['backup-cards'].append(card_id)
+
+        for (user_id, card_id) in self.connection.execute('SELECT user_id, card_id FROM picks ORDER BY pick_number'):
+            users[user_id]['drafted-cards'].append(card_id)
+
+        if row is not None:
+            state.set_pick_order([user_id for (user_id,) in self.connection.execute('SELECT user_id FROM users WHERE pick_position IS NOT NULL ORDER BY pick_position')])
+
+        # a new draft has no draft row yet
+        state.dirty = row is None
+
+        return (state, users, [])
+
+    # nothing to do up front, commit() writes the event's effects atomically
+    def record(self, event):
+        pass
+
+    def commit(self, draft, event):
+        with metrics.time('draft.commit'), self.connection:
+            if event['type'] == 'pick':
+                self.connection.execute('INSERT INTO picks (pick_number, user_id, card_id) VALUES (?, ?, ?)', (event['pick-number'], event['user-id'], event['card-id']))
+
+            if event['type'] == 'undo':
+                self.connection.executemany('DELETE FROM picks WHERE pick_number = ?', [(pick['pick-number'],) for pick in event['picks']])
+
+            self._write(draft, write_pick_order=event['type'] == 'start')
+
+    def import_draft(self, draft, picks):
+        """
+        Write all of a draft and its (pick_number, user_id, card_id) picks in
+        one transaction, when migrating it from another storage.
+        """
+        with self.connection:
+            self.connection.executemany('INSERT INTO picks (pick_number, user_id, card_id) VALUES (?, ?, ?)', picks)
+            self._write(draft, write_pick_order=True)
+
+    def snapshot(self, draft):
+        with metrics.time('draft.snapshot'), self.connection:
+            self._write(draft, write_pick_order=True)
+
+    def _write(self, draft, write_pick_order):
+        for user_id in draft.dirty_users:
+            user = draft.users[user_id]
+
+            self.connection.execute('''
+                INSERT INTO users (user_id, discord_id, discord_name, discord_discriminator, team_name, time_bank) VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE SET discord_id = excluded.discord_id, discord_name = excluded.discord_name, discord_discriminator = excluded.discord_discriminator, team_name = excluded.team_name, time_bank = excluded.time_bank
+            ''', (user_id, user['discord-id'], user['discord-name'], user['discord-discriminator'], user['team-name'], user['time-bank']))
+
+            for (table, key) in [('wants', 'wanted-cards'), ('backups', 'backup-cards')]:
+                self.connection.execute(f'DELETE FROM {table} WHERE user_id = ?', (user_id,))
+                self.connection.executemany(f'INSERT INTO {table} (user_id, position, card_id) VALUES (?, ?, ?)', [(user_id, position, card_id) for (position, card_id) in enumerate(user[key])])
+
+        draft.dirty_users.clear()
+
+        state = draft.state
+        if state.dirty:
+            self.connection.execute('''
+                INSERT OR REPLACE INTO draft (id, number_of_rounds, has_started, time_began, main_channel, google_sheet_id, pick_number, current_drafter_notified, pick_seconds, bank_seconds, turn_started, reminders_sent, undone, catalog_size, catalog_digest)
+                VALUES (0, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ''', (state.number_of_rounds, state.has_started, state.time_began, state.main_channel, state.google_sheet_id, state.pick_number, state.current_drafter_notified, state.pick_seconds, state.bank_seconds, state.turn_started, state.reminders_sent, json.dumps(state.undone), state.catalog_size, state.catalog_digest))
+
+            state.dirty = False
+
+        if write_pick_order:
+            self.connection.executemany('UPDATE users SET pick_position = ? WHERE user_id = ?', list(enumerate(state.pick_order)))
+
+    def close(self, draft):
+        self.connection.close()
+
+    def abandon(self):
+        self.connection.close()
+
+STORAGE_KINDS = {
+    'pickle': PickleStorage,
+    'sqlite': SqliteStorage
+}
+
+def open_storage(directory, default_kind='pickle'):
+    """
+    Open the storage of the draft in directory, in whatever format it already
+    uses, or default_kind for a new draft.
+    """
+    # a draft.db next to draft.sqlite means a migration to sqlite never finished
+    if os.path.exists(os.path.join(directory, 'draft.db')):
+        return PickleStorage(directory)
+
+    if os.path.exists(os.path.join(directory, SQLITE_FILE_NAME)):
+        return SqliteStorage(directory)
+
+    if default_kind not in STORAGE_KINDS:
+        raise ValueError(f'Unknown storage: {default_kind}, expected one of {", ".join(STORAGE_KINDS)}')
+
+    return STORAGE_KINDS[default_kind](directory)
+
+def is_complete(directory):
+    """
+    Whether the draft in directory is finished and everyone has been told,
+    read from its draft row alone so finished drafts can be skipped on
+    startup without loading their users. False if in doubt, e.g. while
+    the journal holds events.
+    """
+    if os.path.exists(os.path.join(directory, 'draft.db')):
+        journal_path = os.path.join(directory, 'draft.journal')
+        if os.path.exists(journal_path) and os.path.getsize(journal_path) > 0:
+            return False
+
+        draft_data = PickleDB(os.path.join(directory, 'draft.db'))
+        if not draft_data.get('number-of-rounds'):
+            return False
+
+        state = DraftState.load(draft_data, draft_data.get('number-of-rounds'))
+        return state.has_finished() and state.current_drafter_notified
+
+    if os.path.exists(os.path.join(directory, SQLITE_FILE_NAME)):
+        connection = sqlite3.connect(os.path.join(directory, SQLITE_FILE_NAME))
+        try:
+            row = connection.execute('SELECT number_of_rounds, pick_number, current_drafter_notified FROM draft').fetchone()
+            (player_count,) = connection.execute('SELECT COUNT(*) FROM users WHERE pick_position IS NOT NULL').fetchone()
+        finally:
+            connection.close()
+
+        return row is not None and player_count > 0 and row[1] >= row[0] * player_count and row[2] == 1
+
+    return False
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import io
+import json
+import os
+import unittest
+
+from .actor import DraftSnapshot
+from .attributes import SearchError, import_scryfall, open_attributes, search_cards, stream_json_array
+from .draft import DraftError
+from .testing import DraftTestCase, TempDirTestCase, make_catalog
+
+# Bolt Thrower and Black Lotus are left out, like cards missing from the bulk data
+SCRYFALL_CARDS = [
+    {'name': 'Lightning Bolt', 'colors': ['R'], 'cmc': 1.0, 'type_line': 'Instant'},
+    {'name': 'Bolt', 'colors': ['R'], 'cmc': 1.0, 'type_line': 'Instant'},
+    {'name': 'Thunderbolt', 'colors': ['R'], 'cmc': 2.0, 'type_line': 'Instant'},
+    {'name': 'Boltwave', 'colors': ['R'], 'cmc': 1.0, 'type_line': 'Sorcery'},
+    {'name': 'Counterspell', 'colors': ['U'], 'cmc': 2.0, 'type_line': 'Instant'},
+    {'name': 'Dark Ritual', 'colors': ['B'], 'cmc': 1.0, 'type_line': 'Instant'},
+    {'name': 'Llanowar Elves', 'colors': ['G'], 'cmc': 1.0, 'type_line': 'Creature — Elf Druid'},
+    {'name': 'Ancestral Recall', 'colors': ['U'], 'cmc': 1.0, 'type_line': 'Instant'},
+    {'name': 'Tarmogoyf', 'colors': ['G'], 'cmc': 2.0, 'type_line': 'Creature — Lhurgoyf'}
+]
+
+def import_cards(directory, catalog, cards=SCRYFALL_CARDS):
+    bulk_path = os.path.join(directory, 'oracle-cards.json')
+    with open(bulk_path, 'w', encoding='utf-8') as f:
+        json.dump(cards, f)
+
+    attributes_path = os.path.join(directory, 'cards.attributes.npz')
+    missing = import_scryfall(bulk_path, catalog, attributes_path)
+    return (missing, attributes_path)
+
+class TestStreamJsonArray(unittest.TestCase):
+
+    def stream(self, text, chunk_size):
+        return list(stream_json_array(io.StringIO(text), chunk_size=chunk_size))
+
+    def test_elements_split_across_chunks(self):
+        text = json.dumps(SCRYFALL_CARDS, indent=2)
+
+        # every chunk size cuts some element, string or number in two
+        for chunk_size in [1, 2, 7, 64]:
+            self.assertEqual(self.stream(text, chunk_size), SCRYFALL_CARDS)
+
+    def test_empty_array(self):
+        self.assertEqual(self.stream('[ ]', 1), [])
+        self.assertEqual(self.stream('', 1), [])
+
+    def test_not_an_array(self):
+        with self.assertRaises(ValueError):
+            self.stream('{"name": "Bolt"}', 4)
+
+    def test_truncated(self):
+        with self.assertRaises(json.JSONDecodeError):
+            self.stream('[{"name": "Bolt"}, {"name": "Coun', 4)
+
+class AttributesTestCase(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.catalog = make_catalog(self.directory)
+        (self.missing, self.path) = import_cards(self.directory, self.catalog)
+        self.attributes = open_attributes(self.path, self.catalog)
+
+    def search(self, query, limit=None):
+        return [self.catalog.name(card_id) for card_id in search_cards(self.catalog, self.attributes, query, limit=limit)]
+
+class TestImport(AttributesTestCase):
+
+    def test_missing(self):
+        self.assertEqual(self.missing, ['Bolt Thrower', 'Black Lotus'])
+
+    def test_other_card_list(self):
+        other_directory = os.path.join(self.directory, 'other')
+        os.mkdir(other_directory)
+        other_catalog = make_catalog(other_directory, ['Bolt', 'Counterspell'])
+
+        self.assertIsNone(open_attributes(self.path, other_catalog))
+        self.assertIsNone(open_attributes(os.path.join(self.directory, 'missing.npz'), self.catalog))
+
+class TestFilterTerms(AttributesTestCase):
+
+    def test_colors(self):
+        self.assertEqual(self.search('c:u'), ['Ancestral Recall', 'Counterspell'])
+        self.assertEqual(self.search('color=g'), ['Llanowar Elves'])
+        self.assertEqual(self.search('c<=ub'), ['Ancestral Recall', 'Counterspell', 'Dark Ritual'])
+        self.assertEqual(self.search('c!=r'), ['Ancestral Recall', 'Counterspell', 'Dark Ritual', 'Llanowar Elves'])
+        self.assertEqual(self.search('c>=R'), ['Bolt', 'Boltwave', 'Lightning Bolt', 'Thunderbolt'])
+        # strictly more than blue, no card here is multicolored
+        self.assertEqual(self.search('c>u'), [])
+        self.assertEqual(self.search('c:c'), [])
+
+    def test_mana_value(self):
+        self.assertEqual(self.search('mv>1'), ['Counterspell', 'Thunderbolt'])
+        self.assertEqual(self.search('cmc>=2'), ['Counterspell', 'Thunderbolt'])
+        self.assertEqual(self.search('mv<2 c:u'), ['Ancestral Recall'])
+        self.assertEqual(self.search('mv:2'), self.search('mv=2'))
+        self.assertEqual(self.search('mv!=1'), ['Counterspell', 'Thunderbolt'])
+
+    def test_types(self):
+        self.assertEqual(self.search('t:creature'), ['Llanowar Elves'])
+        self.assertEqual(self.search('-t:instant c:r'), ['Boltwave'])
+
+    def test_cards_not_imported_never_match(self):
+        # Bolt Thrower and Black Lotus have no attributes, not even colorless
+        self.assertNotIn('Bolt Thrower', self.search('-t:instant'))
+        self.assertNotIn('Black Lotus', self.search('mv<=0'))
+
+    def test_name_and_filters(self):
+        self.assertEqual(self.search('bolt mv:1')[0], 'Bolt')
+        self.assertNotIn('Thunderbolt', self.search('bolt mv:1'))
+        self.assertEqual(self.search('bolt t:sorcery'), ['Boltwave'])
+        self.assertEqual(len(self.search('t:instant', limit=2)), 2)
+
+    def test_bad_terms(self):
+        for query in ['c:x', 'c<=rq', 'mv<two', 'cmc:1/2', 't<instant', 't!=creature']:
+            with self.assertRaises(DraftError):
+                self.search(query)
+
+    def test_not_imported(self):
+        with self.assertRaises(SearchError):
+            search_cards(self.catalog, None, 'bolt c:r')
+
+        self.assertEqual(search_cards(self.catalog, None, 'counterspell'), [self.catalog.lookup('Counterspell')])
+
+class TestTakenCards(DraftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        (_, path) = import_cards(self.directory, self.catalog)
+        self.attributes = open_attributes(path, self.catalog)
+        (self.first, self.second) = self.draft.start(1)
+
+    def test_taken_cards_in_filtered_search(self):
+        self.make_picks(['Counterspell', 'Bolt'])
+        # what !search marks as taken
+        taken_cards = DraftSnapshot(self.draft).taken_cards
+
+        (_, mask) = self.attributes.parse('c:u')
+        self.assertTrue(mask[self.card('Counterspell')])
+
+        # the filter mask and the taken cards are independent, the search still
+        # finds taken cards and the caller marks them
+        results = search_cards(self.catalog, self.attributes, 'c:u')
+        self.assertEqual([card_id in taken_cards for card_id in results], [False, True])
+
+        results = search_cards(self.catalog, self.attributes, 'bolt mv:1')
+        self.assertEqual({card_id for card_id in results if card_id not in taken_cards}, {self.card('Lightning Bolt'), self.card('Boltwave')})
+
+if __name__ == '__main__':
+    unittest.main()
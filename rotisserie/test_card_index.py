@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from .testing import TempDirTestCase, make_catalog
+
+class TestCardIndex(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.catalog = make_catalog(self.directory)
+
+    def names(self, card_ids):
+        return list(map(self.catalog.name, card_ids))
+
+    def test_ranking(self):
+        # exact > prefix > word-start > substring, alphabetical within each
+        self.assertEqual(self.names(self.catalog.index.search('BOLT')), ['Bolt', 'Bolt Thrower', 'Boltwave', 'Lightning Bolt', 'Thunderbolt'])
+
+    def test_limit(self):
+        self.assertEqual(self.names(self.catalog.index.search('bolt', limit=2)), ['Bolt', 'Bolt Thrower'])
+
+    def test_exclude(self):
+        excluded = {self.catalog.lookup('Bolt'), self.catalog.lookup('Lightning Bolt')}
+        self.assertEqual(self.names(self.catalog.index.search('bolt', exclude=excluded.__contains__)), ['Bolt Thrower', 'Boltwave', 'Thunderbolt'])
+
+        # excluded cards don't use up the limit
+        self.assertEqual(self.names(self.catalog.index.search('bolt', limit=2, exclude=excluded.__contains__)), ['Bolt Thrower', 'Boltwave'])
+
+    def test_short_fragment(self):
+        self.assertEqual(self.names(self.catalog.index.search('ll')), ['Llanowar Elves', 'Ancestral Recall', 'Counterspell'])
+
+    def test_no_match(self):
+        self.assertEqual(self.catalog.index.search('lotus bolt'), [])
+        self.assertEqual(self.catalog.index.search(''), [])
+
+if __name__ == '__main__':
+    unittest.main()
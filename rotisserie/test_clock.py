@@ -0,0 +1,279 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+import unittest
+
+from .clock import DeadlineScheduler, format_duration
+from .draft import DraftError
+from .testing import DraftTestCase
+
+class FakeDraft:
+
+    def __init__(self, draft_id, deadline):
+        self.draft_id = draft_id
+        self.deadline = deadline
+
+    def clock_deadline(self):
+        return self.deadline
+
+class TestFormatDuration(unittest.TestCase):
+
+    def test_format_duration(self):
+        self.assertEqual(format_duration(-5), '0s')
+        self.assertEqual(format_duration(45.9), '45s')
+        self.assertEqual(format_duration(125), '2m')
+        self.assertEqual(format_duration(3600), '1h')
+        self.assertEqual(format_duration(2*3600 + 5*60 + 30), '2h 5m')
+        self.assertEqual(format_duration(24*3600), '1d')
+        self.assertEqual(format_duration(28*3600 + 59*60), '1d 4h')
+
+class PickClockTestCase(DraftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pick_order = self.draft.start(1)
+        (self.first, self.second) = self.pick_order
+
+    def set_clock(self, pick_seconds, bank_seconds):
+        """
+        Set the clock and return the time the current turn started.
+        """
+        self.draft.set_clock(pick_seconds, bank_seconds)
+        return self.draft.state.turn_started
+
+class TestReminders(PickClockTestCase):
+
+    def setUp(self):
+        super().setUp()
+        # two hours per pick plus half an hour of bank, so both reminders fit
+        self.started = self.set_clock(7200, 1800)
+        self.expiry = self.started + 9000
+
+    def test_turn_notice(self):
+        event = self.draft.attempt_pick(now=self.started)
+        self.assertEqual((event['type'], event['notice'], event['user-id']), ('notified', 'turn', self.first))
+        self.assertIsNone(self.draft.attempt_pick(now=self.started + 1))
+
+    def test_reminders(self):
+        self.draft.attempt_pick(now=self.started)
+        self.assertEqual(self.draft.clock_expiry(), self.expiry)
+        self.assertEqual(self.draft.clock_deadline(), self.expiry - 3600)
+
+        self.assertIsNone(self.draft.attempt_pick(now=self.expiry - 3601))
+
+        event = self.draft.attempt_pick(now=self.expiry - 3600)
+        self.assertEqual((event['type'], event['reminders-sent']), ('reminded', 1))
+        self.assertEqual(self.draft.clock_deadline(), self.expiry - 600)
+        self.assertIsNone(self.draft.attempt_pick(now=self.expiry - 3000))
+
+        event = self.draft.attempt_pick(now=self.expiry - 600)
+        self.assertEqual(event['reminders-sent'], 2)
+        self.assertEqual(self.draft.clock_deadline(), self.expiry)
+
+    def test_late_reminders_collapse(self):
+        # e.g. after a restart, only the latest reminder is sent
+        self.draft.attempt_pick(now=self.started)
+
+        event = self.draft.attempt_pick(now=self.expiry - 10)
+        self.assertEqual(event['reminders-sent'], 2)
+        self.assertIsNone(self.draft.attempt_pick(now=self.expiry - 5))
+
+    def test_short_turn_has_no_reminders(self):
+        started = self.set_clock(300, 0)
+
+        self.assertEqual(self.draft.due_reminders(started + 300), [])
+        self.assertEqual(self.draft.clock_deadline(), started + 300)
+
+    def test_no_clock(self):
+        self.set_clock(0, 0)
+        self.assertIsNone(self.draft.clock_deadline())
+
+        self.draft.attempt_pick(now=self.started)
+        self.assertIsNone(self.draft.attempt_pick(now=self.expiry + 3600))
+
+    def test_negative_times(self):
+        with self.assertRaises(DraftError):
+            self.draft.set_clock(-1, 0)
+
+class TestAutoPick(PickClockTestCase):
+
+    def test_backup(self):
+        self.draft.backup(self.second, 'Bolt')
+        self.draft.backup(self.second, 'Dark Ritual')
+        started = self.set_clock(60, 30)
+
+        # the first drafter takes the second one's first backup
+        self.draft.want(self.first, 'Bolt')
+        self.draft.attempt_pick(now=started + 10)
+        started = started + 10
+
+        self.assertEqual(self.draft.attempt_pick(now=started)['notice'], 'turn')
+        self.assertIsNone(self.draft.attempt_pick(now=started + 89))
+
+        event = self.draft.attempt_pick(now=started + 90)
+        self.assertEqual((event['type'], event['user-id'], event['card-id'], event['auto']), ('pick', self.second, self.card('Dark Ritual'), True))
+        self.assertEqual(event['time-bank'], 0)
+        self.assertEqual(self.draft.get_time_bank(self.second), 0)
+
+    def test_without_backup(self):
+        started = self.set_clock(60, 0)
+        self.draft.attempt_pick(now=started)
+
+        # the first card of the card list that is still available
+        event = self.draft.attempt_pick(now=started + 60)
+        self.assertEqual((event['card-id'], event['auto']), (0, True))
+
+        self.draft.attempt_pick(now=started + 60)
+        event = self.draft.attempt_pick(now=started + 120)
+        self.assertEqual((event['user-id'], event['card-id']), (self.second, 1))
+
+    def test_want_list_comes_first(self):
+        self.draft.backup(self.first, 'Dark Ritual')
+        started = self.set_clock(60, 0)
+        self.draft.attempt_pick(now=started)
+
+        self.draft.want(self.first, 'Bolt')
+        event = self.draft.attempt_pick(now=started + 120)
+        self.assertEqual((event['card-id'], event['auto']), (self.card('Bolt'), False))
+
+class TestTimeBank(PickClockTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.started = self.set_clock(60, 600)
+
+    def test_pick_within_pick_time(self):
+        self.draft.want(self.first, 'Bolt')
+        event = self.draft.attempt_pick(now=self.started + 59)
+
+        self.assertEqual(event['time-bank'], 600)
+        self.assertEqual(self.draft.get_time_bank(self.first), 600)
+
+    def test_pick_uses_bank(self):
+        self.draft.attempt_pick(now=self.started)
+        self.draft.want(self.first, 'Bolt')
+        event = self.draft.attempt_pick(now=self.started + 160)
+
+        self.assertEqual(event['time-bank'], 500)
+        self.assertEqual(self.draft.get_time_bank(self.first), 500)
+        # the other drafter's clock starts from the pick, with a full bank
+        self.assertEqual(self.draft.clock_expiry(), self.started + 160 + 60 + 600)
+
+        # and the first drafter's next turn only has what is left
+        self.draft.want(self.second, 'Counterspell')
+        self.draft.attempt_pick(now=self.started + 200)
+        self.draft.want(self.second, 'Dark Ritual')
+        self.draft.attempt_pick(now=self.started + 210)
+        self.assertEqual(self.draft.clock_expiry(), self.started + 210 + 60 + 500)
+
+    def test_bank_never_grows_past_setting(self):
+        self.draft.attempt_pick(now=self.started)
+        self.draft.want(self.first, 'Bolt')
+        self.draft.attempt_pick(now=self.started + 160)
+
+        self.draft.set_clock(60, 100)
+        self.assertEqual(self.draft.get_time_bank(self.first), 100)
+        self.draft.set_clock(60, 1000)
+        self.assertEqual(self.draft.get_time_bank(self.first), 500)
+
+    def test_bank_survives_reload(self):
+        self.draft.attempt_pick(now=self.started)
+        self.draft.want(self.first, 'Bolt')
+        self.draft.attempt_pick(now=self.started + 160)
+
+        self.reload()
+        self.assertEqual(self.draft.get_time_bank(self.first), 500)
+
+class TestTimeBankSqlite(TestTimeBank):
+
+    storage = 'sqlite'
+
+class TestDeadlineScheduler(unittest.TestCase):
+
+    def setUp(self):
+        self.fired = []
+        self.scheduler = DeadlineScheduler(self.fired.append)
+
+    def test_fire(self):
+        (a, b) = (FakeDraft('a', 10), FakeDraft('b', 5))
+        self.scheduler.schedule(a)
+        self.scheduler.schedule(b)
+        self.assertEqual(self.scheduler.next_deadline(), 5)
+
+        self.scheduler.fire(4)
+        self.assertEqual(self.fired, [])
+
+        self.scheduler.fire(7)
+        self.assertEqual(self.fired, [b])
+        self.assertEqual(self.scheduler.next_deadline(), 10)
+
+    def test_reschedule(self):
+        a = FakeDraft('a', 10)
+        self.scheduler.schedule(a)
+
+        a.deadline = 20
+        self.scheduler.schedule(a)
+        self.scheduler.fire(15)
+        self.assertEqual(self.fired, [])
+
+        self.scheduler.fire(20)
+        self.assertEqual(self.fired, [a])
+        self.assertIsNone(self.scheduler.next_deadline())
+
+    def test_cancel(self):
+        a = FakeDraft('a', 10)
+        self.scheduler.schedule(a)
+
+        a.deadline = None
+        self.scheduler.schedule(a)
+        # scheduling a draft without a clock again is harmless
+        self.scheduler.schedule(a)
+
+        self.scheduler.fire(100)
+        self.assertEqual(self.fired, [])
+        self.assertIsNone(self.scheduler.next_deadline())
+
+    def test_run(self):
+        async def _run():
+            later = FakeDraft('later', time.time() + 60)
+            self.scheduler.schedule(later)
+
+            task = asyncio.create_task(self.scheduler.run())
+            await asyncio.sleep(0.01)
+
+            # wakes the scheduler, which was sleeping towards the later deadline
+            sooner = FakeDraft('sooner', time.time() + 0.02)
+            self.scheduler.schedule(sooner)
+
+            for _ in range(100):
+                if self.fired:
+                    break
+                await asyncio.sleep(0.01)
+            task.cancel()
+
+        asyncio.run(_run())
+        self.assertEqual([draft.draft_id for draft in self.fired], ['sooner'])
+        self.assertEqual(self.scheduler.next_deadline(), self.scheduler._deadlines['later'])
+
+class TestDraftDeadlines(PickClockTestCase):
+
+    def test_deadline_moves_to_next_drafter(self):
+        fired = []
+        scheduler = DeadlineScheduler(fired.append)
+
+        started = self.set_clock(60, 0)
+        scheduler.schedule(self.draft)
+        self.assertEqual(scheduler.next_deadline(), started + 60)
+
+        self.draft.attempt_pick(now=started)
+        scheduler.fire(started + 60)
+        self.assertEqual(fired, [self.draft])
+        self.draft.attempt_pick(now=started + 60)
+
+        scheduler.schedule(self.draft)
+        self.assertEqual(self.draft.state.current_drafter_id(), self.second)
+        self.assertEqual(scheduler.next_deadline(), started + 120)
+
+if __name__ == '__main__':
+    unittest.main()
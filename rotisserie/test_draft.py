@@ -0,0 +1,217 @@
+# -*- coding: utf-8 -*-
+
+import contextlib
+import io
+import os
+import tempfile
+import unittest
+
+from .draft import Draft, DraftError, DraftRegistry
+from .testing import CARD_NAMES, DraftTestCase, TempDirTestCase, make_catalog
+
+class TestWantMany(DraftTestCase):
+
+    def wants(self, user_id='1'):
+        return list(map(self.catalog.name, self.draft.get_user(user_id)['wanted-cards']))
+
+    def test_append(self):
+        self.draft.want('1', 'Bolt')
+        (want_list, errors) = self.draft.want_many('1', ['Counterspell', '', '  dark ritual  '])
+
+        self.assertEqual(errors, [])
+        self.assertEqual(want_list, self.draft.get_user('1')['wanted-cards'])
+        self.assertEqual(self.wants(), ['Bolt', 'Counterspell', 'Dark Ritual'])
+        self.assertEqual(self.draft.wanted_by[self.card('Counterspell')], {'1'})
+
+    def test_replace_reorders(self):
+        self.draft.want_many('1', ['Bolt', 'Counterspell', 'Dark Ritual'])
+        (_, errors) = self.draft.want_many('1', ['#3', 'Black Lotus', '#1'], replace=True)
+
+        self.assertEqual(errors, [])
+        self.assertEqual(self.wants(), ['Dark Ritual', 'Black Lotus', 'Bolt'])
+        self.assertNotIn('1', self.draft.wanted_by.get(self.card('Counterspell'), set()))
+
+    def test_skipped_lines(self):
+        self.draft.start(1)
+        self.make_picks(['Dark Ritual'])
+        self.draft.want('1', 'Bolt')
+
+        (_, errors) = self.draft.want_many('1', ['Dark Ritual', 'Llanowar', 'bolt t', 'no such card', '#7'])
+
+        self.assertEqual(len(errors), 3)
+        self.assertTrue(errors[0].startswith('Dark Ritual: '))
+        self.assertTrue(errors[1].startswith('no such card: '))
+        self.assertTrue(errors[2].startswith('#7: '))
+        self.assertEqual(self.wants()[-2:], ['Llanowar Elves', 'Bolt Thrower'])
+
+    def test_replace_keeps_list_on_errors(self):
+        self.draft.want_many('1', ['Bolt', 'Counterspell'])
+        (want_list, errors) = self.draft.want_many('1', ['#2', 'Counterspel', 'Dark Ritual', 'no such card'], replace=True)
+
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(errors[0].startswith('no such card: '))
+        self.assertEqual(list(map(self.catalog.name, want_list)), ['Bolt', 'Counterspell'])
+        self.assertEqual(self.wants(), ['Bolt', 'Counterspell'])
+        self.assertEqual(self.draft.wanted_by[self.card('Bolt')], {'1'})
+
+    def test_ambiguous_line(self):
+        (_, errors) = self.draft.want_many('1', ['bolt'])
+        self.assertEqual(errors, [])
+        self.assertEqual(self.wants(), ['Bolt'])
+
+        (_, errors) = self.draft.want_many('1', ['bol'])
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(self.wants(), ['Bolt'])
+
+    def test_not_registered(self):
+        with self.assertRaises(DraftError):
+            self.draft.want_many('3', ['Bolt'])
+
+    def test_survives_reload(self):
+        self.draft.want_many('1', ['Bolt', 'Counterspell'])
+        self.draft.want_many('1', ['#2'], replace=True)
+
+        self.reload()
+        self.assertEqual(self.wants(), ['Counterspell'])
+
+class TestWantManySqlite(TestWantMany):
+
+    storage = 'sqlite'
+
+class TestUndoRedo(DraftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.pick_order = self.draft.start(1)
+        self.make_picks(['Bolt', 'Counterspell', 'Dark Ritual'])
+
+    def test_last_picks(self):
+        picks = self.draft.last_picks(3)
+        self.assertEqual([pick['pick-number'] for pick in picks], [2, 1, 0])
+        self.assertEqual([pick['card-id'] for pick in picks], [self.card('Dark Ritual'), self.card('Counterspell'), self.card('Bolt')])
+        # snake order: the second drafter picks twice in a row
+        self.assertEqual([pick['user-id'] for pick in picks], [self.pick_order[1], self.pick_order[1], self.pick_order[0]])
+
+        self.assertEqual(list(reversed(picks)), [{'pick-number': n, 'user-id': u, 'card-id': c} for (n, u, c) in self.draft.pick_history()])
+
+    def test_undo(self):
+        picks = self.draft.undo(2)
+        self.assertEqual([pick['card-id'] for pick in picks], [self.card('Dark Ritual'), self.card('Counterspell')])
+        self.assertEqual(self.draft.get_pick_number(), 1)
+        self.assertNotIn(self.card('Counterspell'), self.draft.taken_cards)
+        self.assertEqual(self.draft.get_user(self.pick_order[1])['drafted-cards'], [])
+        self.assertEqual(self.draft.state.current_drafter_id(), self.pick_order[1])
+
+        self.reload()
+        self.assertEqual(self.draft.get_pick_number(), 1)
+        self.assertEqual(len(self.draft.state.undone), 2)
+
+    def test_undo_too_many(self):
+        with self.assertRaises(DraftError):
+            self.draft.undo(4)
+        with self.assertRaises(DraftError):
+            self.draft.undo(0)
+
+    def test_redo(self):
+        self.draft.undo(2)
+        events = self.draft.redo(1)
+        self.assertEqual([event['card-id'] for event in events], [self.card('Counterspell')])
+        self.assertEqual(self.draft.get_pick_number(), 2)
+        self.assertIn(self.card('Counterspell'), self.draft.taken_cards)
+
+        self.reload()
+        self.draft.redo(1)
+        self.assertEqual(self.draft.get_user(self.pick_order[1])['drafted-cards'], [self.card('Counterspell'), self.card('Dark Ritual')])
+
+        with self.assertRaises(DraftError):
+            self.draft.redo(1)
+
+    def test_new_pick_clears_undone(self):
+        self.draft.undo(1)
+        self.make_picks(['Black Lotus'])
+
+        self.assertEqual(self.draft.state.undone, [])
+        with self.assertRaises(DraftError):
+            self.draft.redo(1)
+
+class TestUndoRedoSqlite(TestUndoRedo):
+
+    storage = 'sqlite'
+
+class TestCatalogChanges(DraftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.draft.start(1)
+        self.make_picks(['Bolt'])
+        self.draft.close()
+
+    def reopen(self, card_names):
+        self.catalog = make_catalog(tempfile.mkdtemp(dir=self.directory), card_names)
+        self.draft = Draft('draft', self.draft_directory, self.catalog)
+
+    def test_cards_added_at_the_end(self):
+        self.reopen(CARD_NAMES + ['Time Walk'])
+        self.assertIn(self.card('Bolt'), self.draft.taken_cards)
+        self.assertEqual(self.draft.state.catalog_digest, self.catalog.digest())
+
+        # the new digest is stored, taking the card out again is a change
+        self.draft.close()
+        with self.assertRaises(DraftError):
+            self.reopen(CARD_NAMES)
+        self.draft = Draft('draft', self.draft_directory, make_catalog(tempfile.mkdtemp(dir=self.directory), CARD_NAMES + ['Time Walk']))
+
+    def test_cards_moved(self):
+        with self.assertRaises(DraftError):
+            self.reopen(['Time Walk'] + CARD_NAMES)
+        self.reopen(CARD_NAMES)
+
+    def test_cards_removed(self):
+        with self.assertRaises(DraftError):
+            self.reopen(CARD_NAMES[:-1])
+        self.reopen(CARD_NAMES)
+
+class TestCatalogChangesSqlite(TestCatalogChanges):
+
+    storage = 'sqlite'
+
+class TestRegistryCatalogChanges(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.drafts_directory = os.path.join(self.directory, 'drafts')
+
+        # 'stale' was run with another card list than the one the bot has now
+        for (draft_id, card_names) in [('fresh', CARD_NAMES), ('stale', list(reversed(CARD_NAMES)))]:
+            drafts = DraftRegistry(self.drafts_directory, make_catalog(tempfile.mkdtemp(dir=self.directory), card_names))
+            draft = drafts.get(draft_id, create=True)
+            draft.register('1', 1, 'lina', '0001', '')
+            draft.start(1)
+            drafts.unload(draft_id)
+
+        self.drafts = DraftRegistry(self.drafts_directory, make_catalog(self.directory))
+
+    def tearDown(self):
+        for draft in self.drafts.loaded():
+            self.drafts.unload(draft.draft_id)
+        super().tearDown()
+
+    def test_load_active_skips_stale_drafts(self):
+        with contextlib.redirect_stdout(io.StringIO()) as out:
+            self.drafts.load_active()
+
+        self.assertEqual([draft.draft_id for draft in self.drafts.loaded()], ['fresh'])
+        self.assertIn('Not loading draft stale', out.getvalue())
+
+    def test_get_stale_draft(self):
+        with self.assertRaises(DraftError):
+            self.drafts.get('stale')
+        self.assertEqual(self.drafts.loaded(), [])
+
+        # nothing was written, the draft still loads with its own card list
+        drafts = DraftRegistry(self.drafts_directory, make_catalog(tempfile.mkdtemp(dir=self.directory), list(reversed(CARD_NAMES))))
+        self.assertTrue(drafts.get('stale').get_has_started())
+        drafts.unload('stale')
+
+if __name__ == '__main__':
+    unittest.main()
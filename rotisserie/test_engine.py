@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import contextlib
+import io
+import os
+import unittest
+
+from .actor import DraftActor, DraftActors
+from .draft import Draft, DraftError, DraftRegistry
+from .engine import PickEngine
+from .testing import TempDirTestCase, make_catalog
+
+class SignallingActors(DraftActors):
+    """
+    Signals the engine again while the first pick attempt of every draft is
+    running, like a !want arriving in the middle of it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.engine = None
+        self.signalled = set()
+
+    async def submit(self, draft, method_name, *args, **kwargs):
+        if draft.draft_id not in self.signalled:
+            self.signalled.add(draft.draft_id)
+            self.engine.signal(draft)
+
+        return await super().submit(draft, method_name, *args, **kwargs)
+
+class FailingActors(DraftActors):
+    """
+    Fails every call on the draft with id broken_draft_id.
+    """
+
+    def __init__(self, broken_draft_id):
+        super().__init__()
+        self.broken_draft_id = broken_draft_id
+
+    async def submit(self, draft, method_name, *args, **kwargs):
+        if draft.draft_id == self.broken_draft_id:
+            raise RuntimeError('Simulated bug')
+
+        return await super().submit(draft, method_name, *args, **kwargs)
+
+class TestPickEngine(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.catalog = make_catalog(self.directory)
+        self.drafts = DraftRegistry(os.path.join(self.directory, 'drafts'), self.catalog)
+        self.events = []
+
+        self.draft = self.drafts.get('draft', create=True)
+        for (user_id, name) in [('1', 'lina'), ('2', 'mia')]:
+            self.draft.register(user_id, int(user_id), name, '0001', '')
+        self.draft.start(1)
+
+    def tearDown(self):
+        for draft in self.drafts.loaded():
+            draft.close()
+        super().tearDown()
+
+    def on_event(self, draft, event):
+        self.events.append(event)
+
+    def run_engine(self, engine):
+        """
+        Step the engine until it runs out of work, return the number of steps.
+        """
+        async def _run():
+            steps = 1
+            while await engine.step():
+                steps += 1
+            return steps
+
+        return asyncio.run(_run())
+
+    def test_cascade(self):
+        for (user_id, card_names) in [('1', ['Bolt', 'Counterspell']), ('2', ['Dark Ritual', 'Black Lotus'])]:
+            self.draft.want_many(user_id, card_names)
+
+        engine = PickEngine(self.drafts, DraftActors(), self.on_event)
+        engine.signal(self.draft)
+        self.run_engine(engine)
+
+        self.assertEqual([event['type'] for event in self.events], ['pick', 'pick', 'pick', 'pick', 'notified'])
+        # the cascade stops at the first drafter without a want list
+        self.assertEqual(self.events[-1]['notice'], 'turn')
+        self.assertEqual(self.draft.get_pick_number(), 4)
+
+    def test_signal_during_attempt(self):
+        actors = SignallingActors()
+        engine = PickEngine(self.drafts, actors, self.on_event)
+        actors.engine = engine
+        engine.signal(self.draft)
+
+        # nothing to pick, but the second signal asks for another attempt
+        self.assertEqual(self.run_engine(engine), 2)
+        self.assertEqual([event['type'] for event in self.events], ['notified'])
+
+    def test_broken_draft(self):
+        self.draft.want_many('1', ['Bolt'])
+        self.draft.want_many('2', ['Counterspell'])
+        broken_draft = self.drafts.get('broken', create=True)
+
+        engine = PickEngine(self.drafts, FailingActors('broken'), self.on_event)
+        engine.signal(broken_draft)
+        engine.signal(self.draft)
+
+        with contextlib.redirect_stdout(io.StringIO()) as out, contextlib.redirect_stderr(io.StringIO()):
+            self.run_engine(engine)
+
+        self.assertIn('Pick attempt in draft broken failed', out.getvalue())
+        self.assertEqual(self.draft.get_pick_number(), 2)
+        self.assertEqual(engine._ready, {})
+
+class TestCompleteDrafts(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.catalog = make_catalog(self.directory)
+        self.actors = DraftActors()
+        self.drafts = DraftRegistry(os.path.join(self.directory, 'drafts'), self.catalog, on_unload=self.actors.remove)
+
+        # a one round draft, the registry keeps the number of rounds it was created with
+        draft = Draft('draft', self.drafts.path('draft'), self.catalog, number_of_rounds=1)
+        for (user_id, name) in [('1', 'lina'), ('2', 'mia')]:
+            draft.register(user_id, int(user_id), name, '0001', '')
+            draft.want(user_id, ['Bolt', 'Counterspell'][int(user_id) - 1])
+        draft.start(1)
+        draft.close()
+
+        self.draft = self.drafts.get('draft')
+
+    def tearDown(self):
+        for draft in self.drafts.loaded():
+            self.drafts.unload(draft.draft_id)
+        super().tearDown()
+
+    def test_closed_through_actor(self):
+        engine = PickEngine(self.drafts, self.actors, lambda draft, event:None)
+        results = []
+
+        async def _run():
+            engine.signal(self.draft)
+            while await engine.step():
+                # a command that arrives during the cascade, it is queued before the close
+                if not results:
+                    results.append(asyncio.create_task(self.actors.submit(self.draft, 'get_pick_number')))
+            return await results[0]
+
+        self.assertEqual(asyncio.run(_run()), 2)
+        self.assertTrue(self.draft.closed)
+        self.assertEqual(self.drafts.loaded(), [])
+        self.assertEqual(self.actors._actors, {})
+
+        # loaded again from disk, the draft is complete
+        self.assertTrue(self.drafts.get('draft').get_is_complete())
+
+    def test_close_runs_after_queued_calls(self):
+        actor = DraftActor(self.draft)
+
+        async def _run():
+            return await asyncio.gather(
+                actor.submit('get_pick_number'),
+                actor.submit('close'),
+                actor.submit('get_pick_number'),
+                return_exceptions=True
+            )
+
+        (pick_number, closed, after_close) = asyncio.run(_run())
+        self.assertEqual((pick_number, closed), (0, None))
+        self.assertIsInstance(after_close, DraftError)
+        self.assertTrue(actor.stopped)
+
+        with self.assertRaises(DraftError):
+            asyncio.run(actor.submit('get_pick_number'))
+
+    def test_unload_removes_actor(self):
+        actor = self.actors.get(self.draft)
+        self.drafts.unload('draft')
+
+        self.assertTrue(actor.stopped)
+        self.assertEqual(self.actors._actors, {})
+
+        # a draft loaded again gets a new actor
+        draft = self.drafts.get('draft')
+        self.assertIsNot(self.actors.get(draft), actor)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+from .draft import Draft
+from .journal import Journal
+from .testing import TempDirTestCase, make_catalog
+
+class TestJournal(TempDirTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.path = os.path.join(self.directory, 'draft.journal')
+
+    def test_torn_line_is_dropped(self):
+        journal = Journal(self.path)
+        journal.append({'type': 'notified'})
+        journal.append({'type': 'notified'})
+        journal.close()
+
+        size = os.path.getsize(self.path)
+        with open(self.path, 'ab') as f:
+            f.write(b'{"type": "pi')
+
+        journal = Journal(self.path)
+        self.assertEqual(len(journal), 2)
+        self.assertEqual(journal.seq, 2)
+        self.assertEqual(os.path.getsize(self.path), size)
+
+        # appending after the recovery gives a journal that loads cleanly
+        journal.append({'type': 'reminded'})
+        journal.close()
+
+        events = Journal(self.path).replay(0)
+        self.assertEqual([event['seq'] for event in events], [1, 2, 3])
+        self.assertEqual(events[-1]['type'], 'reminded')
+
+    def test_line_without_newline_is_dropped(self):
+        journal = Journal(self.path)
+        journal.append({'type': 'notified'})
+        journal.close()
+
+        with open(self.path, 'ab') as f:
+            f.write(b'{"type": "notified", "seq": 2}')
+
+        journal = Journal(self.path)
+        self.assertEqual(journal.seq, 1)
+        self.assertEqual(len(journal.replay(0)), 1)
+
+    def test_replay_skips_snapshotted_events(self):
+        journal = Journal(self.path)
+        for _ in range(3):
+            journal.append({'type': 'notified'})
+        journal.close()
+
+        journal = Journal(self.path, seq=2)
+        self.assertEqual([event['seq'] for event in journal.replay(2)], [3])
+        # events are only handed out once
+        self.assertEqual(journal.replay(0), [])
+
+    def test_seq_survives_truncate(self):
+        journal = Journal(self.path)
+        journal.append({'type': 'notified'})
+        journal.truncate()
+        self.assertEqual(len(journal), 0)
+        self.assertEqual(journal.append({'type': 'notified'}), 2)
+        journal.close()
+
+    def test_draft_replays_journal_after_crash(self):
+        catalog = make_catalog(self.directory)
+        draft_directory = os.path.join(self.directory, 'draft')
+
+        draft = Draft('draft', draft_directory, catalog)
+        draft.register('1', 1, 'lina', '0001', 'Team Lina')
+        draft.want('1', 'Black Lotus')
+        # the process dies without a snapshot, only the journal has the events
+        draft.storage.journal.close()
+
+        draft = Draft('draft', draft_directory, catalog)
+        self.assertEqual(draft.get_user('1')['team-name'], 'Team Lina')
+        self.assertEqual(draft.get_user('1')['wanted-cards'], [catalog.lookup('Black Lotus')])
+        self.assertEqual(draft.wanted_by[catalog.lookup('Black Lotus')], {'1'})
+        draft.close()
+
+if __name__ == '__main__':
+    unittest.main()
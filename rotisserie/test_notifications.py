@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+
+from .notifications import SnipeNotifier
+from .testing import DraftTestCase
+
+class FakeOutbox:
+
+    def __init__(self):
+        self.posts = []
+
+    def post(self, destination, text, merge=False):
+        self.posts.append((destination, text))
+
+class TestSnipeNotifier(DraftTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.draft.register('3', 3, 'ina', '0001', '')
+        (self.first, self.second, self.third) = self.draft.start(1)
+
+        self.outbox = FakeOutbox()
+        self.notifier = SnipeNotifier(self.outbox, self.catalog)
+
+    def team_name(self, user_id):
+        return self.draft.get_user(user_id)['team-name']
+
+    def cascade(self):
+        """
+        Make every pick the want lists allow, like the pick engine, and
+        return the pick events.
+        """
+        picks = []
+        while True:
+            event = self.draft.attempt_pick()
+            self.notifier.add(self.draft, event)
+
+            if event['type'] != 'pick':
+                self.notifier.flush()
+                return picks
+
+            picks.append(event)
+
+    def test_sniped_user_ids(self):
+        for user_id in [self.third, self.first, self.second]:
+            self.draft.want(user_id, 'Bolt')
+
+        (event,) = self.cascade()
+        self.assertEqual(event['user-id'], self.first)
+        # everyone else who queued the card, but not the picker
+        self.assertEqual(event['sniped-user-ids'], sorted([self.second, self.third]))
+        self.assertNotIn(self.card('Bolt'), self.draft.get_user(self.second)['wanted-cards'])
+
+    def test_one_message_per_cascade(self):
+        self.draft.want_many(self.third, ['Bolt', 'Counterspell'])
+        self.draft.want(self.first, 'Bolt')
+        self.draft.want(self.second, 'Counterspell')
+
+        self.assertEqual(len(self.cascade()), 2)
+
+        self.assertEqual(self.outbox.posts, [(('user', int(self.third)), '\n'.join([
+            'Sniped! Cards on your draft list were taken:',
+            f'{self.team_name(self.first)} drafted Bolt',
+            f'{self.team_name(self.second)} drafted Counterspell'
+        ]))])
+
+        # nothing is sent twice
+        self.notifier.flush()
+        self.assertEqual(len(self.outbox.posts), 1)
+
+    def test_one_message_per_player(self):
+        self.draft.want(self.second, 'Bolt')
+        self.draft.want(self.third, 'Bolt')
+        self.draft.want(self.first, 'Bolt')
+
+        self.cascade()
+        self.assertEqual(sorted(destination for (destination, _) in self.outbox.posts), sorted([('user', int(self.second)), ('user', int(self.third))]))
+
+    def test_picker_not_notified(self):
+        self.draft.want_many(self.first, ['Bolt', 'Counterspell'])
+
+        self.cascade()
+        self.assertEqual(self.outbox.posts, [])
+
+    def test_other_events_ignored(self):
+        self.notifier.add(self.draft, {'type': 'notified', 'notice': 'turn', 'user-id': self.first})
+        self.notifier.flush()
+        self.assertEqual(self.outbox.posts, [])
+
+if __name__ == '__main__':
+    unittest.main()
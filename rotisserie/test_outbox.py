@@ -0,0 +1,143 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import time
+import unittest
+
+from .outbox import MESSAGE_MAX_LENGTH, Outbox, TokenBucket, rate_limit, split_message
+
+class Response:
+
+    def __init__(self, headers):
+        self.headers = headers
+
+class SendError(Exception):
+    """
+    Looks like a discord.HTTPException, or discord.RateLimited with only retry_after.
+    """
+
+    def __init__(self, status=None, retry_after=None, headers=None):
+        super().__init__(f'status {status}')
+        self.status = status
+        self.retry_after = retry_after
+        self.response = Response(headers or {})
+
+class TestOutbox(unittest.TestCase):
+
+    def setUp(self):
+        self.sent = []
+        # destination -> errors to raise on the next sends
+        self.errors = {}
+        # text -> seconds after deliver started that it was sent
+        self.sent_at = {}
+
+    async def send(self, destination, text):
+        if self.errors.get(destination):
+            raise self.errors[destination].pop(0)
+        self.sent.append((destination, text))
+        self.sent_at[text] = time.monotonic() - self.started
+
+    def deliver(self, posts, **kwargs):
+        """
+        Post every (destination, text, merge) and run the outbox until it has
+        nothing left to send.
+        """
+        async def _deliver():
+            self.started = time.monotonic()
+            outbox = Outbox(self.send, merge_seconds=0.01, backoff_seconds=0.01, **kwargs)
+            for post in posts:
+                outbox.post(*post)
+
+            task = asyncio.create_task(outbox.run())
+            while outbox.pending() or outbox._workers:
+                await asyncio.sleep(0.01)
+            task.cancel()
+
+        asyncio.run(_deliver())
+        return self.sent
+
+    def test_merge(self):
+        sent = self.deliver([('a', 'one', True), ('a', 'two', True), ('b', 'three', True), ('a', 'four', False), ('a', 'five', True)])
+        self.assertEqual(sorted(sent), [('a', 'five'), ('a', 'four'), ('a', 'one\n\ntwo'), ('b', 'three')])
+        # each destination keeps its order
+        self.assertEqual([text for (destination, text) in sent if destination == 'a'], ['one\n\ntwo', 'four', 'five'])
+
+    def test_merge_respects_max_length(self):
+        long_text = 'x' * (MESSAGE_MAX_LENGTH - 5)
+        sent = self.deliver([('a', long_text, True), ('a', 'too much', True)])
+        self.assertEqual(sent, [('a', long_text), ('a', 'too much')])
+
+    def test_split(self):
+        lines = ['line %d' % i for i in range(600)]
+        sent = self.deliver([('a', '\n'.join(lines), False)])
+        self.assertGreater(len(sent), 1)
+        self.assertTrue(all(len(text) <= MESSAGE_MAX_LENGTH for (_, text) in sent))
+        self.assertEqual('\n'.join(text for (_, text) in sent).split('\n'), lines)
+
+    def test_split_message(self):
+        self.assertEqual(split_message(''), [''])
+        self.assertEqual(split_message('a\nb\nc', max_length=3), ['a\nb', 'c'])
+        self.assertEqual(split_message('abcdefg', max_length=3), ['abc', 'def', 'g'])
+        self.assertEqual(split_message('ab\ncdefg\nh', max_length=3), ['ab', 'cde', 'fg', 'h'])
+
+    def test_retry(self):
+        self.errors['a'] = [SendError(500), SendError(retry_after=0.01)]
+        sent = self.deliver([('a', 'one', False), ('a', 'two', False)])
+        self.assertEqual(sent, [('a', 'one'), ('a', 'two')])
+
+    def test_permanent_error(self):
+        self.errors['a'] = [SendError(403)]
+        sent = self.deliver([('a', 'one', False), ('a', 'two', False)])
+        self.assertEqual(sent, [('a', 'two')])
+
+    def test_give_up(self):
+        self.errors['a'] = [SendError(500), SendError(500)]
+        sent = self.deliver([('a', 'one', False), ('a', 'two', False)], max_attempts=2)
+        self.assertEqual(sent, [('a', 'two')])
+
+    def test_rate_limited_destination_waits(self):
+        self.errors['a'] = [SendError(429, headers={'Retry-After': '0.2'})]
+        sent = self.deliver([('a', 'one', False), ('a', 'two', False), ('b', 'three', False)], rate=100, per=1.0)
+
+        self.assertEqual(sorted(sent), [('a', 'one'), ('a', 'two'), ('b', 'three')])
+        self.assertGreaterEqual(self.sent_at['one'], 0.2)
+        # other destinations carry on
+        self.assertLess(self.sent_at['three'], 0.1)
+
+    def test_global_rate_limit_pauses_everyone(self):
+        self.errors['a'] = [SendError(429, headers={'X-RateLimit-Reset-After': '0.2', 'X-RateLimit-Global': 'true'})]
+        # b waits merge_seconds, by when a has hit the limit
+        sent = self.deliver([('a', 'one', False), ('b', 'two', True)])
+
+        self.assertEqual(sorted(sent), [('a', 'one'), ('b', 'two')])
+        self.assertGreaterEqual(self.sent_at['two'], 0.2)
+
+class TestRateLimit(unittest.TestCase):
+
+    def test_rate_limit(self):
+        self.assertEqual(rate_limit(SendError(retry_after=1.5)), (1.5, False))
+        self.assertEqual(rate_limit(SendError(429, headers={'Retry-After': '2'})), (2.0, False))
+        self.assertEqual(rate_limit(SendError(429, headers={'X-RateLimit-Reset-After': '0.5', 'X-RateLimit-Global': 'true'})), (0.5, True))
+        # headers of other errors don't count
+        self.assertEqual(rate_limit(SendError(500, headers={'Retry-After': '2'})), (None, False))
+        self.assertEqual(rate_limit(ValueError()), (None, False))
+
+    def test_pause(self):
+        async def _take_twice():
+            bucket = TokenBucket(10, 1.0)
+            bucket.pause(0.2)
+
+            started = time.monotonic()
+            await bucket.take()
+            first = time.monotonic() - started
+            await bucket.take()
+            return (first, time.monotonic() - started)
+
+        (first, second) = asyncio.run(_take_twice())
+        # the pause, then one token at the bucket's rate after another
+        self.assertGreaterEqual(first, 0.2)
+        self.assertLess(first, 0.3)
+        self.assertGreaterEqual(second, 0.3)
+
+if __name__ == '__main__':
+    unittest.main()
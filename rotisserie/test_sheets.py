@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+
+import asyncio
+import unittest
+
+from unittest import mock
+from .sheets import FakeSheetBackend, SheetPublisher, cell_name
+
+class TestSheetPublisher(unittest.TestCase):
+
+    def setUp(self):
+        self.backend = FakeSheetBackend()
+        self.publisher = SheetPublisher(self.backend, flush_seconds=0.01, max_attempts=3, backoff_seconds=0.01)
+
+    def test_coalescing(self):
+        self.publisher.update_cell('sheet', 'Draft', 2, 1, 'Bolt')
+        self.publisher.update_cell('sheet', 'Draft', 2, 2, 'Counterspell')
+        self.publisher.update_cell('sheet', 'Draft', 2, 1, 'Black Lotus')
+        self.publisher.update('other', 'Draft', 'A1:B1', [['Lina', 'Mia']])
+        asyncio.run(self.publisher.flush())
+
+        self.assertEqual(len(self.backend.calls), 2)
+        self.assertEqual(self.backend.cells['sheet'], {"'Draft'!A2": [['Black Lotus']], "'Draft'!B2": [['Counterspell']]})
+        self.assertEqual(self.backend.cells['other'], {"'Draft'!A1:B1": [['Lina', 'Mia']]})
+
+        (sheet_id, data) = [call for call in self.backend.calls if call[0] == 'sheet'][0]
+        self.assertEqual([update['range'] for update in data], ["'Draft'!A2", "'Draft'!B2"])
+
+    def test_run_batches_writes(self):
+        async def _run():
+            task = asyncio.create_task(self.publisher.run())
+            for row in range(1, 6):
+                self.publisher.update_cell('sheet', 'Draft', row, 1, row)
+                await asyncio.sleep(0)
+            while not self.backend.calls:
+                await asyncio.sleep(0.01)
+            task.cancel()
+
+        asyncio.run(_run())
+        self.assertEqual(len(self.backend.calls), 1)
+        self.assertEqual(len(self.backend.cells['sheet']), 5)
+
+    def test_retry(self):
+        self.backend.fail_count = 2
+        self.publisher.update_cell('sheet', 'Draft', 1, 1, 'Bolt')
+        asyncio.run(self.publisher.flush())
+
+        self.assertEqual(self.backend.fail_count, 0)
+        self.assertEqual(self.backend.cells['sheet'], {"'Draft'!A1": [['Bolt']]})
+
+    def test_give_up(self):
+        self.backend.fail_count = 3
+        self.publisher.update_cell('sheet', 'Draft', 1, 1, 'Bolt')
+        asyncio.run(self.publisher.flush())
+        self.assertEqual(self.backend.calls, [])
+
+        # the next flush starts over
+        self.publisher.update_cell('sheet', 'Draft', 1, 2, 'Counterspell')
+        asyncio.run(self.publisher.flush())
+        self.assertEqual(self.backend.cells['sheet'], {"'Draft'!B1": [['Counterspell']]})
+
+    def test_backoff(self):
+        publisher = SheetPublisher(self.backend, max_attempts=5, backoff_seconds=1.0, max_backoff_seconds=3.0)
+        self.backend.fail_count = 4
+        publisher.update_cell('sheet', 'Draft', 1, 1, 'Bolt')
+
+        with mock.patch('asyncio.sleep', new=mock.AsyncMock()) as sleep:
+            asyncio.run(publisher.flush())
+
+        self.assertEqual([call.args[0] for call in sleep.await_args_list], [1.0, 2.0, 3.0, 3.0])
+        self.assertEqual(len(self.backend.calls), 1)
+
+    def test_writes_during_backoff(self):
+        self.backend.fail_count = 1
+        self.publisher.update_cell('sheet', 'Draft', 1, 1, 'Bolt')
+
+        # a pick lands while the failed batch waits to be retried
+        async def sleep(seconds):
+            self.publisher.update_cell('sheet', 'Draft', 1, 1, 'Black Lotus')
+            self.publisher.update_cell('sheet', 'Draft', 1, 2, 'Counterspell')
+
+        with mock.patch('asyncio.sleep', new=sleep):
+            asyncio.run(self.publisher.flush())
+
+        # the retry sends the old batch, the new writes follow in one more
+        self.assertEqual(len(self.backend.calls), 2)
+        self.assertEqual(len(self.backend.calls[1][1]), 2)
+        self.assertEqual(self.backend.cells['sheet'], {"'Draft'!A1": [['Black Lotus']], "'Draft'!B1": [['Counterspell']]})
+
+    def test_cell_name(self):
+        self.assertEqual(cell_name(4, 3), 'C4')
+        self.assertEqual(cell_name(1, 26), 'Z1')
+        self.assertEqual(cell_name(1, 27), 'AA1')
+        self.assertEqual(cell_name(10, 703), 'AAA10')
+
+if __name__ == '__main__':
+    unittest.main()
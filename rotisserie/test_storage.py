@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+
+import os
+import unittest
+
+from .draft import Draft, migrate_to_sqlite
+from .storage import SQLITE_FILE_NAME, SqliteStorage
+from .testing import DraftTestCase
+
+class TestMigrateToSqlite(DraftTestCase):
+
+    def test_round_trip(self):
+        self.draft.start(1)
+        self.draft.set_clock(3600, 600)
+        self.make_picks(['Bolt', 'Counterspell', 'Dark Ritual'])
+        self.draft.undo(1)
+        self.draft.want_many('1', ['Black Lotus', 'Ancestral Recall'])
+        self.draft.backup('2', 'Llanowar Elves')
+
+        expected_users = self.draft.users
+        expected_state = {attribute: getattr(self.draft.state, attribute) for attribute in ['has_started', 'time_began', 'main_channel', 'pick_order', 'pick_number', 'pick_seconds', 'bank_seconds', 'undone']}
+        self.draft.close()
+
+        migrate_to_sqlite(self.draft_directory, self.catalog)
+
+        self.assertTrue(os.path.exists(os.path.join(self.draft_directory, SQLITE_FILE_NAME)))
+        self.assertTrue(os.path.exists(os.path.join(self.draft_directory, 'draft.db.migrated')))
+        self.assertFalse(os.path.exists(os.path.join(self.draft_directory, 'draft.db')))
+
+        self.draft = Draft('draft', self.draft_directory, self.catalog)
+        self.assertIsInstance(self.draft.storage, SqliteStorage)
+        self.assertEqual(self.draft.users, expected_users)
+        self.assertEqual({attribute: getattr(self.draft.state, attribute) for attribute in expected_state}, expected_state)
+        for card_name in ['Bolt', 'Counterspell']:
+            self.assertIn(self.card(card_name), self.draft.taken_cards)
+        self.assertNotIn(self.card('Dark Ritual'), self.draft.taken_cards)
+
+        # the migrated draft carries on where it left off
+        self.draft.redo(1)
+        self.assertEqual(self.draft.get_pick_number(), 3)
+
+    def test_nothing_to_migrate(self):
+        self.draft.close()
+        os.remove(os.path.join(self.draft_directory, 'draft.db'))
+
+        migrate_to_sqlite(self.draft_directory, self.catalog)
+        self.assertFalse(os.path.exists(os.path.join(self.draft_directory, SQLITE_FILE_NAME)))
+
+        self.draft = Draft('draft', self.draft_directory, self.catalog)
+
+if __name__ == '__main__':
+    unittest.main()
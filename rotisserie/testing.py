@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fixtures shared by the rotisserie test modules, which run with
+python -m pytest or python -m unittest rotisserie.test_<module>.
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from .catalog import CardCatalog, build_catalog
+from .draft import Draft
+
+CARD_NAMES = [
+    'Lightning Bolt',
+    'Bolt',
+    'Thunderbolt',
+    'Boltwave',
+    'Bolt Thrower',
+    'Counterspell',
+    'Dark Ritual',
+    'Llanowar Elves',
+    'Ancestral Recall',
+    'Black Lotus'
+]
+
+def make_catalog(directory, card_names=CARD_NAMES):
+    path = os.path.join(directory, 'cards.catalog')
+    build_catalog(card_names, path)
+    return CardCatalog(path)
+
+class TempDirTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+class DraftTestCase(TempDirTestCase):
+
+    storage = 'pickle'
+
+    def setUp(self):
+        super().setUp()
+        self.catalog = make_catalog(self.directory)
+        self.draft_directory = os.path.join(self.directory, 'draft')
+        self.draft = Draft('draft', self.draft_directory, self.catalog, number_of_rounds=2, storage=self.storage)
+
+        for (user_id, name) in [('1', 'lina'), ('2', 'mia')]:
+            self.draft.register(user_id, int(user_id), name, '0001', '')
+
+    def tearDown(self):
+        self.draft.close()
+        super().tearDown()
+
+    def reload(self):
+        self.draft.close()
+        self.draft = Draft('draft', self.draft_directory, self.catalog)
+
+    def card(self, card_name):
+        return self.catalog.lookup(card_name)
+
+    def make_picks(self, card_names):
+        """
+        Have whoever is on the clock pick each of card_names in turn.
+        """
+        for card_name in card_names:
+            self.draft.want(self.draft.state.current_drafter_id(), card_name)
+            event = self.draft.attempt_pick()
+            self.assertEqual(event['type'], 'pick')